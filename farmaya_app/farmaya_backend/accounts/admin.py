@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Pedido, Receta
+from .models import DireccionGeocodificada, User, Pedido, Receta
 from productos.models import Producto  # ✅ import correcto
 
 
@@ -70,3 +70,12 @@ class PedidoAdmin(admin.ModelAdmin):
 class RecetaAdmin(admin.ModelAdmin):
     list_display = ('id', 'pedido', 'fecha_subida')
     search_fields = ('pedido__usuario__email',)
+
+
+# -----------------------------
+# 🔹 ADMIN CACHE DE GEOCODIFICACIÓN
+# -----------------------------
+@admin.register(DireccionGeocodificada)
+class DireccionGeocodificadaAdmin(admin.ModelAdmin):
+    list_display = ('direccion_normalizada', 'latitud', 'longitud', 'fecha')
+    search_fields = ('direccion_normalizada',)
@@ -0,0 +1,213 @@
+"""
+Autenticación JWT que evita el SELECT de accounts_user en cada request.
+
+- GET/HEAD/OPTIONS: el usuario se arma con los claims del access token
+  (user_id, tipo_usuario y nombre, ver CustomTokenObtainPairSerializer). Es
+  una instancia de User con el resto de los campos diferidos: compara igual
+  al usuario real, sirve en filtros y FKs, y si una vista lee otro campo
+  Django lo trae de la base en ese momento.
+- Métodos que escriben y las vistas de AUTH_VISTAS_USUARIO_COMPLETO: se usa
+  la fila completa, que sale de un LRU en memoria del proceso con TTL.
+
+User.save/delete registran el cambio (al confirmar la transacción) en el
+cache AUTH_USUARIOS_CACHE: una marca por usuario con si sigue activo y
+cuándo cambiaron por última vez los campos de CLAIMS_USUARIO. Cada request la
+lee para rechazar usuarios desactivados, para descartar las filas del LRU
+guardadas antes del cambio y para no creerle a claims emitidos antes de que
+cambiaran: el refresh los copia a cada access token nuevo sin releer el
+usuario, así que se comparan con claims_iat_ns (cuándo se emitieron en el
+login, en ns) y no con el iat del access token, que el refresh renueva.
+
+Las marcas van a un cache propio (CACHES['usuarios']), compartido entre
+procesos y sin desalojo por tamaño. Si aun así falta la marca de un usuario
+se falla cerrado: se lee su fila de la base y no se usan los claims.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+
+CLAIMS_USUARIO = ('tipo_usuario', 'nombre')
+# time.time_ns() del login que leyó CLAIMS_USUARIO. En ns y no en segundos
+# como iat: un usuario que se registra e inicia sesión en el mismo segundo no
+# tiene que quedar en el camino de la fila completa
+CLAIM_EMISION = 'claims_iat_ns'
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_USUARIOS_CACHE', 'usuarios')]
+
+
+def _clave(user_id):
+    return f'usuarios:estado:{user_id}'
+
+
+class CacheUsuarios:
+    """LRU con TTL de filas de usuario (tuplas de valores), seguro entre hilos."""
+
+    def __init__(self):
+        self._filas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id, marca):
+        """Valores guardados si no vencieron y se leyeron con la misma marca."""
+        with self._lock:
+            entrada = self._filas.get(user_id)
+            if entrada is None:
+                return None
+            vence, marca_guardada, valores = entrada
+            if vence <= time.monotonic() or marca_guardada != marca:
+                del self._filas[user_id]
+                return None
+            self._filas.move_to_end(user_id)
+            return valores
+
+    def guardar(self, user_id, marca, valores):
+        ttl = getattr(settings, 'AUTH_USUARIOS_LRU_TTL', 30)
+        maximo = getattr(settings, 'AUTH_USUARIOS_LRU_MAX', 1024)
+        with self._lock:
+            self._filas[user_id] = (time.monotonic() + ttl, marca, valores)
+            self._filas.move_to_end(user_id)
+            while len(self._filas) > maximo:
+                self._filas.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._filas.pop(user_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._filas.clear()
+
+    def __len__(self):
+        return len(self._filas)
+
+
+filas = CacheUsuarios()
+
+
+def invalidar(user_id, activo, claims=True):
+    """
+    Registra que el usuario cambió (o se borró, activo=False) cuando confirma
+    la transacción en curso. Lo llaman User.save/delete; el código que
+    desactive usuarios con queryset.update() tiene que llamarlo también.
+    claims=False indica que no cambió ninguno de CLAIMS_USUARIO.
+    """
+    def registrar():
+        filas.invalidar(user_id)
+        ahora = time.time_ns()
+        cambio_claims = ahora
+        if not claims:
+            anterior = _cache().get(_clave(user_id))
+            # Sin marca previa no se sabe cuándo cambiaron: se toma ahora
+            cambio_claims = anterior[2] if anterior else ahora
+        _cache().set(_clave(user_id), (ahora, activo, cambio_claims), timeout=None)
+
+    transaction.on_commit(registrar)
+
+
+def _valores(user):
+    return tuple(getattr(user, campo.attname) for campo in user._meta.concrete_fields)
+
+
+def _instancia(modelo, campos, valores):
+    return modelo.from_db(router.db_for_read(modelo), campos, valores)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Reemplaza a JWTAuthentication en DEFAULT_AUTHENTICATION_CLASSES. Con
+    SIMPLE_JWT['CHECK_REVOKE_TOKEN'] siempre consulta la base, porque el
+    hash de la contraseña no viaja en los claims.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            return self.get_user(validated_token), validated_token
+        return self._usuario(request, validated_token), validated_token
+
+    def _usuario(self, request, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken('El token no identifica a ningún usuario.') from exc
+        # simplejwt guarda el id como texto; la instancia tiene que llevar el tipo del campo
+        user_id = self.user_model._meta.get_field(jwt_settings.USER_ID_FIELD).to_python(user_id)
+
+        estado = _cache().get(_clave(user_id))
+        if estado is None:
+            return self._usuario_sin_marca(user_id, validated_token)
+        marca, activo, cambio_claims = estado
+        if not activo:
+            raise AuthenticationFailed('El usuario está inactivo.', code='user_inactive')
+
+        if self._alcanzan_claims(request, validated_token, cambio_claims):
+            return self._usuario_desde_claims(user_id, validated_token)
+        return self._usuario_completo(user_id, marca, validated_token)
+
+    def _usuario_sin_marca(self, user_id, validated_token):
+        """
+        Sin marca no se sabe si el usuario cambió o se desactivó: se lee la
+        fila (get_user rechaza a los inactivos) y se deja una marca nueva. Los
+        claims emitidos hasta ahora no se usan: el cambio que se perdió con la
+        marca anterior pudo ser posterior al login. add() no pisa la marca de
+        una desactivación que se confirme mientras tanto.
+        """
+        user = self.get_user(validated_token)
+        ahora = time.time_ns()
+        if _cache().add(_clave(user_id), (ahora, user.is_active, ahora), timeout=None):
+            filas.guardar(user_id, ahora, copy.deepcopy(_valores(user)))
+        return user
+
+    def _alcanzan_claims(self, request, validated_token, cambio_claims):
+        if request.method not in SAFE_METHODS:
+            return False
+        if any(claim not in validated_token for claim in (*CLAIMS_USUARIO, CLAIM_EMISION)):
+            # Tokens emitidos antes de que se agregaran los claims
+            return False
+        if cambio_claims is not None and cambio_claims >= validated_token[CLAIM_EMISION]:
+            # El usuario cambió después del login: los claims pueden ser viejos
+            return False
+        vista = (getattr(request, 'parser_context', None) or {}).get('view')
+        if vista is None:
+            return False
+        nombre = f'{type(vista).__module__}.{type(vista).__name__}'
+        return nombre not in getattr(settings, 'AUTH_VISTAS_USUARIO_COMPLETO', ())
+
+    def _usuario_desde_claims(self, user_id, validated_token):
+        claims = {
+            jwt_settings.USER_ID_FIELD: user_id,
+            'is_active': True,
+            **{claim: validated_token[claim] for claim in CLAIMS_USUARIO},
+        }
+        campos = [
+            campo.attname for campo in self.user_model._meta.concrete_fields
+            if campo.attname in claims
+        ]
+        return _instancia(self.user_model, campos, [claims[campo] for campo in campos])
+
+    def _usuario_completo(self, user_id, marca, validated_token):
+        campos = [campo.attname for campo in self.user_model._meta.concrete_fields]
+        valores = filas.obtener(user_id, marca)
+        if valores is None:
+            user = self.get_user(validated_token)
+            filas.guardar(user_id, marca, copy.deepcopy(_valores(user)))
+            return user
+        # Copia: las instancias no se comparten entre requests (horarios es un dict)
+        return _instancia(self.user_model, campos, copy.deepcopy(valores))
@@ -0,0 +1,68 @@
+"""
+Cache del listado completo de farmacias (/api/usuarios/farmacias/).
+
+El cuerpo JSON se guarda ya serializado bajo una clave que incluye una versión
+global. User.save/delete incrementan la versión (al confirmar la transacción)
+cuando cambia algo que el listado muestra, así ninguna entrada vieja vuelve a
+servirse y no hace falta borrar claves.
+
+El cache es el alias settings.FARMACIAS_CACHE. Con un solo proceso alcanza
+LocMemCache; con varios workers en la misma máquina conviene FileBasedCache
+para que todos vean la misma versión.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+CLAVE_VERSION = 'farmacias:version'
+
+# Campos de User que se ven en el listado (FarmaciaSerializer) o lo filtran
+CAMPOS_LISTADO = {
+    'tipo_usuario', 'nombre', 'email', 'direccion', 'telefono',
+    'horarios', 'latitud', 'longitud', 'matricula',
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'FARMACIAS_CACHE', 'default')]
+
+
+def version():
+    cache = _cache()
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        # Si la clave se perdió, se arranca de un valor nuevo para no reusar versiones
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        actual = cache.get(CLAVE_VERSION)
+    return actual
+
+
+def invalidar():
+    """Incrementa la versión cuando confirma la transacción en curso."""
+    def incrementar():
+        cache = _cache()
+        try:
+            cache.incr(CLAVE_VERSION)
+        except ValueError:
+            cache.set(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+    transaction.on_commit(incrementar)
+
+
+def obtener(construir):
+    """
+    Devuelve (cuerpo, etag) del listado para la versión vigente. Si no está en
+    cache llama a construir() para obtener el cuerpo en bytes y lo guarda.
+    """
+    cache = _cache()
+    clave = f'farmacias:listado:{version()}'
+    entrada = cache.get(clave)
+    if entrada is None:
+        cuerpo = construir()
+        entrada = (cuerpo, f'"{hashlib.sha256(cuerpo).hexdigest()}"')
+        cache.set(clave, entrada, timeout=getattr(settings, 'FARMACIAS_CACHE_TTL', 24 * 60 * 60))
+    return entrada
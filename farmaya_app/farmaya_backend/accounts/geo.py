@@ -0,0 +1,89 @@
+"""
+Utilidades geográficas para búsquedas por cercanía.
+Las distancias se expresan en kilómetros.
+"""
+import math
+
+
+RADIO_TIERRA_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distancia sobre la superficie terrestre entre dos puntos."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lng, radio_km):
+    """
+    Rectángulo (lat_min, lat_max, lng_min, lng_max) que contiene el círculo
+    de radio_km alrededor del punto. Sirve para podar candidatos con un
+    filtro por rango indexado antes de calcular la distancia exacta.
+    """
+    delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6:
+        delta_lng = 180.0
+    else:
+        delta_lng = min(180.0, math.degrees(radio_km / (RADIO_TIERRA_KM * cos_lat)))
+    return (
+        max(-90.0, lat - delta_lat),
+        min(90.0, lat + delta_lat),
+        lng - delta_lng,
+        lng + delta_lng,
+    )
+
+
+def parse_coordenadas(lat, lng):
+    """Convierte lat/lng recibidos por query string. Devuelve None si no son válidos."""
+    try:
+        lat = float(lat)
+        lng = float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+# ----------------------------------------------------
+# Grilla fija para el índice espacial de farmacias
+# ----------------------------------------------------
+# Celdas de 0.1° (~11 km de lado en latitud). User.save guarda la celda de
+# cada farmacia en User.celda_geo; una búsqueda por radio consulta solo las
+# celdas que tocan el rectángulo del círculo.
+TAMANIO_CELDA = 0.1
+MAX_CELDAS = 400
+_CELDAS_POR_VUELTA = round(360 / TAMANIO_CELDA)
+
+
+def _indice(valor):
+    return math.floor(valor / TAMANIO_CELDA)
+
+
+def _indice_lng(indice):
+    """Normaliza el índice de longitud para que el antimeridiano no rompa la grilla."""
+    mitad = _CELDAS_POR_VUELTA // 2
+    return (indice + mitad) % _CELDAS_POR_VUELTA - mitad
+
+
+def celda(lat, lng):
+    """Clave de la celda que contiene el punto, o None si faltan coordenadas."""
+    if lat is None or lng is None:
+        return None
+    return f'{_indice(lat)}:{_indice_lng(_indice(lng))}'
+
+
+def celdas_en(lat_min, lat_max, lng_min, lng_max):
+    """
+    Claves de las celdas que cubren el rectángulo. Devuelve None si son más
+    de MAX_CELDAS (conviene filtrar directamente por rango de coordenadas).
+    """
+    filas = range(_indice(lat_min), _indice(lat_max) + 1)
+    columnas = range(_indice(lng_min), _indice(lng_max) + 1)
+    if len(filas) * len(columnas) > MAX_CELDAS:
+        return None
+    return {f'{fila}:{_indice_lng(columna)}' for fila in filas for columna in columnas}
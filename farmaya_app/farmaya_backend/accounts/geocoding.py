@@ -0,0 +1,131 @@
+"""
+Geocodificación de direcciones de farmacias fuera del request.
+
+User.save encola la dirección cuando cambia; un pool chico de hilos la
+resuelve después del commit usando primero la tabla DireccionGeocodificada
+(cache persistente por dirección normalizada) y, si no está, el geocoder
+configurado en settings.GEOCODER_BACKEND. Las direcciones que el geocoder no
+encontró se vuelven a consultar pasados GEOCODER_REINTENTO_NO_ENCONTRADAS
+segundos desde el último intento (la fecha de la fila).
+"""
+import logging
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_direccion(direccion):
+    """Minúsculas, sin acentos y con espacios colapsados: misma dirección, misma clave."""
+    texto = unicodedata.normalize('NFKD', direccion or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', texto).strip().lower()
+
+
+class NominatimGeocoder:
+    """Geocoder real sobre OpenStreetMap Nominatim (requiere red)."""
+
+    def __init__(self):
+        from geopy.geocoders import Nominatim
+
+        self.geolocator = Nominatim(user_agent='farmaya_app')
+
+    def geocode(self, direccion):
+        location = self.geolocator.geocode(direccion, timeout=10)
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+class LocalGeocoder:
+    """
+    Reemplazo offline para tests y desarrollo: resuelve contra el diccionario
+    settings.GEOCODER_LOCAL_DIRECCIONES ({dirección normalizada: (lat, lng)}).
+    """
+
+    def geocode(self, direccion):
+        direcciones = getattr(settings, 'GEOCODER_LOCAL_DIRECCIONES', {})
+        return direcciones.get(normalizar_direccion(direccion))
+
+
+_geocoders = {}
+_geocoders_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='geocoding')
+
+
+def get_geocoder():
+    ruta = getattr(settings, 'GEOCODER_BACKEND', 'accounts.geocoding.NominatimGeocoder')
+    with _geocoders_lock:
+        if ruta not in _geocoders:
+            _geocoders[ruta] = import_string(ruta)()
+        return _geocoders[ruta]
+
+
+def _reintentar(cacheada):
+    """Si una dirección no encontrada lleva en la tabla lo suficiente para volver a consultarla."""
+    segundos = getattr(settings, 'GEOCODER_REINTENTO_NO_ENCONTRADAS', 7 * 24 * 60 * 60)
+    return timezone.now() - cacheada.fecha >= timedelta(seconds=segundos)
+
+
+def resolver(direccion):
+    """Coordenadas de la dirección, usando la tabla de cache antes que el geocoder."""
+    from .models import DireccionGeocodificada
+
+    clave = normalizar_direccion(direccion)
+    cacheada = DireccionGeocodificada.objects.filter(direccion_normalizada=clave).first()
+    if cacheada is not None and (cacheada.coordenadas is not None or not _reintentar(cacheada)):
+        return cacheada.coordenadas
+
+    try:
+        coordenadas = get_geocoder().geocode(direccion)
+    except Exception as e:
+        # No se cachea: puede ser un timeout o un corte de red pasajero
+        logger.warning("Error geocodificando '%s': %s", direccion, e)
+        return None
+
+    DireccionGeocodificada.objects.update_or_create(
+        direccion_normalizada=clave,
+        defaults={
+            'latitud': coordenadas[0] if coordenadas else None,
+            'longitud': coordenadas[1] if coordenadas else None,
+        },
+    )
+    if coordenadas is None:
+        logger.info("No se encontró ubicación para '%s'", direccion)
+    return coordenadas
+
+
+def geocodificar_usuario(user_id, direccion):
+    """Trabajo del pool: resuelve la dirección y guarda las coordenadas del usuario."""
+    from .models import User
+
+    close_old_connections()
+    try:
+        coordenadas = resolver(direccion)
+        if coordenadas is not None:
+            # Si la dirección cambió mientras tanto, este resultado ya no aplica
+            for user in User.objects.filter(pk=user_id, direccion=direccion):
+                user.latitud, user.longitud = coordenadas
+                user.save(update_fields=['latitud', 'longitud'])
+    finally:
+        close_old_connections()
+
+
+def encolar(user_id, direccion):
+    """Programa la geocodificación para cuando confirme la transacción en curso."""
+    def enviar():
+        if getattr(settings, 'GEOCODER_EN_SEGUNDO_PLANO', True):
+            _executor.submit(geocodificar_usuario, user_id, direccion)
+        else:
+            geocodificar_usuario(user_id, direccion)
+
+    transaction.on_commit(enviar)
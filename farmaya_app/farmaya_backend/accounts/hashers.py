@@ -0,0 +1,16 @@
+"""
+Hasher de contraseñas de la app.
+
+Es PBKDF2-SHA256 (mismo algoritmo y formato que el de Django) con las
+iteraciones de settings.PASSWORD_PBKDF2_ITERACIONES. Los hashes guardados
+con otra cantidad se siguen verificando (la cantidad va en el hash) y Django
+los regenera con esta en el siguiente login correcto.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PBKDF2IteracionesPasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERACIONES', PBKDF2PasswordHasher.iterations)
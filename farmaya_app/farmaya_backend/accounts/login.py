@@ -0,0 +1,68 @@
+"""
+Verificación de contraseñas del login fuera del hilo del request.
+
+Con PBKDF2 cada login cuesta cientos de ms de CPU. Las verificaciones corren
+en un pool de LOGIN_HASH_HILOS hilos (hashlib libera el GIL mientras calcula)
+con lugar para LOGIN_HASH_COLA más en espera; si no hay lugar se responde
+429 enseguida en vez de apilar trabajo que después compite por CPU con los
+endpoints de pedidos. La vista de login es async: servida con backend.asgi
+no ocupa un hilo mientras espera.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class Saturado(Exception):
+    """No hay lugar en el pool ni en su cola."""
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool():
+    """(executor, cupos) para el tamaño configurado; se crean en el primer uso."""
+    hilos = getattr(settings, 'LOGIN_HASH_HILOS', 2)
+    cola = getattr(settings, 'LOGIN_HASH_COLA', 8)
+    with _pools_lock:
+        if (hilos, cola) not in _pools:
+            _pools[(hilos, cola)] = (
+                ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='login'),
+                threading.BoundedSemaphore(hilos + cola),
+            )
+        return _pools[(hilos, cola)]
+
+
+def _en_hilo(funcion, *args):
+    close_old_connections()
+    try:
+        return funcion(*args)
+    finally:
+        close_old_connections()
+
+
+async def ejecutar(funcion, *args):
+    """
+    Ejecuta funcion(*args) en el pool y devuelve su resultado. Lanza
+    Saturado si ya hay LOGIN_HASH_HILOS + LOGIN_HASH_COLA en curso.
+    """
+    executor, cupos = _pool()
+    if not cupos.acquire(blocking=False):
+        raise Saturado()
+
+    if not getattr(settings, 'LOGIN_HASH_EN_SEGUNDO_PLANO', True):
+        # Tests: en el hilo del request, dentro de su transacción
+        try:
+            return await sync_to_async(funcion)(*args)
+        finally:
+            cupos.release()
+
+    futuro = executor.submit(_en_hilo, funcion, *args)
+    # El cupo se libera cuando termina el trabajo, aunque el cliente se haya ido
+    futuro.add_done_callback(lambda _: cupos.release())
+    return await asyncio.wrap_future(futuro)
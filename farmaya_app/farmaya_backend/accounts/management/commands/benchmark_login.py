@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _pedir(url, datos=None, token=None, timeout=60):
+    """(status, segundos, cuerpo) de un request HTTP; los 4xx/5xx no lanzan."""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    cuerpo = json.dumps(datos).encode() if datos is not None else None
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, cuerpo, headers), timeout=timeout) as r:
+            return r.status, time.perf_counter() - inicio, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - inicio, e.read()
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide un pico de logins contra un servidor en marcha: logins por segundo y latencia '
+        'de pedidos/mis/ consultado en paralelo. No toca la base: solo hace requests HTTP.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/', help='Base de la API.')
+        parser.add_argument('--email', required=True, help='Usuario con el que se hacen los logins.')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--logins', type=int, default=200, help='Cantidad total de logins.')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Logins simultáneos.')
+        parser.add_argument('--lectores', type=int, default=4, help='Clientes consultando pedidos/mis/.')
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/') + '/'
+        credenciales = {'email': options['email'], 'password': options['password']}
+
+        codigo, _, cuerpo = _pedir(base + 'login/', credenciales)
+        if codigo != 200:
+            raise CommandError(f'El login inicial respondió {codigo}: {cuerpo[:200]!r}')
+        token = json.loads(cuerpo)['access']
+
+        terminado = threading.Event()
+        latencias = []
+        errores_lectura = []
+
+        def leer():
+            while not terminado.is_set():
+                codigo, segundos, _ = _pedir(base + 'pedidos/mis/', token=token)
+                (latencias if codigo == 200 else errores_lectura).append(segundos)
+
+        lectores = [threading.Thread(target=leer) for _ in range(options['lectores'])]
+        for lector in lectores:
+            lector.start()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            resultados = list(pool.map(
+                lambda _: _pedir(base + 'login/', credenciales), range(options['logins'])
+            ))
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        for lector in lectores:
+            lector.join()
+
+        ok = [segundos for codigo, segundos, _ in resultados if codigo == 200]
+        rechazados = sum(1 for codigo, _, _ in resultados if codigo == 429)
+        otros = len(resultados) - len(ok) - rechazados
+        self.stdout.write(
+            f'Logins: {len(ok)} ok, {rechazados} con 429, {otros} con otro error en {duracion:.1f} s '
+            f'({len(ok) / duracion:.1f} logins/s, p99 {_percentil(ok, 99) * 1000:.0f} ms)'
+        )
+        self.stdout.write(
+            f'pedidos/mis/: {len(latencias)} requests, p50 {_percentil(latencias, 50) * 1000:.0f} ms, '
+            f'p99 {_percentil(latencias, 99) * 1000:.0f} ms, {len(errores_lectura)} errores'
+        )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:05
+
+from django.db import migrations, models
+
+from accounts.geo import celda
+
+
+def calcular_celdas(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    usuarios = User.objects.exclude(latitud=None).exclude(longitud=None).only('latitud', 'longitud')
+    for usuario in usuarios.iterator():
+        usuario.celda_geo = celda(usuario.latitud, usuario.longitud)
+        usuario.save(update_fields=['celda_geo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_direccion_geocodificada'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='celda_geo',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['tipo_usuario', 'celda_geo'], name='user_tipo_celda_idx'),
+        ),
+        migrations.RunPython(calcular_celdas, migrations.RunPython.noop),
+    ]
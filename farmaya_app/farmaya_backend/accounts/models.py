@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from django.db.models.functions import Lower
+
+from . import cache_farmacias, geo
 
 
 # ----------------------------------------------------
@@ -61,38 +62,117 @@ class User(AbstractUser):
     # 🗺️ Campos para geolocalización
     latitud = models.FloatField(blank=True, null=True)
     longitud = models.FloatField(blank=True, null=True)
+    # Celda de la grilla de accounts.geo (índice espacial para buscar cercanas)
+    celda_geo = models.CharField(max_length=16, blank=True, null=True, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Búsqueda de farmacias por rectángulo de coordenadas
+            models.Index(fields=['tipo_usuario', 'latitud', 'longitud'], name='user_tipo_coords_idx'),
+            # Búsqueda de farmacias cercanas por celdas de la grilla
+            models.Index(fields=['tipo_usuario', 'celda_geo'], name='user_tipo_celda_idx'),
+            # Unicidad sin distinguir mayúsculas (accounts.serializers.conflictos_de_unicidad)
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            models.Index(Lower('nombre'), name='user_nombre_lower_idx'),
+            models.Index(fields=['telefono'], name='user_telefono_idx'),
+            models.Index(fields=['matricula'], name='user_matricula_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Dirección tal como se leyó de la base, para detectar cambios en save().
+        # Se lee de __dict__ para no disparar una consulta si el campo está diferido.
+        self._direccion_original = self.__dict__.get("direccion")
+        self._tipo_original = self.__dict__.get("tipo_usuario")
+
     def save(self, *args, **kwargs):
         """
-        Si el usuario es una farmacia y tiene dirección escrita,
-        se geocodifica automáticamente para obtener latitud/longitud.
+        Si el usuario es una farmacia y cambió su dirección, la geocodificación
+        se encola para después del commit (ver accounts.geocoding): guardar
+        nunca espera una llamada HTTP externa.
+
+        Si cambia algo que muestra el listado de farmacias, se invalida su
+        cache (ver accounts.cache_farmacias). Cualquier cambio invalida la
+        fila cacheada para autenticar (ver accounts.autenticacion).
         """
-        if self.tipo_usuario == "farmacia" and self.direccion:
-            try:
-                geolocator = Nominatim(user_agent="farmaya_app")
-                location = geolocator.geocode(self.direccion, timeout=10)
-                if location:
-                    self.latitud = location.latitude
-                    self.longitud = location.longitude
-                    print(f"✅ Geocodificada '{self.direccion}' -> ({self.latitud}, {self.longitud})")
-                else:
-                    print(f"⚠️ No se encontró ubicación para '{self.direccion}'")
-            except GeocoderTimedOut:
-                print("⏱️ Error: geocodificación tardó demasiado")
-            except Exception as e:
-                print(f"❌ Error geocodificando dirección: {e}")
+        update_fields = kwargs.get("update_fields")
+        listado_cambio = self._afecta_listado_farmacias() and (
+            update_fields is None or bool(cache_farmacias.CAMPOS_LISTADO & set(update_fields))
+        )
+        direccion_cambio = (
+            "direccion" in self.__dict__
+            and (self._state.adding or self.direccion != self._direccion_original)
+            and (update_fields is None or "direccion" in update_fields)
+        )
+
+        # La celda de la grilla acompaña siempre a las coordenadas guardadas
+        if "latitud" in self.__dict__ and "longitud" in self.__dict__:
+            self.celda_geo = geo.celda(self.latitud, self.longitud)
+            if update_fields is not None and {"latitud", "longitud"} & set(update_fields):
+                kwargs["update_fields"] = set(update_fields) | {"celda_geo"}
 
         super().save(*args, **kwargs)
 
+        from .autenticacion import CLAIMS_USUARIO, invalidar
+        claims_cambio = update_fields is None or bool(set(CLAIMS_USUARIO) & set(update_fields))
+        if "is_active" in self.__dict__:
+            invalidar(self.pk, self.is_active, claims_cambio)
+        else:
+            activo = User.objects.filter(pk=self.pk).values_list("is_active", flat=True).first()
+            invalidar(self.pk, activo, claims_cambio)
+
+        if listado_cambio:
+            self._tipo_original = self.tipo_usuario
+            cache_farmacias.invalidar()
+
+        if direccion_cambio:
+            self._direccion_original = self.direccion
+            if self.tipo_usuario == "farmacia" and self.direccion:
+                from .geocoding import encolar
+                encolar(self.pk, self.direccion)
+
+    def delete(self, *args, **kwargs):
+        from .autenticacion import invalidar
+        invalidar(self.pk, False)
+        if self._afecta_listado_farmacias():
+            cache_farmacias.invalidar()
+        return super().delete(*args, **kwargs)
+
+    def _afecta_listado_farmacias(self):
+        return "farmacia" in (self.__dict__.get("tipo_usuario"), self._tipo_original)
+
     def __str__(self):
         return f"{self.email} ({self.tipo_usuario})"
 
 
+# ----------------------------------------------------
+# 🔹 CACHE DE GEOCODIFICACIÓN
+# ----------------------------------------------------
+class DireccionGeocodificada(models.Model):
+    """
+    Resultado del geocoder por dirección normalizada (lat/lng nulos = no
+    encontrada). fecha es el último intento: las no encontradas se reintentan.
+    """
+    direccion_normalizada = models.CharField(max_length=255, unique=True)
+    latitud = models.FloatField(blank=True, null=True)
+    longitud = models.FloatField(blank=True, null=True)
+    fecha = models.DateTimeField(auto_now=True)
+
+    @property
+    def coordenadas(self):
+        if self.latitud is None or self.longitud is None:
+            return None
+        return self.latitud, self.longitud
+
+    def __str__(self):
+        return self.direccion_normalizada
+
+
 # ----------------------------------------------------
 # 🔹 PEDIDO
 # ----------------------------------------------------
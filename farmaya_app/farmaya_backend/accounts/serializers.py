@@ -1,13 +1,64 @@
 import re
+import time
+from functools import reduce
+from operator import or_
+
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Lower
 from productos.models import Producto  # ✅ import correcto
+from productos.serializers import CamposParcialesMixin, ClaveNaturalMixin, EdicionProductoMixin
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .autenticacion import CLAIM_EMISION
 
 
 User = get_user_model()
 
+# ============================================================
+# 🔹 UNICIDAD DE DATOS DE USUARIO
+# ============================================================
+MENSAJES_DUPLICADO = {
+    'email': 'Ya existe un/a usuario con este/a Correo electrónico.',
+    'nombre': 'Ya existe un/a usuario con este/a nombre.',
+    'matricula': 'Ya existe una farmacia registrada con esta matrícula.',
+    'telefono': 'Ya existe un usuario con este teléfono.',
+    'dni': 'Ya existe un usuario registrado con este DNI.',
+}
+# Se comparan con LOWER() de los dos lados, como los índices user_*_lower_idx
+SIN_MAYUSCULAS = {'email', 'nombre'}
+
+
+def conflictos_de_unicidad(valores, excluir_pk=None):
+    """
+    Revisa en una sola consulta qué valores ya usa otro usuario y devuelve
+    {campo: [mensaje]} con todos los campos en conflicto. Cada condición del
+    OR tiene su índice (lower(email), lower(nombre), telefono, matricula, dni).
+    """
+    condiciones = {}
+    for campo, valor in valores.items():
+        if valor is None or valor == '':
+            continue
+        if campo in SIN_MAYUSCULAS:
+            condiciones[campo] = Q(**{f'{campo}_min': Lower(Value(valor))})
+        else:
+            condiciones[campo] = Q(**{campo: valor})
+    if not condiciones:
+        return {}
+
+    usuarios = (
+        User.objects.alias(email_min=Lower('email'), nombre_min=Lower('nombre'))
+        .filter(reduce(or_, condiciones.values()))
+    )
+    if excluir_pk is not None:
+        usuarios = usuarios.exclude(pk=excluir_pk)
+    totales = usuarios.aggregate(
+        **{campo: Count('pk', filter=condicion) for campo, condicion in condiciones.items()}
+    )
+    return {campo: [MENSAJES_DUPLICADO[campo]] for campo, total in totales.items() if total}
+
+
 # ============================================================
 # 🔹 SERIALIZER DE USUARIO (para listar, editar y mostrar datos)
 # ============================================================
@@ -21,7 +72,12 @@ class UserSerializer(serializers.ModelSerializer):
             'tipo_usuario', 'direccion', 'telefono',
             'horarios', 'latitud', 'longitud', 'matricula'
         ]
-        extra_kwargs = {'password': {'write_only': True}}
+        extra_kwargs = {
+            'password': {'write_only': True},
+            # email y dni se validan junto con nombre en validate(), en una sola consulta
+            'email': {'validators': []},
+            'dni': {'validators': []},
+        }
 
     def validate_nombre(self, value):
         """Valida que el nombre solo contenga letras y espacios en blanco."""
@@ -31,26 +87,24 @@ class UserSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'No se admiten numeros en el nombre ingrese un nombre valido'
                 )
-            # Validar si el nombre ya está en uso (solo en create, no en update)
-            # En update se valida en el método validate para excluir el usuario actual
-            if self.instance is None:  # Solo validar en create
-                nombre_normalizado = value.strip()
-                if User.objects.filter(nombre__iexact=nombre_normalizado).exists():
-                    raise serializers.ValidationError(
-                        'Ya existe un/a usuario con este/a nombre.'
-                    )
         return value
 
     def validate(self, attrs):
-        """Validación adicional para update: verificar nombre duplicado excluyendo el usuario actual."""
-        if self.instance and 'nombre' in attrs:
-            nombre_nuevo = attrs.get('nombre', '').strip()
-            if nombre_nuevo:
-                # Verificar si otro usuario (diferente al actual) tiene ese nombre
-                if User.objects.filter(nombre__iexact=nombre_nuevo).exclude(pk=self.instance.pk).exists():
-                    raise serializers.ValidationError({
-                        'nombre': ['Ya existe un/a usuario con este/a nombre.']
-                    })
+        """Verifica que email, nombre y DNI no los use otro usuario (excluye al actual en update)."""
+        valores = {campo: attrs.get(campo) for campo in ('email', 'dni') if campo in attrs}
+        if 'nombre' in attrs:
+            valores['nombre'] = (attrs.get('nombre') or '').strip()
+        if self.instance is not None:
+            # Solo cuenta como conflicto si el valor cambia
+            valores = {
+                campo: valor for campo, valor in valores.items()
+                if valor != getattr(self.instance, campo)
+            }
+        conflictos = conflictos_de_unicidad(
+            valores, excluir_pk=self.instance.pk if self.instance is not None else None
+        )
+        if conflictos:
+            raise serializers.ValidationError(conflictos)
         return attrs
 
     def create(self, validated_data):
@@ -84,12 +138,11 @@ class RegisterSerializer(serializers.ModelSerializer):
             'direccion', 'telefono', 'horarios',
             'latitud', 'longitud', 'matricula'
         ]
+        # email y dni se validan en validate() junto con el resto, en una sola consulta
+        extra_kwargs = {'email': {'validators': []}, 'dni': {'validators': []}}
 
     def validate_email(self, value):
-        normalized_email = value.lower()
-        if User.objects.filter(email__iexact=normalized_email).exists():
-            raise serializers.ValidationError('Ya existe un/a usuario con este/a Correo electrónico.')
-        return normalized_email
+        return value.lower()
 
     def validate_nombre(self, value):
         """Valida que el nombre solo contenga letras y espacios en blanco."""
@@ -99,33 +152,15 @@ class RegisterSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'No se admiten numeros en el nombre ingrese un nombre valido'
                 )
-            # Validar si el nombre ya está en uso
-            nombre_normalizado = value.strip()
-            if User.objects.filter(nombre__iexact=nombre_normalizado).exists():
-                raise serializers.ValidationError(
-                    'Ya existe un/a usuario con este/a nombre.'
-                )
         return value
+
     def validate_matricula(self, value):
-        """Valida que la matrícula sea única"""
         if value:
-            matricula_limpia = str(value).strip()
-        
-            # Validar unicidad
-            if User.objects.filter(matricula=matricula_limpia).exists():
-                raise serializers.ValidationError('Ya existe una farmacia registrada con esta matrícula.')
-            
-            return matricula_limpia
+            return str(value).strip()
         return value
-    
-    def validate_telefono(self, value):
-        telefono_limpio = str(value).strip()
-
-        # Validar que no exista en la base
-        if User.objects.filter(telefono=telefono_limpio).exists():
-            raise serializers.ValidationError('Ya existe un usuario con este teléfono.')
 
-        return telefono_limpio
+    def validate_telefono(self, value):
+        return str(value).strip()
 
     def validate_dni(self, value):
         """Valida que el DNI solo contenga números y tenga 7, 8 o 10 dígitos."""
@@ -145,12 +180,6 @@ class RegisterSerializer(serializers.ModelSerializer):
                     'El DNI debe tener 7, 8 o 10 dígitos.'
                 )
             
-            # Validar que no exista otro usuario con el mismo DNI
-            if User.objects.filter(dni=dni_limpio).exists():
-                raise serializers.ValidationError(
-                    'Ya existe un usuario registrado con este DNI.'
-                )
-            
             return dni_limpio
         return value
 
@@ -177,6 +206,17 @@ class RegisterSerializer(serializers.ModelSerializer):
                     'dni': 'El DNI es obligatorio para clientes y repartidores.'
                 })
 
+        # Unicidad de todos los campos en una consulta, informando cada conflicto
+        conflictos = conflictos_de_unicidad({
+            'email': attrs.get('email'),
+            'nombre': (attrs.get('nombre') or '').strip(),
+            'matricula': matricula,
+            'telefono': telefono,
+            'dni': dni,
+        })
+        if conflictos:
+            raise serializers.ValidationError(conflictos)
+
         return attrs
 
     def create(self, validated_data):
@@ -203,14 +243,26 @@ class FarmaciaSerializer(serializers.ModelSerializer):
 # ============================================================
 # 🔹 PRODUCTOS
 # ============================================================
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(EdicionProductoMixin, ClaveNaturalMixin, CamposParcialesMixin, serializers.ModelSerializer):
+    stock_disponible = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Producto
         fields = [
             'id', 'farmacia', 'nombre', 'presentacion', 'descripcion',
-            'precio', 'stock', 'requiere_receta'
+            'precio', 'stock', 'stock_disponible', 'requiere_receta'
         ]
         read_only_fields = ['id', 'farmacia']
+
+
+class ProductoBusquedaSerializer(ProductoSerializer):
+    """Resultado de /api/productos/buscar/: incluye qué farmacia lo tiene."""
+    farmacia_nombre = serializers.CharField(source='farmacia.nombre', read_only=True)
+
+    class Meta(ProductoSerializer.Meta):
+        fields = ProductoSerializer.Meta.fields + ['farmacia_nombre']
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Serializer personalizado para devolver info extra en el login."""
 
@@ -227,4 +279,5 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['tipo_usuario'] = user.tipo_usuario
         token['nombre'] = user.nombre or ''
+        token[CLAIM_EMISION] = time.time_ns()
         return token
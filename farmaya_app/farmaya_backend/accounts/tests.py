@@ -0,0 +1,548 @@
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from backend import replicas
+from productos.models import Producto
+
+from . import autenticacion, cache_farmacias, geo, login
+from .serializers import CustomTokenObtainPairSerializer, RegisterSerializer, UserSerializer, conflictos_de_unicidad
+from .geocoding import LocalGeocoder, normalizar_direccion, resolver
+from .models import DireccionGeocodificada, User
+
+
+@override_settings(
+    GEOCODER_BACKEND='accounts.geocoding.LocalGeocoder',
+    GEOCODER_EN_SEGUNDO_PLANO=False,
+    GEOCODER_LOCAL_DIRECCIONES={
+        'av. siempre viva 742, rosario': (-32.95, -60.65),
+        'cordoba 1500, rosario': (-32.94, -60.64),
+    },
+)
+class GeocodificacionTests(TestCase):
+    def crear_farmacia(self, direccion):
+        with self.captureOnCommitCallbacks(execute=True):
+            return User.objects.create_user(
+                email='farmacia@test.com', tipo_usuario='farmacia', direccion=direccion
+            )
+
+    def test_normaliza_acentos_mayusculas_y_espacios(self):
+        self.assertEqual(
+            normalizar_direccion('  Avenida  Córdoba   1500 '), 'avenida cordoba 1500'
+        )
+
+    def test_geocodifica_al_crear_despues_del_commit(self):
+        farmacia = self.crear_farmacia('Av. Siempre Viva 742,  Rosario')
+
+        farmacia.refresh_from_db()
+        self.assertEqual((farmacia.latitud, farmacia.longitud), (-32.95, -60.65))
+        self.assertEqual(farmacia.celda_geo, geo.celda(-32.95, -60.65))
+        self.assertTrue(
+            DireccionGeocodificada.objects.filter(
+                direccion_normalizada='av. siempre viva 742, rosario'
+            ).exists()
+        )
+
+    def test_no_geocodifica_si_la_direccion_no_cambia(self):
+        farmacia = self.crear_farmacia('Av. Siempre Viva 742, Rosario')
+        farmacia = User.objects.get(pk=farmacia.pk)
+
+        with mock.patch.object(LocalGeocoder, 'geocode') as geocode:
+            with self.captureOnCommitCallbacks(execute=True):
+                farmacia.first_name = 'Ana'
+                farmacia.save()
+                farmacia.set_unusable_password()
+                farmacia.save(update_fields=['password'])
+
+        geocode.assert_not_called()
+
+    def test_usa_la_tabla_de_cache_antes_que_el_geocoder(self):
+        DireccionGeocodificada.objects.create(
+            direccion_normalizada='cordoba 1500, rosario', latitud=1.0, longitud=2.0
+        )
+        farmacia = self.crear_farmacia('Av. Siempre Viva 742, Rosario')
+
+        with mock.patch.object(LocalGeocoder, 'geocode') as geocode:
+            with self.captureOnCommitCallbacks(execute=True):
+                farmacia.direccion = 'CÓRDOBA 1500, Rosario'
+                farmacia.save()
+
+        geocode.assert_not_called()
+        farmacia.refresh_from_db()
+        self.assertEqual((farmacia.latitud, farmacia.longitud), (1.0, 2.0))
+
+    def test_direccion_desconocida_no_toca_coordenadas(self):
+        farmacia = self.crear_farmacia('Calle Inexistente 1')
+
+        farmacia.refresh_from_db()
+        self.assertIsNone(farmacia.latitud)
+        entrada = DireccionGeocodificada.objects.get(direccion_normalizada='calle inexistente 1')
+        self.assertIsNone(entrada.coordenadas)
+
+    @override_settings(GEOCODER_REINTENTO_NO_ENCONTRADAS=60)
+    def test_direccion_no_encontrada_se_reintenta_pasado_el_intervalo(self):
+        DireccionGeocodificada.objects.create(direccion_normalizada='cordoba 1500, rosario')
+
+        with mock.patch.object(LocalGeocoder, 'geocode') as geocode:
+            self.assertIsNone(resolver('Cordoba 1500, Rosario'))
+        geocode.assert_not_called()
+
+        DireccionGeocodificada.objects.update(fecha=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(resolver('Cordoba 1500, Rosario'), (-32.94, -60.64))
+        self.assertEqual(DireccionGeocodificada.objects.get().coordenadas, (-32.94, -60.64))
+
+    def test_error_del_geocoder_no_rompe_el_guardado_ni_se_cachea(self):
+        with mock.patch.object(LocalGeocoder, 'geocode', side_effect=TimeoutError), \
+                self.assertLogs('accounts.geocoding', 'WARNING'):
+            farmacia = self.crear_farmacia('Cordoba 1500, Rosario')
+
+        self.assertTrue(User.objects.filter(pk=farmacia.pk).exists())
+        self.assertFalse(DireccionGeocodificada.objects.exists())
+
+
+class FarmaciasCercanasTests(APITestCase):
+    # Rosario, Argentina
+    LAT, LNG = -32.9468, -60.6393
+
+    def setUp(self):
+        caches['default'].clear()
+        self.url = reverse('farmacias_list')
+        self.cerca = self.crear_farmacia('Cerca', -32.9500, -60.6400)       # ~0.4 km
+        self.media = self.crear_farmacia('Media', -32.9900, -60.6800)       # ~6 km
+        self.lejos = self.crear_farmacia('Lejos', -31.4201, -64.1888)       # Córdoba
+        self.crear_farmacia('Sin ubicación', None, None)
+
+    def crear_farmacia(self, nombre, lat, lng):
+        return User.objects.create_user(
+            email=f'{nombre.replace(" ", "")}@test.com', tipo_usuario='farmacia',
+            nombre=nombre, latitud=lat, longitud=lng,
+        )
+
+    def test_celda_se_guarda_con_las_coordenadas(self):
+        self.assertEqual(self.cerca.celda_geo, geo.celda(-32.95, -60.64))
+
+        self.cerca.latitud, self.cerca.longitud = -31.42, -64.18
+        self.cerca.save(update_fields=['latitud', 'longitud'])
+        self.cerca.refresh_from_db()
+        self.assertEqual(self.cerca.celda_geo, geo.celda(-31.42, -64.18))
+
+    def test_celdas_cruzan_el_antimeridiano(self):
+        self.assertEqual(geo.celda(0.05, 180.0), geo.celda(0.05, -180.0))
+        self.assertIn(geo.celda(0.05, -179.95), geo.celdas_en(0.0, 0.1, 179.9, 180.1))
+
+    def test_sin_ubicacion_devuelve_el_listado_completo(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_devuelve_las_mas_cercanas_ordenadas_con_distancia(self):
+        response = self.client.get(self.url, {'lat': self.LAT, 'lng': self.LNG, 'radius': 20})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['id'] for f in response.data], [self.cerca.id, self.media.id])
+        self.assertLess(response.data[0]['distancia_km'], 1)
+        self.assertLess(response.data[1]['distancia_km'], 10)
+
+    def test_respeta_radio_y_limite(self):
+        response = self.client.get(self.url, {'lat': self.LAT, 'lng': self.LNG, 'radius': 2})
+        self.assertEqual([f['id'] for f in response.data], [self.cerca.id])
+
+        response = self.client.get(
+            self.url, {'lat': self.LAT, 'lng': self.LNG, 'radius': 20, 'limit': 1}
+        )
+        self.assertEqual([f['id'] for f in response.data], [self.cerca.id])
+
+    def test_parametros_invalidos(self):
+        for params in (
+            {'lat': 'x', 'lng': self.LNG},
+            {'lat': self.LAT},
+            {'lat': self.LAT, 'lng': self.LNG, 'radius': 500},
+            {'lat': self.LAT, 'lng': self.LNG, 'limit': 0},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_consulta_candidatas_por_indice_de_celdas(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'lat': self.LAT, 'lng': self.LNG})
+
+        sql = next(q['sql'] for q in queries.captured_queries if 'celda_geo' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIn('user_tipo_celda_idx', plan)
+
+
+class FarmaciasListadoCacheTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.url = reverse('farmacias_list')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia = User.objects.create_user(
+                email='farmacia@test.com', tipo_usuario='farmacia', nombre='Farmacia',
+                latitud=-32.95, longitud=-60.64,
+            )
+            self.cliente = User.objects.create_user(email='cliente@test.com', nombre='Cliente')
+
+    def test_sirve_el_cuerpo_cacheado_sin_consultar_la_base(self):
+        primera = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.url)
+
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+        self.assertIn('max-age', segunda['Cache-Control'])
+        self.assertEqual(segunda.json()[0]['nombre'], 'Farmacia')
+
+    def test_if_none_match_devuelve_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_cambio_de_farmacia_invalida_al_confirmar(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.nombre = 'Farmacia Centro'
+            self.farmacia.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['nombre'], 'Farmacia Centro')
+
+    def test_cambios_ajenos_al_listado_no_invalidan(self):
+        version = cache_farmacias.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.nombre = 'Otro'
+            self.cliente.save()
+            self.farmacia.set_unusable_password()
+            self.farmacia.save(update_fields=['password'])
+
+        self.assertEqual(cache_farmacias.version(), version)
+
+    def test_baja_de_farmacia_invalida(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.delete()
+
+        self.assertEqual(self.client.get(self.url).json(), [])
+
+    def test_funciona_con_cache_en_archivos(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'usuarios': settings.CACHES['usuarios'],
+                'farmacias': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': directorio,
+                },
+            },
+            FARMACIAS_CACHE='farmacias',
+        ):
+            etag = self.client.get(self.url)['ETag']
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.farmacia.telefono = '341555'
+                self.farmacia.save(update_fields=['telefono'])
+
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class UnicidadRegistroTests(TestCase):
+    def setUp(self):
+        self.existente = User.objects.create_user(
+            email='Ana@Test.com', nombre='Ana Perez', dni='30111222',
+            telefono='341555', matricula='M-1', tipo_usuario='farmacia',
+        )
+        self.datos = {
+            'email': 'nuevo@test.com', 'password': 'x', 'nombre': 'Juan Gomez',
+            'dni': '30999888', 'tipo_usuario': 'cliente', 'telefono': '341000',
+        }
+
+    def test_una_consulta_para_todos_los_campos(self):
+        serializer = RegisterSerializer(data=self.datos)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_informa_todos_los_conflictos_sin_distinguir_mayusculas(self):
+        datos = dict(
+            self.datos, email='ANA@test.COM', nombre='  ana PEREZ ', dni='30111222',
+            telefono='341555', matricula='M-1', tipo_usuario='farmacia',
+        )
+        serializer = RegisterSerializer(data=datos)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            set(serializer.errors), {'email', 'nombre', 'dni', 'telefono', 'matricula'}
+        )
+
+    def test_update_excluye_al_propio_usuario(self):
+        otro = User.objects.create_user(email='otro@test.com', nombre='Otro')
+
+        propio = UserSerializer(self.existente, data={'nombre': 'ANA PEREZ'}, partial=True)
+        self.assertTrue(propio.is_valid(), propio.errors)
+
+        ajeno = UserSerializer(otro, data={'nombre': 'ana perez', 'email': 'ana@test.com'}, partial=True)
+        self.assertFalse(ajeno.is_valid())
+        self.assertEqual(set(ajeno.errors), {'nombre', 'email'})
+
+    def test_cada_condicion_usa_su_indice(self):
+        with CaptureQueriesContext(connection) as ctx:
+            conflictos_de_unicidad({
+                'email': 'a@test.com', 'nombre': 'Ana', 'telefono': '1', 'matricula': 'M', 'dni': '1',
+            })
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertNotIn('SCAN', plan)
+        for indice in ('user_email_lower_idx', 'user_nombre_lower_idx', 'user_telefono_idx', 'user_matricula_idx'):
+            self.assertIn(indice, plan)
+
+
+class AutenticacionClaimsTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches['usuarios'].clear()
+        autenticacion.filas.limpiar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia = User.objects.create_user(
+                email='farmacia@test.com', tipo_usuario='farmacia', nombre='Farmacia',
+            )
+        self.autenticar(self.farmacia)
+
+    def autenticar(self, user, claims=True):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        if not claims:
+            for claim in autenticacion.CLAIMS_USUARIO:
+                del token[claim]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def consultas_de_usuario(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "accounts_user"' in q['sql']]
+
+    def test_get_usa_los_claims_sin_consultar_usuarios(self):
+        self.assertEqual(self.consultas_de_usuario(reverse('producto-list')), [])
+
+    def test_usuario_de_claims_compara_igual_y_carga_lo_demas_a_pedido(self):
+        request = mock.Mock(method='GET', parser_context={'view': mock.Mock()})
+        token = CustomTokenObtainPairSerializer.get_token(self.farmacia).access_token
+
+        user = autenticacion.ClaimsJWTAuthentication()._usuario(request, token)
+
+        self.assertEqual(user, self.farmacia)
+        self.assertEqual(user.tipo_usuario, 'farmacia')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'farmacia@test.com')
+
+    def test_vista_con_usuario_completo_lo_cachea(self):
+        url = reverse('user_detail')
+        self.assertEqual(len(self.consultas_de_usuario(url)), 1)
+        self.assertEqual(self.consultas_de_usuario(url), [])
+        self.assertEqual(self.client.get(url).json()['email'], 'farmacia@test.com')
+
+    def test_token_sin_claims_usa_la_fila(self):
+        self.autenticar(self.farmacia, claims=False)
+        self.assertEqual(len(self.consultas_de_usuario(reverse('producto-list'))), 1)
+
+    def test_guardar_invalida_la_fila_cacheada(self):
+        url = reverse('user_detail')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.farmacia.pk).update(nombre='Otra')
+            self.farmacia.refresh_from_db()
+            self.farmacia.save(update_fields=['nombre'])
+
+        self.assertEqual(self.client.get(url).json()['nombre'], 'Otra')
+
+    def test_usuario_desactivado_se_rechaza_aunque_use_claims(self):
+        self.client.get(reverse('user_detail'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.is_active = False
+            self.farmacia.save()
+
+        self.assertEqual(self.client.get(reverse('producto-list')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('user_detail')).status_code, 401)
+
+    def test_sin_marca_se_lee_la_fila_y_no_los_claims(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.is_active = False
+            self.farmacia.save()
+        # Se pierde la marca de la desactivación (desalojo, reinicio del cache)
+        caches['usuarios'].clear()
+        autenticacion.filas.limpiar()
+
+        self.assertEqual(self.client.get(reverse('producto-list')).status_code, 401)
+
+    def test_sin_marca_un_usuario_activo_consulta_la_base_una_vez(self):
+        caches['usuarios'].clear()
+        url = reverse('producto-list')
+        self.assertEqual(len(self.consultas_de_usuario(url)), 1)
+        self.assertEqual(self.consultas_de_usuario(url), [])
+
+    def test_desactivar_sin_cargar_is_active_consulta_el_estado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.farmacia.pk).update(is_active=False)
+            User.objects.only('nombre').get(pk=self.farmacia.pk).save(update_fields=['nombre'])
+
+        self.assertEqual(self.client.get(reverse('producto-list')).status_code, 401)
+
+    def test_claims_anteriores_a_un_cambio_no_se_usan_aunque_se_refresque(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.farmacia)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.tipo_usuario = 'cliente'
+            self.farmacia.save(update_fields=['tipo_usuario'])
+
+        # El refresh copia el tipo_usuario viejo al access token nuevo
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.assertEqual(self.client.get(reverse('pedidos-ventas')).status_code, 403)
+
+        # Un login posterior vuelve a usar los claims
+        self.autenticar(self.farmacia)
+        self.assertEqual(self.consultas_de_usuario(reverse('producto-list')), [])
+
+    def test_cambio_fuera_de_los_claims_no_los_descarta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farmacia.telefono = '1234'
+            self.farmacia.save(update_fields=['telefono'])
+
+        self.assertEqual(self.consultas_de_usuario(reverse('producto-list')), [])
+
+    def test_lru_descarta_los_menos_usados(self):
+        filas = autenticacion.CacheUsuarios()
+        with override_settings(AUTH_USUARIOS_LRU_MAX=2):
+            filas.guardar(1, None, ('a',))
+            filas.guardar(2, None, ('b',))
+            filas.obtener(1, None)
+            filas.guardar(3, None, ('c',))
+
+        self.assertEqual(filas.obtener(1, None), ('a',))
+        self.assertIsNone(filas.obtener(2, None))
+        self.assertIsNone(filas.obtener(3, 'otra marca'))
+
+
+@override_settings(LOGIN_HASH_EN_SEGUNDO_PLANO=False, PASSWORD_PBKDF2_ITERACIONES=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        self.url = reverse('token_obtain_pair')
+        self.user = User.objects.create_user(
+            email='cliente@test.com', password='clave-segura', nombre='Cliente',
+        )
+
+    def test_devuelve_tokens_y_usuario(self):
+        response = self.client.post(
+            self.url, {'email': 'cliente@test.com', 'password': 'clave-segura'}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'refresh', 'access', 'user'})
+        self.assertEqual(response.json()['user']['email'], 'cliente@test.com')
+
+    def test_credenciales_invalidas(self):
+        response = self.client.post(
+            self.url, {'email': 'cliente@test.com', 'password': 'otra'}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Usuario y/o contraseña incorrectos.'})
+        self.assertIn('realm="api"', response['WWW-Authenticate'])
+
+    def test_faltan_campos(self):
+        response = self.client.post(self.url, {'email': 'cliente@test.com'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+
+    def test_regenera_el_hash_con_las_iteraciones_configuradas(self):
+        self.user.password = PBKDF2PasswordHasher().encode('clave-segura', 'salsalsal', iterations=2000)
+        self.user.save(update_fields=['password'])
+
+        response = self.client.post(self.url, {'email': 'cliente@test.com', 'password': 'clave-segura'})
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.user.check_password('clave-segura'))
+
+    @override_settings(LOGIN_HASH_HILOS=1, LOGIN_HASH_COLA=0)
+    def test_pool_lleno_responde_429(self):
+        _, cupos = login._pool()
+        cupos.acquire()
+        try:
+            response = self.client.post(self.url, {'email': 'cliente@test.com', 'password': 'clave-segura'})
+        finally:
+            cupos.release()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(
+            self.client.post(self.url, {'email': 'cliente@test.com', 'password': 'clave-segura'}).status_code, 200,
+        )
+
+    @override_settings(LOGIN_HASH_EN_SEGUNDO_PLANO=True)
+    def test_en_segundo_plano_corre_en_el_pool(self):
+        hilo = async_to_sync(login.ejecutar)(lambda: threading.current_thread().name)
+
+        self.assertTrue(hilo.startswith('login'))
+
+
+@override_settings(DB_REPLICAS=['default'])
+class LecturaEnReplicaTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.farmacia = User.objects.create_user(
+            email='farmacia@test.com', tipo_usuario='farmacia', nombre='Farmacia', latitud=-32.95, longitud=-60.64,
+        )
+        self.producto = Producto.objects.create(farmacia=self.farmacia, nombre='Ibuprofeno', precio=100, stock=10)
+        patcher = mock.patch.object(replicas, 'copia_de', side_effect=lambda alias: time.time())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def elegidas(self, url, **params):
+        elegidas = []
+        original = replicas.replica_para_leer
+
+        def registrar():
+            alias = original()
+            elegidas.append(alias)
+            return alias
+
+        with mock.patch.object(replicas, 'replica_para_leer', registrar):
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        return set(elegidas)
+
+    def test_solo_el_listado_de_productos_usa_la_replica(self):
+        self.client.force_authenticate(self.farmacia)
+        self.assertEqual(self.elegidas(reverse('producto-list')), {'default'})
+        self.assertEqual(self.elegidas(reverse('producto-detail', args=[self.producto.id])), {None})
+
+    def test_listado_de_farmacias_cacheado_se_arma_desde_default(self):
+        self.assertEqual(self.elegidas(reverse('farmacias_list')), {None})
+        self.assertEqual(self.elegidas(reverse('farmacias_list'), lat=-32.95, lng=-60.64), {'default'})
@@ -7,6 +7,7 @@ from .views import (
     FarmaciaListView,
     CustomTokenObtainPairView,
     ProductoViewSet,
+    AjusteStockView,
 )
 
 router = DefaultRouter()
@@ -29,4 +30,9 @@ urlpatterns = [
     # 🔹 FARMACIAS
     # ============================================================
     path('usuarios/farmacias/', FarmaciaListView.as_view(), name='farmacias_list'),
+
+    # ============================================================
+    # 🔹 PRODUCTOS (antes del router para que no lo tome como un id)
+    # ============================================================
+    path('productos/stock/', AjusteStockView.as_view(), name='productos_stock'),
 ] + router.urls
@@ -1,21 +1,39 @@
-from rest_framework import generics, viewsets
+import json
+
+from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import APIException, PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
+from backend import replicas
+from pedidos.idempotencia import IdempotenciaMixin
+from productos import busqueda, importacion, stock
+from productos.autocompletado import autocompletado
 from productos.models import Producto  # ✅ import correcto
+from productos.pagination import ProductoCursorPagination
+from productos.serializers import AjusteStockSerializer, diferir_no_pedidos
 
+from . import cache_farmacias, geo, login
 from .serializers import (
     UserSerializer,
     RegisterSerializer,
     ProductoSerializer,
+    ProductoBusquedaSerializer,
     FarmaciaSerializer,  # ✅ Serializer para farmacias
     CustomTokenObtainPairSerializer,
 )
 
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 User = get_user_model()
 
@@ -35,18 +53,101 @@ class RegisterUserView(generics.CreateAPIView):
 # ============================================================
 # 🔹 LISTADO DE FARMACIAS (para el mapa en el frontend)
 # ============================================================
-class FarmaciaListView(generics.ListAPIView):
+class FarmaciaListView(replicas.LecturaEnReplicaMixin, generics.ListAPIView):
     """
     Endpoint: /api/farmacias/
     Devuelve todas las farmacias registradas con dirección y coordenadas.
+
+    Con ?lat=&lng= devuelve solo las `limit` farmacias más cercanas dentro de
+    `radius` km, ordenadas por distancia y con `distancia_km`.
     """
     serializer_class = FarmaciaSerializer
     permission_classes = [AllowAny]
+    radio_default_km = 10
+    radio_max_km = 50
+    limite_default = 20
+    limite_max = 100
 
     def get_queryset(self):
         # Filtra solo usuarios tipo farmacia con coordenadas
         return User.objects.filter(tipo_usuario='farmacia').exclude(latitud=None, longitud=None)
 
+    def list(self, request, *args, **kwargs):
+        if 'lat' in request.query_params or 'lng' in request.query_params:
+            return self._cercanas(request)
+
+        # Listado completo: cuerpo ya serializado, versionado por cache_farmacias.
+        # Se arma desde default: armado desde una réplica atrasada quedaría
+        # guardado con la versión nueva hasta el próximo cambio
+        with replicas.en_primaria():
+            cuerpo, etag = cache_farmacias.obtener(
+                lambda: JSONRenderer().render(self.get_serializer(self.get_queryset(), many=True).data)
+            )
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={getattr(settings, "FARMACIAS_CACHE_MAX_AGE", 60)}',
+        }
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified(headers=headers)
+        return HttpResponse(cuerpo, content_type='application/json', headers=headers)
+
+    def _parametro(self, request, nombre, tipo, default, maximo):
+        try:
+            valor = tipo(request.query_params.get(nombre, default))
+        except (TypeError, ValueError):
+            return None
+        return valor if 0 < valor <= maximo else None
+
+    def _cercanas(self, request):
+        coordenadas = geo.parse_coordenadas(
+            request.query_params.get('lat'), request.query_params.get('lng')
+        )
+        if coordenadas is None:
+            return Response(
+                {'detail': 'La ubicación enviada no es válida.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        lat, lng = coordenadas
+
+        radio = self._parametro(request, 'radius', float, self.radio_default_km, self.radio_max_km)
+        if radio is None:
+            return Response(
+                {'detail': f'El radio debe estar entre 0 y {self.radio_max_km} km.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limite = self._parametro(request, 'limit', int, self.limite_default, self.limite_max)
+        if limite is None:
+            return Response(
+                {'detail': f'El límite debe estar entre 1 y {self.limite_max}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Candidatas: las farmacias de las celdas que cubren el círculo
+        # (índice sobre tipo_usuario, celda_geo), con el rectángulo como respaldo
+        lat_min, lat_max, lng_min, lng_max = geo.bounding_box(lat, lng, radio)
+        celdas = geo.celdas_en(lat_min, lat_max, lng_min, lng_max)
+        candidatas = self.get_queryset()
+        if celdas is not None:
+            candidatas = candidatas.filter(celda_geo__in=celdas)
+        else:
+            candidatas = candidatas.filter(
+                latitud__range=(lat_min, lat_max), longitud__range=(lng_min, lng_max)
+            )
+
+        distancias = {}
+        for farmacia_id, farmacia_lat, farmacia_lng in candidatas.values_list('id', 'latitud', 'longitud'):
+            distancia = geo.haversine_km(lat, lng, farmacia_lat, farmacia_lng)
+            if distancia <= radio:
+                distancias[farmacia_id] = distancia
+        cercanas = sorted(distancias, key=distancias.get)[:limite]
+
+        farmacias = User.objects.in_bulk(cercanas)
+        farmacias = [farmacias[farmacia_id] for farmacia_id in cercanas]
+        data = self.get_serializer(farmacias, many=True).data
+        for item, farmacia in zip(data, farmacias):
+            item['distancia_km'] = round(distancias[farmacia.pk], 2)
+        return Response(data)
+
 
 # ============================================================
 # 🔹 PERFIL DEL USUARIO AUTENTICADO
@@ -72,23 +173,74 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
 
 
 # ============================================================
-# 🔹 PRODUCTOS
+# 🔹 LOGIN / AUTENTICACIÓN
 # ============================================================
-class CustomTokenObtainPairView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
+def _validar_login(datos, request):
+    """Trabajo del pool de login: autentica (verifica el hash) y arma los tokens."""
+    serializer = CustomTokenObtainPairSerializer(data=datos, context={'request': request})
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as e:
+        raise InvalidToken(e.args[0])
+    return serializer.validated_data
 
 
-class ProductoViewSet(viewsets.ModelViewSet):
+@method_decorator(csrf_exempt, name='dispatch')
+class CustomTokenObtainPairView(View):
+    """
+    Endpoint: /api/login/
+    Mismas entradas y respuestas que TokenObtainPairView, pero la verificación
+    de la contraseña corre en el pool acotado de accounts.login: si está
+    lleno responde 429 con Retry-After. Si el hash guardado no es el del
+    primer hasher de PASSWORD_HASHERS, Django lo regenera al verificarlo.
+    """
+
+    async def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                datos = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'detail': 'JSON inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            datos = request.POST
+
+        try:
+            data = await login.ejecutar(_validar_login, datos, request)
+        except login.Saturado:
+            response = JsonResponse(
+                {'detail': 'Hay muchos inicios de sesión en curso. Probá de nuevo en unos segundos.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response['Retry-After'] = str(getattr(settings, 'LOGIN_REINTENTAR_EN', 1))
+            return response
+        except APIException as exc:
+            detalle = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            response = JsonResponse(detalle, status=exc.status_code, safe=False)
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                response['WWW-Authenticate'] = f'{jwt_settings.AUTH_HEADER_TYPES[0]} realm="api"'
+            return response
+        return JsonResponse(data)
+
+
+# ============================================================
+# 🔹 PRODUCTOS
+# ============================================================
+class ProductoViewSet(replicas.LecturaEnReplicaMixin, viewsets.ModelViewSet):
     """
     CRUD completo de productos.
     Rutas automáticas: /api/productos/
+    Los listados se paginan por cursor y aceptan ?fields=id,nombre,... para
+    devolver (y leer de la base) solo esos campos. El listado lee de una
+    réplica si hay alguna al día (ver backend.replicas).
     """
+    acciones_en_replica = ('list',)
     queryset = Producto.objects.select_related('farmacia').all()
     serializer_class = ProductoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ProductoCursorPagination
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = diferir_no_pedidos(super().get_queryset(), self.request)
         farmacia_param = self.request.query_params.get('farmacia')
 
         if self.action == 'listar_por_farmacia' and 'farmacia_id' in self.kwargs:
@@ -131,3 +283,124 @@ class ProductoViewSet(viewsets.ModelViewSet):
             return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(productos, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='buscar')
+    def buscar(self, request):
+        """
+        Endpoint: /api/productos/buscar/?q=ibuprofeno 400&farmacia=<id>&con_stock=0&limit=20
+        Búsqueda por texto (sin distinguir acentos) ordenada por relevancia.
+        Por defecto solo devuelve productos con stock disponible.
+        """
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response(
+                {'detail': 'Indicá qué producto buscar con el parámetro q.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limite = min(int(request.query_params.get('limit', 20)), 100)
+            farmacia_id = request.query_params.get('farmacia')
+            farmacia_id = int(farmacia_id) if farmacia_id else None
+        except ValueError:
+            return Response(
+                {'detail': 'Los parámetros limit y farmacia deben ser números.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limite < 1:
+            return Response(
+                {'detail': 'El límite debe ser mayor a 0.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        con_stock = request.query_params.get('con_stock', '1') not in ('0', 'false')
+
+        productos = busqueda.buscar(texto, farmacia_id=farmacia_id, con_stock=con_stock, limite=limite)
+        return Response(ProductoBusquedaSerializer(productos, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='importar')
+    def importar(self, request):
+        """
+        Endpoint: POST /api/productos/importar/
+        Crea o actualiza en bloque el catálogo de la farmacia autenticada. El
+        cuerpo es CSV (Content-Type: text/csv) o NDJSON (application/x-ndjson,
+        o ?formato=ndjson) y se procesa a medida que se lee.
+        """
+        if request.user.tipo_usuario != 'farmacia':
+            raise PermissionDenied('Solo las farmacias pueden importar productos.')
+
+        formato = request.query_params.get('formato')
+        if formato is None:
+            content_type = request.content_type.split(';')[0].strip()
+            formato = 'ndjson' if content_type in ('application/x-ndjson', 'application/jsonl') else 'csv'
+        if request.stream is None:
+            return Response({'detail': 'El cuerpo está vacío.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resumen = importacion.importar(request.user, importacion.leer_filas(request.stream, formato))
+        except importacion.FormatoInvalido as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response(
+                {'detail': 'El archivo debe estar codificado en UTF-8.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(resumen.como_dict())
+
+    @action(detail=False, methods=['get'], url_path='autocompletar')
+    def autocompletar(self, request):
+        """
+        Endpoint: /api/productos/autocompletar/?q=ibu&limit=10
+        Sugerencias por prefijo servidas desde memoria (ver productos.autocompletado).
+        """
+        try:
+            limite = max(1, min(int(request.query_params.get('limit', 10)), 20))
+        except ValueError:
+            limite = 10
+        return Response(autocompletado.sugerir(request.query_params.get('q', ''), limite))
+
+
+# ============================================================
+# 🔹 AJUSTE DE STOCK EN LOTE (sincronización con el POS)
+# ============================================================
+class AjusteStockView(IdempotenciaMixin, APIView):
+    """
+    Endpoint: POST /api/productos/stock/
+    Recibe [{"producto_id": 1, "delta": -3}, ...] y suma cada delta al stock
+    de los productos de la farmacia autenticada, todo en una transacción y sin
+    leer ni reescribir la fila completa. Devuelve el stock resultante.
+    Con Idempotency-Key un reintento no vuelve a aplicar los deltas.
+    """
+    permission_classes = [IsAuthenticated]
+    max_items = 20000
+
+    def post(self, request):
+        if request.user.tipo_usuario != 'farmacia':
+            raise PermissionDenied('Solo las farmacias pueden ajustar stock.')
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {'detail': 'Enviá una lista de {producto_id, delta}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(request.data) > self.max_items:
+            return Response(
+                {'detail': f'Se pueden ajustar hasta {self.max_items} productos por solicitud.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = AjusteStockSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        deltas = {}
+        for item in serializer.validated_data:
+            deltas[item['producto_id']] = deltas.get(item['producto_id'], 0) + item['delta']
+
+        try:
+            resultado = stock.ajustar(deltas, farmacia_id=request.user.pk)
+        except stock.AjusteInvalido as error:
+            return Response(
+                {'detail': str(error), 'errores': error.errores},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response([
+            {'producto_id': pk, 'stock': actual, 'stock_disponible': actual - reservado}
+            for pk, (actual, reservado) in resultado.items()
+        ])
+
@@ -0,0 +1,162 @@
+"""
+Lecturas de los listados desde réplicas de la base (settings.DB_REPLICAS).
+
+Solo leen de una réplica los GET de las vistas con LecturaEnReplicaMixin;
+todo lo demás (escrituras, lecturas dentro de un POST, comandos) va a
+default. Una réplica se usa si:
+
+- su última copia tiene menos de DB_REPLICAS_RETRASO_MAXIMO segundos, y
+- la copia es posterior a la última escritura del usuario (read-your-writes):
+  RegistroEscriturasMiddleware anota cuándo terminó cada POST/PUT/PATCH/DELETE
+  autenticado en el cache DB_REPLICAS_CACHE, por el mismo tiempo.
+
+Si ninguna réplica cumple, se lee de default. La réplica se elige una vez
+por request, al empezar la vista, y todas sus consultas van a la misma. Las
+réplicas son archivos SQLite que copia el comando sincronizar_replicas con la
+API de backup de SQLite; el momento de cada copia queda en <archivo>.copia,
+que se relee a lo sumo cada DB_REPLICAS_COPIA_TTL segundos.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Réplica elegida para la lectura en curso (None: leer de default)
+_replica = ContextVar('lectura_en_replica', default=None)
+
+# alias -> (time.monotonic() de la lectura, momento de la copia)
+_copias = {}
+
+
+def _replicas():
+    return getattr(settings, 'DB_REPLICAS', [])
+
+
+def _retraso_maximo():
+    return getattr(settings, 'DB_REPLICAS_RETRASO_MAXIMO', 10)
+
+
+def _cache():
+    return caches[getattr(settings, 'DB_REPLICAS_CACHE', 'default')]
+
+
+def archivo_de_copia(nombre):
+    return Path(f'{nombre}.copia')
+
+
+def copia_de(alias):
+    """Momento (time.time()) de la última copia de la réplica, o None si no se copió nunca."""
+    ahora = time.monotonic()
+    leida = _copias.get(alias)
+    if leida is not None and ahora - leida[0] < getattr(settings, 'DB_REPLICAS_COPIA_TTL', 1):
+        return leida[1]
+    try:
+        copia = float(archivo_de_copia(settings.DATABASES[alias]['NAME']).read_text())
+    except (OSError, ValueError):
+        copia = None
+    _copias[alias] = (ahora, copia)
+    return copia
+
+
+def marcar_escritura(user_id):
+    _cache().set(f'replicas:escritura:{user_id}', time.time(), timeout=_retraso_maximo() + 1)
+
+
+def ultima_escritura(user):
+    if not user.is_authenticated:
+        return 0.0
+    return _cache().get(f'replicas:escritura:{user.pk}', 0.0)
+
+
+def elegir_replica(desde):
+    """Alias de una réplica con la copia posterior a desde y al día, o None."""
+    if not _replicas():
+        return None
+    limite = max(desde, time.time() - _retraso_maximo())
+    vigentes = []
+    for alias in _replicas():
+        copia = copia_de(alias)
+        if copia is not None and copia > limite:
+            vigentes.append(alias)
+    return random.choice(vigentes) if vigentes else None
+
+
+def replica_para_leer():
+    """Alias de la réplica elegida para la lectura en curso, o None."""
+    return _replica.get()
+
+
+@contextmanager
+def en_primaria():
+    """Lee de default dentro del bloque aunque la vista lea de réplicas."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model is not None and model._meta.app_label == 'django_cache':
+            # Los caches en base (p. ej. CACHES['usuarios']) no admiten retraso
+            return DEFAULT_DB_ALIAS
+        return replica_para_leer()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las bases tienen los mismos datos (con algo de retraso)
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema con la copia
+        return db not in _replicas()
+
+
+class LecturaEnReplicaMixin:
+    """
+    Mixin para vistas de DRF: sus GET leen de una réplica. En un ViewSet,
+    acciones_en_replica limita a qué acciones aplica (p. ej. ('list',)).
+    """
+    acciones_en_replica = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            return
+        if self.acciones_en_replica is not None and getattr(self, 'action', None) not in self.acciones_en_replica:
+            return
+        self._lectura_en_replica = _replica.set(elegir_replica(ultima_escritura(request.user)))
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            token = getattr(self, '_lectura_en_replica', None)
+            if token is not None:
+                _replica.reset(token)
+
+
+class RegistroEscriturasMiddleware:
+    """Anota las escrituras de cada usuario para que sus lecturas siguientes vayan a default."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and _replicas():
+            # DRF deja el usuario autenticado también en el request de Django
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                marcar_escritura(user.pk)
+        return response
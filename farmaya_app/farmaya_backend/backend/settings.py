@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -44,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.replicas.RegistroEscriturasMiddleware',
 ]
 
 # -----------------------------
@@ -81,6 +83,56 @@ DATABASES = {
     }
 }
 
+# Perfil para servir con varios hilos o workers sobre SQLite (opt-in):
+# - WAL: las lecturas no esperan a las escrituras; con synchronous=NORMAL
+#   solo se hace fsync en los checkpoints y no en cada commit.
+# - mmap_size y cache_size (en KiB si es negativo) bajan las lecturas al disco.
+# - timeout es el busy_timeout (segundos) para la espera entre procesos.
+# - transaction_mode IMMEDIATE toma el bloqueo de escritura en el BEGIN y el
+#   ENGINE backend.sqlite pone las transacciones del proceso en una cola
+#   (ver backend/sqlite/base.py) en lugar de reintentar contra el bloqueo.
+# - Conexiones persistentes: se evita abrir el archivo y correr los PRAGMA en
+#   cada request. Si todo se sirve con ASGI, Django recomienda CONN_MAX_AGE = 0.
+# manage.py benchmark_sqlite compara este perfil con el de arriba.
+SQLITE_PRODUCCION = False
+SQLITE_PERFIL_PRODUCCION = {
+    'ENGINE': 'backend.sqlite',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'
+            'PRAGMA cache_size=-65536;'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+}
+if SQLITE_PRODUCCION:
+    DATABASES['default'].update(SQLITE_PERFIL_PRODUCCION)
+
+# Réplicas de lectura para los listados (ver backend/replicas.py). Se usan
+# solo si su copia tiene menos de DB_REPLICAS_RETRASO_MAXIMO segundos y es
+# posterior a la última escritura del usuario; las marcas de escritura van a
+# DB_REPLICAS_CACHE (con varios workers, un cache compartido). Para probarlo
+# en local con una copia SQLite:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'db_replica.sqlite3',
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DB_REPLICAS = ['replica']
+# y dejar corriendo: python manage.py sincronizar_replicas --intervalo 2
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+DB_REPLICAS = []
+DB_REPLICAS_RETRASO_MAXIMO = 10
+DB_REPLICAS_CACHE = 'default'
+# Cada cuántos segundos se relee el <archivo>.copia de cada réplica
+DB_REPLICAS_COPIA_TTL = 1
+
 # -----------------------------
 # VALIDACIÓN DE CONTRASEÑAS
 # -----------------------------
@@ -91,6 +143,19 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# El primero es el que se usa para hashear; los demás solo verifican hashes
+# viejos. PBKDF2 con 600.000 iteraciones es el mínimo que recomienda OWASP para
+# SHA256 (Django trae 1.000.000): cuesta menos CPU por login y los hashes
+# existentes se regeneran solos al iniciar sesión.
+PASSWORD_HASHERS = [
+    'accounts.hashers.PBKDF2IteracionesPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_PBKDF2_ITERACIONES = 600_000
+
 # -----------------------------
 # LOCALIZACIÓN
 # -----------------------------
@@ -126,7 +191,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # -----------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.autenticacion.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -138,3 +203,117 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=14),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+
+# -----------------------------
+# EVENTOS DE PEDIDOS (SSE)
+# -----------------------------
+# MemoriaBackend alcanza con un solo worker; con varios workers en la misma
+# máquina usar 'pedidos.eventos.ArchivoBackend'.
+PEDIDOS_EVENTOS_BACKEND = 'pedidos.eventos.MemoriaBackend'
+PEDIDOS_EVENTOS_ARCHIVO = BASE_DIR / 'pedidos_eventos.log'
+# Tamaño a partir del cual ArchivoBackend rota el archivo (a <archivo>.1)
+PEDIDOS_EVENTOS_ARCHIVO_MAX = 5 * 1024 * 1024
+PEDIDOS_EVENTOS_COLA_MAX = 100
+
+# -----------------------------
+# RESERVAS DE STOCK
+# -----------------------------
+RESERVA_STOCK_MINUTOS = 15
+# Máximo de unidades por producto en una reserva y total vigente por usuario
+RESERVA_STOCK_MAX_POR_PRODUCTO = 50
+RESERVA_STOCK_MAX_POR_USUARIO = 200
+
+# -----------------------------
+# CACHE
+# -----------------------------
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Marcas de usuarios modificados o desactivados (accounts.autenticacion):
+    # compartido entre procesos y sin desalojo por tamaño. La tabla la crea la
+    # migración accounts 0011; con Redis disponible puede reemplazarse por
+    # django.core.cache.backends.redis.RedisCache sin política de desalojo.
+    'usuarios': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'accounts_cache_usuarios',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': sys.maxsize},
+    },
+}
+
+# -----------------------------
+# IDEMPOTENCIA (header Idempotency-Key)
+# -----------------------------
+# Con varios workers conviene un cache compartido entre procesos
+# (p. ej. FileBasedCache) para que el reintento encuentre la respuesta.
+IDEMPOTENCIA_CACHE = 'default'
+IDEMPOTENCIA_TTL = 24 * 60 * 60
+
+# -----------------------------
+# GEOCODIFICACIÓN DE FARMACIAS
+# -----------------------------
+# accounts.geocoding.LocalGeocoder resuelve sin red contra
+# GEOCODER_LOCAL_DIRECCIONES (útil para tests y desarrollo offline).
+GEOCODER_BACKEND = 'accounts.geocoding.NominatimGeocoder'
+GEOCODER_LOCAL_DIRECCIONES = {}
+# En False se geocodifica en el mismo hilo al confirmar la transacción
+GEOCODER_EN_SEGUNDO_PLANO = True
+# Las direcciones no encontradas se vuelven a consultar pasado este tiempo (segundos)
+GEOCODER_REINTENTO_NO_ENCONTRADAS = 7 * 24 * 60 * 60
+
+# -----------------------------
+# CACHE DEL LISTADO DE FARMACIAS
+# -----------------------------
+# Con varios workers usar un alias FileBasedCache compartido, p. ej.:
+# CACHES['farmacias'] = {
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache' / 'farmacias',
+# }
+FARMACIAS_CACHE = 'default'
+FARMACIAS_CACHE_TTL = 24 * 60 * 60
+FARMACIAS_CACHE_MAX_AGE = 60
+
+# -----------------------------
+# AUTOCOMPLETADO DE PRODUCTOS
+# -----------------------------
+# Versión compartida del índice en memoria; con varios workers usar un
+# cache compartido (FileBasedCache) para que todos se enteren de los cambios.
+AUTOCOMPLETADO_CACHE = 'default'
+
+# -----------------------------
+# ARCHIVO DE PEDIDOS CERRADOS
+# -----------------------------
+# manage.py archivar_pedidos (pensado para cron) mueve a las tablas de archivo
+# los pedidos entregados, cancelados o no entregados sin cambios hace más de
+# PEDIDOS_ARCHIVO_DIAS días, en lotes de PEDIDOS_ARCHIVO_LOTE.
+PEDIDOS_ARCHIVO_DIAS = 180
+PEDIDOS_ARCHIVO_LOTE = 500
+
+# -----------------------------
+# AUTENTICACIÓN SIN CONSULTAR USUARIOS
+# -----------------------------
+# Los GET arman el usuario con los claims del JWT; los métodos que escriben y
+# las vistas de AUTH_VISTAS_USUARIO_COMPLETO usan la fila completa, cacheada
+# por proceso hasta AUTH_USUARIOS_LRU_TTL segundos. Las marcas de usuarios
+# modificados o desactivados van a AUTH_USUARIOS_CACHE, que tiene que ser
+# compartido entre procesos y no desalojar entradas para que una
+# desactivación llegue a todos (ver CACHES['usuarios']).
+AUTH_USUARIOS_CACHE = 'usuarios'
+AUTH_USUARIOS_LRU_MAX = 1024
+AUTH_USUARIOS_LRU_TTL = 30
+AUTH_VISTAS_USUARIO_COMPLETO = (
+    'accounts.views.UserDetailView',
+)
+
+# -----------------------------
+# LOGIN (verificación de contraseñas)
+# -----------------------------
+# /api/login/ verifica el hash en un pool de LOGIN_HASH_HILOS hilos con
+# LOGIN_HASH_COLA lugares de espera; con todo ocupado responde 429 y
+# Retry-After: LOGIN_REINTENTAR_EN. Conviene no pasar de los núcleos libres
+# para que los picos de login no le saquen CPU al resto de los endpoints.
+LOGIN_HASH_HILOS = 2
+LOGIN_HASH_COLA = 8
+LOGIN_REINTENTAR_EN = 1
+LOGIN_HASH_EN_SEGUNDO_PLANO = True
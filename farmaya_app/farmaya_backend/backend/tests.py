@@ -0,0 +1,195 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, override_settings
+
+from pedidos.management.commands.sincronizar_replicas import copiar
+
+from . import replicas
+from .sqlite.base import DatabaseWrapper, cola_de
+
+
+ALIAS = 'sqlite_produccion_test'
+
+
+@contextmanager
+def transaccion(conexion):
+    """Lo mismo que hace transaction.atomic() más externo con la conexión."""
+    conexion.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+    try:
+        yield
+    except Exception:
+        conexion.rollback()
+        raise
+    else:
+        conexion.commit()
+    finally:
+        conexion.set_autocommit(True)
+
+
+class PerfilSqliteProduccionTests(SimpleTestCase):
+    """Conexiones propias (fuera de django.db.connections) a un archivo temporal."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = str(Path(directorio.name) / 'base.sqlite3')
+        self.perfil = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {},
+            ALIAS: dict(settings.SQLITE_PERFIL_PRODUCCION, NAME=self.ruta),
+        })[ALIAS]
+        self.conexion = self.conectar()
+        with self.conexion.cursor() as cursor:
+            cursor.execute('CREATE TABLE contador (id INTEGER PRIMARY KEY, valor INTEGER NOT NULL)')
+            cursor.execute('INSERT INTO contador (id, valor) VALUES (1, 0)')
+
+    def conectar(self):
+        conexion = DatabaseWrapper(self.perfil, ALIAS)
+        self.addCleanup(conexion.close)
+        return conexion
+
+    def valor(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute('SELECT valor FROM contador WHERE id = 1')
+            return cursor.fetchone()[0]
+
+    def test_aplica_los_pragma_en_cada_conexion(self):
+        with self.conectar().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -65536)
+
+    def test_escrituras_concurrentes_sin_database_is_locked(self):
+        conexiones = [self.conectar() for _ in range(8)]
+        errores = []
+
+        def escribir(conexion):
+            conexion.inc_thread_sharing()
+            try:
+                for _ in range(20):
+                    with transaccion(conexion), conexion.cursor() as cursor:
+                        # Leer y después escribir: con BEGIN DEFERRED dos hilos
+                        # así se bloquean mutuamente y uno falla al instante
+                        cursor.execute('SELECT valor FROM contador WHERE id = 1')
+                        valor = cursor.fetchone()[0]
+                        cursor.execute('UPDATE contador SET valor = %s WHERE id = 1', [valor + 1])
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=escribir, args=(conexion,)) for conexion in conexiones]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(self.valor(), 160)
+        self.assertFalse(cola_de(self.ruta).locked())
+
+    def test_el_rollback_suelta_el_turno(self):
+        with self.assertRaises(ValueError):
+            with transaccion(self.conexion):
+                with self.conexion.cursor() as cursor:
+                    cursor.execute('UPDATE contador SET valor = 5 WHERE id = 1')
+                self.assertTrue(cola_de(self.ruta).locked())
+                raise ValueError
+
+        self.assertFalse(cola_de(self.ruta).locked())
+        self.assertEqual(self.valor(), 0)
+
+
+@override_settings(DB_REPLICAS=['replica'], DB_REPLICAS_RETRASO_MAXIMO=10)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.copia = time.time() - 2
+        patcher = mock.patch.object(replicas, 'copia_de', side_effect=lambda alias: self.copia)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @contextmanager
+    def leyendo(self, desde):
+        token = replicas._replica.set(replicas.elegir_replica(desde))
+        try:
+            yield
+        finally:
+            replicas._replica.reset(token)
+
+    def test_fuera_de_las_vistas_marcadas_lee_de_default(self):
+        self.assertIsNone(self.router.db_for_read(None))
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_usa_la_replica_al_dia(self):
+        with self.leyendo(0.0):
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+            with replicas.en_primaria():
+                self.assertIsNone(self.router.db_for_read(None))
+
+    def test_replica_atrasada_lee_de_default(self):
+        self.copia = time.time() - 11
+        with self.leyendo(0.0):
+            self.assertIsNone(self.router.db_for_read(None))
+
+    def test_copia_anterior_a_la_escritura_del_usuario_lee_de_default(self):
+        with self.leyendo(self.copia + 1):
+            self.assertIsNone(self.router.db_for_read(None))
+        with self.leyendo(self.copia - 1):
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+
+    def test_elige_la_replica_una_vez_por_lectura(self):
+        with self.leyendo(0.0):
+            self.copia = time.time() - 11
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+        self.assertEqual(replicas.copia_de.call_count, 1)
+
+    def test_no_migra_las_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'pedidos'))
+        self.assertTrue(self.router.allow_migrate('default', 'pedidos'))
+
+
+class CopiaReplicaTests(SimpleTestCase):
+    def test_el_momento_de_la_copia_se_relee_cada_ttl(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        nombre = str(Path(directorio.name) / 'replica.sqlite3')
+        replicas.archivo_de_copia(nombre).write_text('100.0')
+        self.addCleanup(replicas._copias.clear)
+
+        reloj = [50.0]
+        with mock.patch.dict(settings.DATABASES, {'replica': {'NAME': nombre}}), \
+                override_settings(DB_REPLICAS_COPIA_TTL=1), \
+                mock.patch.object(replicas.time, 'monotonic', side_effect=lambda: reloj[0]):
+            self.assertEqual(replicas.copia_de('replica'), 100.0)
+            replicas.archivo_de_copia(nombre).write_text('200.0')
+            reloj[0] = 50.5
+            self.assertEqual(replicas.copia_de('replica'), 100.0)
+            reloj[0] = 51.0
+            self.assertEqual(replicas.copia_de('replica'), 200.0)
+
+    def test_copia_con_backup_y_anota_el_inicio(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        origen, destino = (str(Path(directorio.name) / nombre) for nombre in ('origen.sqlite3', 'replica.sqlite3'))
+        with sqlite3.connect(origen) as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.execute('INSERT INTO t VALUES (1), (2)')
+        conn.close()
+
+        antes = time.time()
+        copiar(origen, destino)
+
+        conn = sqlite3.connect(destino)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0], 2)
+        copia = float(replicas.archivo_de_copia(destino).read_text())
+        self.assertTrue(antes <= copia <= time.time())
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Pedido, DetallePedido, PedidoRechazado
+from .models import (
+    DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado, PedidoRechazado, VentaDia, VentaProductoDia,
+)
 
 
 @admin.register(Pedido)
@@ -23,3 +25,30 @@ class PedidoRechazadoAdmin(admin.ModelAdmin):
     list_filter = ['fecha_rechazo']
     search_fields = ['pedido__id', 'repartidor__email']
     readonly_fields = ['fecha_rechazo']
+
+
+@admin.register(VentaDia)
+class VentaDiaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'farmacia', 'dia', 'ingresos', 'unidades', 'pedidos']
+    list_filter = ['dia']
+    search_fields = ['farmacia__nombre', 'farmacia__email']
+
+
+@admin.register(VentaProductoDia)
+class VentaProductoDiaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'farmacia', 'dia', 'producto', 'ingresos', 'unidades', 'pedidos']
+    list_filter = ['dia']
+    search_fields = ['farmacia__nombre', 'producto__nombre']
+
+
+@admin.register(PedidoArchivado)
+class PedidoArchivadoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'cliente', 'farmacia', 'repartidor', 'estado', 'fecha', 'fecha_archivado']
+    list_filter = ['estado', 'fecha']
+    search_fields = ['cliente__email', 'farmacia__nombre', 'repartidor__email']
+
+
+@admin.register(DetallePedidoArchivado)
+class DetallePedidoArchivadoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'pedido', 'producto', 'cantidad', 'precio_unitario', 'estado_receta']
+    search_fields = ['pedido__id', 'producto__nombre']
@@ -0,0 +1,148 @@
+"""
+Archivo de pedidos cerrados y limpieza de rechazos.
+
+- archivar(): mueve a PedidoArchivado / DetallePedidoArchivado los pedidos
+  entregados, cancelados o no entregados que no cambian hace más de N días.
+  Cada lote es una transacción corta: INSERT ... SELECT a las tablas de
+  archivo y DELETE de las vivas por id, así el bloqueo de escritura dura lo
+  que tarda un lote y no la corrida entera.
+- purgar_rechazos(): borra los PedidoRechazado de pedidos cerrados. Solo
+  sirven para ocultar pedidos disponibles a quien ya los rechazó.
+
+Los acumulados de ventas (VentaDia, VentaProductoDia) no se tocan: los
+pedidos archivados siguen contando y reconstruir_ventas también los lee.
+"""
+import time as time_module
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado, PedidoRechazado
+
+
+ESTADOS_CERRADOS = ['entregado', *Pedido.ESTADOS_FALLIDOS]
+
+
+def _columnas(modelo):
+    return [campo.column for campo in modelo._meta.concrete_fields]
+
+
+def _sql_mover(origen, destino, columna_filtro, cantidad, condicion='', extra=()):
+    """
+    INSERT INTO destino SELECT ... FROM origen WHERE columna_filtro IN (...).
+    Las columnas de `extra` (solo en destino) se completan con parámetros.
+    """
+    q = connection.ops.quote_name
+    columnas = [c for c in _columnas(destino) if c not in extra]
+    return (
+        f"INSERT INTO {q(destino._meta.db_table)} ({', '.join(q(c) for c in [*columnas, *extra])}) "
+        f"SELECT {', '.join([*(q(c) for c in columnas), *(['%s'] * len(extra))])} "
+        f"FROM {q(origen._meta.db_table)} "
+        f"WHERE {q(columna_filtro)} IN ({', '.join(['%s'] * cantidad)}){condicion}"
+    )
+
+
+def _borrar(cursor, modelo, columna, ids):
+    q = connection.ops.quote_name
+    cursor.execute(
+        f"DELETE FROM {q(modelo._meta.db_table)} WHERE {q(columna)} IN ({', '.join(['%s'] * len(ids))})",
+        ids,
+    )
+
+
+def _candidatos(limite, lote):
+    """
+    Ids de los próximos pedidos a archivar, los de cambio más viejo primero.
+    Los estados van como literales (son constantes del modelo) para que SQLite
+    pueda usar el índice parcial pedido_archivable_idx: con parámetros no
+    puede probar que la consulta cumple la condición del índice.
+    """
+    q = connection.ops.quote_name
+    estados = ', '.join(f"'{estado}'" for estado in Pedido.ESTADOS_ARCHIVABLES)
+    sql = (
+        f"SELECT {q('id')} FROM {q(Pedido._meta.db_table)} "
+        f"WHERE {q('estado')} IN ({estados}) AND {q('fecha_actualizacion')} < %s "
+        f"ORDER BY {q('fecha_actualizacion')}, {q('id')} LIMIT %s"
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        sql += ' FOR UPDATE SKIP LOCKED'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [connection.ops.adapt_datetimefield_value(limite), lote])
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _archivar_lote(limite, lote):
+    """Mueve hasta `lote` pedidos. Devuelve (candidatos, movidos)."""
+    q = connection.ops.quote_name
+    with transaction.atomic():
+        candidatos = _candidatos(limite, lote)
+        if not candidatos:
+            return 0, 0
+
+        with connection.cursor() as cursor:
+            # Se vuelve a exigir estado y antigüedad al copiar: en SQLite la
+            # lectura de candidatos no bloquea y el pedido pudo cambiar entremedio
+            estados = ', '.join(['%s'] * len(Pedido.ESTADOS_ARCHIVABLES))
+            cursor.execute(
+                _sql_mover(
+                    Pedido, PedidoArchivado, 'id', len(candidatos),
+                    condicion=f" AND {q('estado')} IN ({estados}) AND {q('fecha_actualizacion')} < %s",
+                    extra=('fecha_archivado',),
+                ),
+                [
+                    connection.ops.adapt_datetimefield_value(timezone.now()),
+                    *candidatos,
+                    *Pedido.ESTADOS_ARCHIVABLES,
+                    connection.ops.adapt_datetimefield_value(limite),
+                ],
+            )
+            ids = list(PedidoArchivado.objects.filter(id__in=candidatos).values_list('id', flat=True))
+            if ids:
+                cursor.execute(_sql_mover(DetallePedido, DetallePedidoArchivado, 'pedido_id', len(ids)), ids)
+                _borrar(cursor, PedidoRechazado, 'pedido_id', ids)
+                _borrar(cursor, DetallePedido, 'pedido_id', ids)
+                _borrar(cursor, Pedido, 'id', ids)
+    return len(candidatos), len(ids)
+
+
+def archivar(dias=None, lote=None, pausa=0.0):
+    """
+    Archiva los pedidos cerrados sin cambios hace más de `dias` días (por
+    defecto settings.PEDIDOS_ARCHIVO_DIAS). `pausa` (segundos) se espera entre
+    lotes para dejar pasar otras escrituras. Devuelve la cantidad de pedidos movidos.
+    """
+    dias = settings.PEDIDOS_ARCHIVO_DIAS if dias is None else dias
+    lote = lote or settings.PEDIDOS_ARCHIVO_LOTE
+    limite = timezone.now() - timedelta(days=dias)
+
+    total = 0
+    while True:
+        candidatos, movidos = _archivar_lote(limite, lote)
+        total += movidos
+        if candidatos < lote:
+            return total
+        if pausa:
+            time_module.sleep(pausa)
+
+
+def purgar_rechazos(lote=None, pausa=0.0):
+    """Borra en lotes los rechazos de pedidos cerrados. Devuelve cuántos borró."""
+    lote = lote or settings.PEDIDOS_ARCHIVO_LOTE
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                PedidoRechazado.objects.filter(pedido__estado__in=ESTADOS_CERRADOS)
+                .order_by('id')
+                .values_list('id', flat=True)[:lote]
+            )
+            if ids:
+                with connection.cursor() as cursor:
+                    _borrar(cursor, PedidoRechazado, 'id', ids)
+        total += len(ids)
+        if len(ids) < lote:
+            return total
+        if pausa:
+            time_module.sleep(pausa)
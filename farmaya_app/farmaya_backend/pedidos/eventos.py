@@ -0,0 +1,250 @@
+"""
+Pub/sub de cambios de pedidos para el stream SSE (/api/pedidos/stream/).
+
+Las vistas que modifican un pedido llaman a notificar_cambio_pedido(), que
+publica el evento recién cuando la transacción confirma. El backend
+configurado en settings.PEDIDOS_EVENTOS_BACKEND decide cómo llega el evento
+a cada proceso:
+
+- MemoriaBackend: entrega directa dentro del mismo proceso (un solo worker).
+- ArchivoBackend: los eventos se agregan a un archivo compartido y cada
+  proceso lo sigue con un único hilo lector. Sirve como reemplazo local de un
+  broker real cuando se levantan varios workers en la misma máquina.
+
+Los pedidos listos para despacho los ven todos los repartidores. Cuando uno
+deja de estarlo (lo toma un repartidor, se cancela, etc.) se publica además
+un evento 'no_disponible' para todos ellos, así retiran la oferta.
+
+Cada conexión SSE tiene su propia cola acotada. Si un cliente no consume y la
+cola se llena, se descarta lo pendiente y se le envía un evento 'resync' para
+que vuelva a pedir el listado completo.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+ESTADOS_DISPONIBLES = ['aceptado', 'en_preparacion']
+
+
+class Suscripcion:
+    """Una conexión SSE abierta: usuario, event loop y cola acotada."""
+
+    def __init__(self, user_id, tipo_usuario, loop, maxsize):
+        self.user_id = user_id
+        self.tipo_usuario = tipo_usuario
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=maxsize)
+
+    def puede_ver(self, evento):
+        if self.user_id in evento['destinatarios']:
+            return True
+        # Los pedidos sin repartidor listos para despacho (y el aviso de que
+        # dejaron de estarlo) los ven todos los repartidores
+        return self.tipo_usuario == 'repartidor' and (
+            evento['disponible'] or evento['tipo'] == 'no_disponible'
+        )
+
+    def encolar(self, evento):
+        """Se ejecuta dentro del event loop de la conexión."""
+        if self.cola.full():
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait({'tipo': 'resync'})
+            return
+        self.cola.put_nowait(evento)
+
+
+class Broker:
+    """Registro de suscripciones del proceso y reparto de eventos."""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, user, loop=None, maxsize=None):
+        suscripcion = Suscripcion(
+            user.pk,
+            getattr(user, 'tipo_usuario', None),
+            loop or asyncio.get_running_loop(),
+            maxsize or getattr(settings, 'PEDIDOS_EVENTOS_COLA_MAX', 100),
+        )
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def repartir(self, evento):
+        """Entrega el evento a las conexiones de este proceso que pueden verlo."""
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            if not suscripcion.puede_ver(evento):
+                continue
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.encolar, evento)
+            except RuntimeError:
+                # El loop de la conexión ya se cerró
+                self.desuscribir(suscripcion)
+
+
+class MemoriaBackend:
+    """Entrega en el mismo proceso. Alcanza con un único worker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publicar(self, evento):
+        self.broker.repartir(evento)
+
+
+class ArchivoBackend:
+    """
+    Reemplazo local multi-proceso: cada evento es una línea JSON agregada a
+    settings.PEDIDOS_EVENTOS_ARCHIVO y un hilo por proceso lee las líneas nuevas.
+
+    Nadie relee eventos viejos (una conexión nueva empieza desde el final), así
+    que el archivo se rota al pasar PEDIDOS_EVENTOS_ARCHIVO_MAX bytes: se
+    renombra a <archivo>.1 (pisando la rotación anterior) y la próxima
+    publicación crea uno nuevo. Cada lector mantiene abierto el archivo que
+    está siguiendo; cuando ve que la ruta apunta a otro, termina de leer el
+    anterior en la vuelta siguiente y sigue con el nuevo desde el principio.
+    """
+
+    intervalo = 0.25
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.ruta = str(settings.PEDIDOS_EVENTOS_ARCHIVO)
+        self.maximo = getattr(settings, 'PEDIDOS_EVENTOS_ARCHIVO_MAX', 5 * 1024 * 1024)
+        open(self.ruta, 'a').close()
+        self._archivo = open(self.ruta, 'rb')
+        self._archivo.seek(0, os.SEEK_END)
+        self._pendiente = b''
+        self._anterior, self._anterior_pendiente = None, b''
+        self._lectura = threading.Lock()
+        hilo = threading.Thread(target=self._seguir, name='pedidos-eventos', daemon=True)
+        hilo.start()
+
+    def publicar(self, evento):
+        linea = json.dumps(evento) + '\n'
+        # O_APPEND garantiza que las líneas de distintos procesos no se mezclen
+        fd = os.open(self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, linea.encode('utf-8'))
+            self._rotar_si_hace_falta(fd)
+        finally:
+            os.close(fd)
+
+    def _rotar_si_hace_falta(self, fd):
+        estado = os.fstat(fd)
+        if estado.st_size < self.maximo:
+            return
+        try:
+            # Si otro proceso ya rotó, la ruta es otro archivo y no se toca
+            if os.stat(self.ruta).st_ino == estado.st_ino:
+                os.replace(self.ruta, f'{self.ruta}.1')
+        except OSError:
+            pass
+
+    def _seguir(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.leer_nuevos()
+
+    def leer_nuevos(self):
+        """Reparte las líneas nuevas. La llama el hilo lector (y los tests)."""
+        with self._lectura:
+            if self._anterior is not None:
+                # Escrituras que alcanzaron el archivo rotado después de la última lectura
+                self._repartir(self._anterior.read(), self._anterior_pendiente)
+                self._anterior.close()
+                self._anterior = None
+            self._pendiente = self._repartir(self._archivo.read(), self._pendiente)
+
+            try:
+                if os.stat(self.ruta).st_ino == os.fstat(self._archivo.fileno()).st_ino:
+                    return
+                nuevo = open(self.ruta, 'rb')
+            except OSError:
+                # Entre la rotación y la próxima publicación la ruta no existe
+                return
+            self._anterior, self._anterior_pendiente = self._archivo, self._pendiente
+            self._archivo, self._pendiente = nuevo, b''
+
+    def _repartir(self, datos, pendiente):
+        """Reparte las líneas completas y devuelve el resto para la próxima lectura."""
+        datos = pendiente + datos
+        fin = datos.rfind(b'\n') + 1
+        for linea in datos[:fin].splitlines():
+            try:
+                self.broker.repartir(json.loads(linea))
+            except ValueError:
+                continue
+        return datos[fin:]
+
+
+broker = Broker()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                ruta = getattr(settings, 'PEDIDOS_EVENTOS_BACKEND', 'pedidos.eventos.MemoriaBackend')
+                _backend = import_string(ruta)(broker)
+    return _backend
+
+
+def evento_pedido(pedido):
+    destinatarios = [pedido.cliente_id, pedido.farmacia_id]
+    if pedido.repartidor_id:
+        destinatarios.append(pedido.repartidor_id)
+    return {
+        'tipo': 'pedido',
+        'pedido_id': pedido.pk,
+        'estado': pedido.estado,
+        'repartidor_id': pedido.repartidor_id,
+        'destinatarios': destinatarios,
+        'disponible': pedido.estado in ESTADOS_DISPONIBLES and pedido.repartidor_id is None,
+    }
+
+
+def evento_no_disponible(pedido):
+    return {
+        'tipo': 'no_disponible',
+        'pedido_id': pedido.pk,
+        'destinatarios': [],
+        'disponible': False,
+    }
+
+
+def notificar_cambio_pedido(pedido):
+    """Publica el cambio del pedido cuando confirma la transacción en curso."""
+    publicar = [evento_pedido(pedido)]
+    era_disponible = (
+        getattr(pedido, '_estado_original', None) in ESTADOS_DISPONIBLES
+        and getattr(pedido, '_repartidor_original', None) is None
+    )
+    if era_disponible and not publicar[0]['disponible']:
+        publicar.append(evento_no_disponible(pedido))
+    pedido._estado_original, pedido._repartidor_original = pedido.estado, pedido.repartidor_id
+
+    def enviar():
+        backend = get_backend()
+        for evento in publicar:
+            backend.publicar(evento)
+
+    transaction.on_commit(enviar)
@@ -0,0 +1,110 @@
+"""
+Exportación de los pedidos de una farmacia con sus detalles, una fila por
+línea de pedido, en CSV o NDJSON.
+
+La consulta es un único SELECT de Pedido con LEFT JOIN a DetallePedido,
+Producto y los usuarios, ordenado como el índice pedido_farmacia_fecha_idx
+(-fecha, -id) para que SQLite no tenga que ordenar el resultado antes de
+devolver la primera fila. Se recorre con iterator(chunk_size) y se emite de a
+bloques de texto, así la memoria no depende de la cantidad de filas.
+"""
+import csv
+import json
+
+from django.utils import timezone
+
+from .models import Pedido
+from .ventas import ZONA
+
+
+FORMATOS = ('csv', 'ndjson')
+FILAS_POR_BLOQUE = 500
+
+COLUMNAS = [
+    ('pedido_id', 'id'),
+    ('fecha', 'fecha'),
+    ('estado', 'estado'),
+    ('cliente_email', 'cliente__email'),
+    ('cliente_nombre', 'cliente__nombre'),
+    ('repartidor_email', 'repartidor__email'),
+    ('direccion_entrega', 'direccion_entrega'),
+    ('metodo_pago', 'metodo_pago'),
+    ('detalle_id', 'detalles__id'),
+    ('producto_id', 'detalles__producto_id'),
+    ('producto', 'detalles__producto__nombre'),
+    ('presentacion', 'detalles__producto__presentacion'),
+    ('cantidad', 'detalles__cantidad'),
+    ('precio_unitario', 'detalles__precio_unitario'),
+    ('requiere_receta', 'detalles__requiere_receta'),
+    ('estado_receta', 'detalles__estado_receta'),
+]
+ENCABEZADOS = [nombre for nombre, _ in COLUMNAS] + ['subtotal']
+
+
+def consulta(farmacia_id, desde=None, hasta=None, estado=None, modelo=Pedido):
+    """
+    values_list de las líneas de pedido de la farmacia (desde/hasta: datetimes,
+    hasta excluido). modelo=PedidoArchivado lee las tablas de archivo.
+    """
+    pedidos = modelo.objects.filter(farmacia_id=farmacia_id)
+    if desde is not None:
+        pedidos = pedidos.filter(fecha__gte=desde)
+    if hasta is not None:
+        pedidos = pedidos.filter(fecha__lt=hasta)
+    if estado:
+        pedidos = pedidos.filter(estado=estado)
+    return pedidos.values_list(*(campo for _, campo in COLUMNAS)).order_by('-fecha', '-id')
+
+
+def _registro(fila):
+    registro = dict(zip((nombre for nombre, _ in COLUMNAS), fila))
+    registro['fecha'] = timezone.localtime(registro['fecha'], ZONA).isoformat()
+    cantidad, precio = registro['cantidad'], registro['precio_unitario']
+    if precio is not None:
+        registro['precio_unitario'] = str(precio)
+        registro['subtotal'] = str(precio * cantidad)
+    else:
+        # Pedido sin detalles: una sola fila con las columnas de la línea vacías
+        registro['subtotal'] = None
+    return registro
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve lo escrito en lugar de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _bloques(lineas):
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def generar(querysets, formato, chunk_size=2000):
+    """
+    Genera el archivo en bloques de texto con las filas de los querysets, uno
+    después del otro. En CSV el encabezado sale antes de consultar.
+    """
+    filas = (
+        _registro(fila)
+        for queryset in querysets
+        for fila in queryset.iterator(chunk_size=chunk_size)
+    )
+    if formato == 'ndjson':
+        yield from _bloques(
+            json.dumps(registro, ensure_ascii=False) + '\n' for registro in filas
+        )
+        return
+
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(ENCABEZADOS)
+    yield from _bloques(
+        escritor.writerow([registro[columna] for columna in ENCABEZADOS]) for registro in filas
+    )
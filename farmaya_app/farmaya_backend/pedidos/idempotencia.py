@@ -0,0 +1,134 @@
+"""
+Soporte del header Idempotency-Key para las vistas que crean o cambian pedidos.
+
+La app reintenta los POST/PATCH cuando la red falla. Si el reintento trae la
+misma Idempotency-Key que un pedido que ya se procesó bien, se devuelve la
+respuesta guardada sin volver a ejecutar la vista (ni tocar la base): el
+usuario se obtiene de los claims del JWT, que se validan sin consultar la
+tabla de usuarios, y la respuesta sale del cache configurado en
+IDEMPOTENCIA_CACHE. Las claves vencen a los IDEMPOTENCIA_TTL segundos.
+
+La huella de los datos de un multipart no sale del cuerpo crudo: el boundary
+cambia en cada reintento y leer request.body con una receta de varios MB
+supera DATA_UPLOAD_MAX_MEMORY_SIZE. Se arma con los campos ya parseados y,
+por cada archivo, su nombre, tamaño y un sha256 calculado por partes.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from rest_framework import status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+
+HEADER = 'Idempotency-Key'
+
+
+def _user_id(request):
+    """user_id del access token, validando solo la firma (sin consultar la base)."""
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    if header is None:
+        return None
+    raw_token = auth.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        token = auth.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+FORMULARIOS = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+def _huella(request):
+    """Hash de los datos enviados, estable entre reintentos del mismo pedido."""
+    if request.content_type not in FORMULARIOS:
+        return hashlib.sha256(request.body).hexdigest()
+
+    # DRF reutiliza request.POST/FILES ya parseados por Django
+    archivos = []
+    for campo in sorted(request.FILES):
+        for archivo in request.FILES.getlist(campo):
+            digest = hashlib.sha256()
+            for parte in archivo.chunks():
+                digest.update(parte)
+            archivo.seek(0)
+            archivos.append([campo, archivo.name, archivo.size, digest.hexdigest()])
+    datos = {
+        'campos': sorted((campo, request.POST.getlist(campo)) for campo in request.POST),
+        'archivos': archivos,
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class IdempotenciaMixin:
+    """
+    Mixin para APIView. Debe ir antes de APIView en la lista de bases.
+    Solo se guardan las respuestas 2xx: un error se puede reintentar.
+    """
+    idempotencia_metodos = ('POST', 'PATCH')
+
+    def dispatch(self, request, *args, **kwargs):
+        clave = request.headers.get(HEADER)
+        if not clave or request.method not in self.idempotencia_metodos:
+            return super().dispatch(request, *args, **kwargs)
+
+        user_id = _user_id(request)
+        if user_id is None:
+            # Sin token válido la autenticación normal responde 401
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = caches[getattr(settings, 'IDEMPOTENCIA_CACHE', 'default')]
+        ttl = getattr(settings, 'IDEMPOTENCIA_TTL', 24 * 60 * 60)
+        base = hashlib.sha256(
+            f'{user_id}:{request.method}:{request.path}:{clave}'.encode('utf-8')
+        ).hexdigest()
+        cache_key = f'idempotencia:{base}'
+        lock_key = f'idempotencia:lock:{base}'
+        huella = _huella(request)
+
+        guardada = cache.get(cache_key)
+        if guardada is not None:
+            return self._repetir(guardada, huella)
+
+        # Evita que dos reintentos simultáneos ejecuten la vista a la vez
+        if not cache.add(lock_key, True, timeout=60):
+            return JsonResponse(
+                {'detail': 'Ya hay una solicitud en curso con esta Idempotency-Key.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if 200 <= response.status_code < 300:
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(cache_key, {
+                    'huella': huella,
+                    'status': response.status_code,
+                    'content': response.content,
+                    'content_type': response.get('Content-Type'),
+                }, timeout=ttl)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def _repetir(self, guardada, huella):
+        if guardada['huella'] != huella:
+            return JsonResponse(
+                {'detail': 'La Idempotency-Key ya se usó con otros datos.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = HttpResponse(
+            guardada['content'],
+            status=guardada['status'],
+            content_type=guardada['content_type'],
+        )
+        response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pedidos.archivo import archivar, purgar_rechazos
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a las tablas de archivo los pedidos cerrados viejos y borra los rechazos de '
+        'pedidos cerrados (pensado para correr periódicamente, p. ej. desde cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=settings.PEDIDOS_ARCHIVO_DIAS,
+            help='Antigüedad mínima (días sin cambios) de los pedidos a archivar.',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=settings.PEDIDOS_ARCHIVO_LOTE,
+            help='Pedidos o rechazos procesados por transacción.',
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0.0,
+            help='Segundos de espera entre lotes para dejar pasar otras escrituras.',
+        )
+        parser.add_argument('--solo-rechazos', action='store_true', help='Solo borra los rechazos.')
+
+    def handle(self, *args, **options):
+        rechazos = purgar_rechazos(lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f'Rechazos borrados: {rechazos}'))
+        if options['solo_rechazos']:
+            return
+        archivados = archivar(dias=options['dias'], lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f'Pedidos archivados: {archivados}'))
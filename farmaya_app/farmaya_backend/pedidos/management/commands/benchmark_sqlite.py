@@ -0,0 +1,136 @@
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+ALIAS = 'benchmark_sqlite'
+PRODUCTOS = 200
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def _crear_base(ruta):
+    with sqlite3.connect(ruta) as conn:
+        conn.execute('CREATE TABLE producto (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL)')
+        conn.execute(
+            'CREATE TABLE pedido (id INTEGER PRIMARY KEY AUTOINCREMENT, producto_id INTEGER NOT NULL, '
+            'cantidad INTEGER NOT NULL, estado TEXT NOT NULL)'
+        )
+        conn.executemany('INSERT INTO producto (id, stock) VALUES (?, ?)', [(i, 10**9) for i in range(PRODUCTOS)])
+    sqlite3.connect(ruta).close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el SQLite por defecto con settings.SQLITE_PERFIL_PRODUCCION: hilos que confirman '
+        'pedidos y cambian estados mientras otros listan. Usa una base temporal, no la configurada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segundos', type=float, default=10, help='Duración de cada corrida.')
+        parser.add_argument('--escritores', type=int, default=8, help='Hilos que escriben.')
+        parser.add_argument('--lectores', type=int, default=4, help='Hilos que leen.')
+
+    def handle(self, *args, **options):
+        perfiles = [
+            ('por defecto', {'ENGINE': 'django.db.backends.sqlite3'}),
+            ('producción', settings.SQLITE_PERFIL_PRODUCCION),
+        ]
+        directorio = Path(tempfile.mkdtemp(prefix='benchmark_sqlite'))
+        try:
+            for numero, (nombre, perfil) in enumerate(perfiles):
+                ruta = directorio / f'{numero}.sqlite3'
+                _crear_base(ruta)
+                resultado = self._correr(dict(perfil, NAME=str(ruta)), options)
+                self.stdout.write(
+                    f"{nombre}: {resultado['escrituras'] / options['segundos']:.0f} transacciones/s "
+                    f"(p99 {resultado['p99_escritura'] * 1000:.0f} ms, {resultado['bloqueos']} 'database is locked'), "
+                    f"{resultado['lecturas'] / options['segundos']:.0f} lecturas/s "
+                    f"(p99 {resultado['p99_lectura'] * 1000:.0f} ms)"
+                )
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    def _correr(self, perfil, options):
+        configuradas = connections.configure_settings({DEFAULT_DB_ALIAS: {}, ALIAS: perfil})
+        connections.settings[ALIAS] = configuradas[ALIAS]
+        fin = time.monotonic() + options['segundos']
+        latencias_escritura, latencias_lectura = [], []
+        bloqueos = []
+        lock = threading.Lock()
+
+        def terminar_request():
+            # Lo mismo que hace Django al terminar cada request
+            connections[ALIAS].close_if_unusable_or_obsolete()
+
+        def escribir(numero):
+            i = 0
+            while time.monotonic() < fin:
+                i += 1
+                inicio = time.perf_counter()
+                try:
+                    with transaction.atomic(using=ALIAS):
+                        with connections[ALIAS].cursor() as cursor:
+                            if i % 2:
+                                # Checkout: lee el stock, lo descuenta y crea el pedido
+                                producto = (numero * 7919 + i) % PRODUCTOS
+                                cursor.execute('SELECT stock FROM producto WHERE id = %s', [producto])
+                                cursor.fetchone()
+                                cursor.execute('UPDATE producto SET stock = stock - 1 WHERE id = %s', [producto])
+                                cursor.execute(
+                                    "INSERT INTO pedido (producto_id, cantidad, estado) VALUES (%s, 1, 'pendiente')",
+                                    [producto],
+                                )
+                            else:
+                                # Cambio de estado de un pedido reciente
+                                cursor.execute('SELECT MAX(id) FROM pedido')
+                                ultimo = cursor.fetchone()[0] or 0
+                                cursor.execute(
+                                    "UPDATE pedido SET estado = 'aceptado' WHERE id = %s", [ultimo - numero]
+                                )
+                    with lock:
+                        latencias_escritura.append(time.perf_counter() - inicio)
+                except OperationalError:
+                    with lock:
+                        bloqueos.append(1)
+                terminar_request()
+            connections[ALIAS].close()
+
+        def leer():
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                with connections[ALIAS].cursor() as cursor:
+                    cursor.execute('SELECT id, producto_id, estado FROM pedido ORDER BY id DESC LIMIT 20')
+                    cursor.fetchall()
+                with lock:
+                    latencias_lectura.append(time.perf_counter() - inicio)
+                terminar_request()
+            connections[ALIAS].close()
+
+        hilos = [threading.Thread(target=escribir, args=(n,)) for n in range(options['escritores'])]
+        hilos += [threading.Thread(target=leer) for _ in range(options['lectores'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        del connections.settings[ALIAS]
+
+        return {
+            'escrituras': len(latencias_escritura),
+            'p99_escritura': _percentil(latencias_escritura, 99),
+            'bloqueos': len(bloqueos),
+            'lecturas': len(latencias_lectura),
+            'p99_lectura': _percentil(latencias_lectura, 99),
+        }
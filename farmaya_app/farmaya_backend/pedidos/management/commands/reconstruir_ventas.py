@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from pedidos.ventas import reconstruir
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor}. Usá AAAA-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los acumulados de ventas (VentaDia y VentaProductoDia) desde los pedidos '
+        'entregados. Sirve para la carga inicial y para corregir diferencias.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacia', help='ID o email de la farmacia (por defecto, todas).')
+        parser.add_argument('--desde', type=_fecha, help='Primer día a recalcular (AAAA-MM-DD, hora de Buenos Aires).')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a recalcular (inclusive).')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas escritas por INSERT.')
+
+    def handle(self, *args, **options):
+        farmacia_id = None
+        farmacia_param = options['farmacia']
+        if farmacia_param:
+            User = get_user_model()
+            filtro = {'pk': farmacia_param} if farmacia_param.isdigit() else {'email': farmacia_param}
+            farmacia_id = User.objects.filter(tipo_usuario='farmacia', **filtro).values_list('pk', flat=True).first()
+            if farmacia_id is None:
+                raise CommandError(f'No existe la farmacia {farmacia_param}.')
+
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        dias, productos = reconstruir(
+            farmacia_id=farmacia_id, desde=options['desde'], hasta=options['hasta'], lote=options['lote'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Acumulados recalculados: {dias} días y {productos} filas por producto.'
+        ))
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from backend.replicas import archivo_de_copia
+
+
+def copiar(origen, destino):
+    """
+    Copia la base `origen` sobre `destino` con la API de backup de SQLite y
+    anota en <destino>.copia el momento de la copia. La copia es una foto de
+    origen al empezar, así que se anota ese momento y no el del final.
+    """
+    inicio = time.time()
+    fuente = sqlite3.connect(origen)
+    try:
+        copia = sqlite3.connect(destino)
+        try:
+            fuente.backup(copia)
+        finally:
+            copia.close()
+    finally:
+        fuente.close()
+
+    # Se escribe aparte y se renombra: quien lee nunca ve el archivo a medias
+    marca = archivo_de_copia(destino)
+    temporal = marca.with_name(marca.name + '.tmp')
+    temporal.write_text(repr(inicio))
+    os.replace(temporal, marca)
+    return time.time() - inicio
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base default sobre cada réplica de settings.DB_REPLICAS con la API de backup '
+        'de SQLite. Con --intervalo queda copiando cada N segundos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=0,
+            help='Segundos entre copias (por defecto, copia una vez). Debe ser menor que DB_REPLICAS_RETRASO_MAXIMO.',
+        )
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DB_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No hay réplicas configuradas en DB_REPLICAS.')
+        origen = settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']
+
+        while True:
+            for alias in replicas:
+                duracion = copiar(origen, settings.DATABASES[alias]['NAME'])
+                self.stdout.write(f'{alias}: copiada en {duracion * 1000:.0f} ms')
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0006_pedido_fecha_actualizacion'),
+        ('productos', '0002_actualizar_campos_producto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='pedido_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['farmacia', '-fecha', '-id'], name='pedido_farmacia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['farmacia', 'estado', '-fecha', '-id'], name='pedido_farm_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['repartidor', '-fecha', '-id'], name='pedido_repartidor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha', '-id'], name='pedido_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado__in', ['aceptado', 'en_preparacion']), ('repartidor__isnull', True)), fields=['-fecha', '-id'], name='pedido_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidorechazado',
+            index=models.Index(fields=['repartidor', 'pedido'], name='rechazo_repartidor_pedido_idx'),
+        ),
+    ]
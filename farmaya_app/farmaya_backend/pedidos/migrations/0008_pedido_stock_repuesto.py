@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0007_indices_listados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='stock_repuesto',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0008_pedido_stock_repuesto'),
+        ('productos', '0006_producto_indices_catalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='ventas_registradas',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='VentaDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_por_dia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('farmacia', 'dia'), name='venta_dia_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaProductoDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_por_producto', to=settings.AUTH_USER_MODEL)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_por_dia', to='productos.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('farmacia', 'dia', 'producto'), name='venta_producto_dia_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0009_ventas_diarias'),
+        ('productos', '0006_producto_indices_catalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetallePedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('requiere_receta', models.BooleanField(default=False)),
+                ('estado_receta', models.CharField(choices=[('no_requerida', 'No requiere'), ('pendiente', 'Pendiente'), ('aprobada', 'Aprobada'), ('rechazada', 'Rechazada')], max_length=20)),
+                ('receta_archivo', models.FileField(blank=True, null=True, upload_to='recetas/')),
+                ('observaciones_receta', models.TextField(blank=True)),
+                ('receta_omitida', models.BooleanField(default=False)),
+                ('fecha_actualizacion', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('direccion_entrega', models.CharField(max_length=255)),
+                ('metodo_pago', models.CharField(max_length=50)),
+                ('fecha', models.DateTimeField()),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('aceptado', 'Aceptado'), ('rechazado', 'Rechazado'), ('en_preparacion', 'En preparación'), ('en_camino', 'En camino'), ('entregado', 'Entregado'), ('no_entregado', 'No entregado'), ('cancelado', 'Cancelado')], max_length=50)),
+                ('motivo_no_entrega', models.TextField(blank=True, null=True)),
+                ('stock_repuesto', models.BooleanField(default=False)),
+                ('ventas_registradas', models.BooleanField(default=False)),
+                ('fecha_archivado', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado__in', ['entregado', 'cancelado', 'no_entregado'])), fields=['fecha_actualizacion', 'id'], name='pedido_archivable_idx'),
+        ),
+        migrations.AddField(
+            model_name='detallepedidoarchivado',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles_archivados', to='productos.producto'),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_cliente_archivados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='farmacia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_farmacia_archivados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='repartidor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_asignados_archivados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='detallepedidoarchivado',
+            name='pedido',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='pedidos.pedidoarchivado'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='archivado_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['farmacia', '-fecha', '-id'], name='archivado_farmacia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['repartidor', '-fecha', '-id'], name='archivado_repart_fecha_idx'),
+        ),
+    ]
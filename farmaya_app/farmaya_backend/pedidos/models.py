@@ -13,6 +13,10 @@ class Pedido(models.Model):
         ('no_entregado', 'No entregado'),
         ('cancelado', 'Cancelado'),
     ]
+    # Estados finales en los que el pedido no se concreta y el stock se devuelve
+    ESTADOS_FALLIDOS = ['rechazado', 'no_entregado', 'cancelado']
+    # Estados cerrados que pasan a las tablas de archivo (pedidos.archivo)
+    ESTADOS_ARCHIVABLES = ['entregado', 'cancelado', 'no_entregado']
 
     cliente = models.ForeignKey(
         User,
@@ -36,8 +40,49 @@ class Pedido(models.Model):
     direccion_entrega = models.CharField(max_length=255)
     metodo_pago = models.CharField(max_length=50)
     fecha = models.DateTimeField(auto_now_add=True)
+    # Marca de cambio: se actualiza en cada save del pedido o de uno de sus detalles.
+    # Permite a los clientes pedir solo lo que cambió desde su último sondeo.
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     estado = models.CharField(max_length=50, choices=ESTADOS, default='pendiente')
     motivo_no_entrega = models.TextField(blank=True, null=True, verbose_name="Motivo de no entrega")
+    # Se marca al devolver el stock cuando el pedido termina cancelado, rechazado o no entregado
+    stock_repuesto = models.BooleanField(default=False)
+    # Se marca al sumar el pedido a los acumulados de ventas (VentaDia / VentaProductoDia)
+    ventas_registradas = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Listados: filtro por rol (y opcionalmente estado) + orden (-fecha, -id)
+            models.Index(fields=['cliente', '-fecha', '-id'], name='pedido_cliente_fecha_idx'),
+            models.Index(fields=['farmacia', '-fecha', '-id'], name='pedido_farmacia_fecha_idx'),
+            models.Index(fields=['farmacia', 'estado', '-fecha', '-id'], name='pedido_farm_estado_fecha_idx'),
+            models.Index(fields=['repartidor', '-fecha', '-id'], name='pedido_repartidor_fecha_idx'),
+            models.Index(fields=['-fecha', '-id'], name='pedido_fecha_idx'),
+            # Pedidos listos para despacho (PedidosDisponiblesView)
+            models.Index(
+                fields=['-fecha', '-id'],
+                name='pedido_disponible_idx',
+                condition=models.Q(estado__in=['aceptado', 'en_preparacion'], repartidor__isnull=True),
+            ),
+            # Sincronización incremental (?since=)
+            models.Index(fields=['cliente', 'fecha_actualizacion'], name='pedido_cliente_act_idx'),
+            models.Index(fields=['farmacia', 'fecha_actualizacion'], name='pedido_farmacia_act_idx'),
+            models.Index(fields=['repartidor', 'fecha_actualizacion'], name='pedido_repartidor_act_idx'),
+            # Candidatos a archivar (pedidos.archivo)
+            models.Index(
+                fields=['fecha_actualizacion', 'id'],
+                name='pedido_archivable_idx',
+                condition=models.Q(estado__in=['entregado', 'cancelado', 'no_entregado']),
+            ),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Estado y repartidor tal como se leyeron de la base, para avisar a los
+        # repartidores cuando el pedido deja de estar disponible (pedidos.eventos).
+        # Se leen de __dict__ para no disparar una consulta si están diferidos.
+        self._estado_original = self.__dict__.get("estado")
+        self._repartidor_original = self.__dict__.get("repartidor_id")
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.farmacia.nombre} ({self.estado})"
@@ -66,6 +111,10 @@ class PedidoRechazado(models.Model):
     class Meta:
         unique_together = ['pedido', 'repartidor']
         ordering = ['-fecha_rechazo']
+        indexes = [
+            # Subconsulta de rechazos por repartidor en PedidosDisponiblesView
+            models.Index(fields=['repartidor', 'pedido'], name='rechazo_repartidor_pedido_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.pedido.id} rechazado por {self.repartidor.email}"
@@ -92,6 +141,7 @@ class DetallePedido(models.Model):
     receta_archivo = models.FileField(upload_to='recetas/', blank=True, null=True)
     observaciones_receta = models.TextField(blank=True)
     receta_omitida = models.BooleanField(default=False, verbose_name="Receta rechazada omitida por cliente")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.producto.nombre} x{self.cantidad}"
@@ -106,3 +156,99 @@ class DetallePedido(models.Model):
             self.receta_archivo = None
             self.observaciones_receta = ''
         super().save(*args, **kwargs)
+        # Un cambio en el detalle también es un cambio del pedido
+        Pedido.objects.filter(pk=self.pedido_id).update(fecha_actualizacion=self.fecha_actualizacion)
+
+
+class VentaDia(models.Model):
+    """
+    Acumulado de ventas entregadas de una farmacia en un día (hora de
+    Buenos Aires). Lo mantiene pedidos.ventas al pasar un pedido a entregado;
+    se puede reconstruir con el comando reconstruir_ventas.
+    """
+    farmacia = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ventas_por_dia')
+    dia = models.DateField()
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farmacia', 'dia'], name='venta_dia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.farmacia.email} {self.dia}: ${self.ingresos}"
+
+
+class VentaProductoDia(models.Model):
+    """Acumulado de ventas entregadas de un producto de la farmacia en un día."""
+    farmacia = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ventas_por_producto')
+    dia = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_por_dia')
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    # Pedidos entregados que incluyeron el producto ese día
+    pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['farmacia', 'dia', 'producto'], name='venta_producto_dia_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} {self.dia}: {self.unidades} u."
+
+
+# ====================================================
+# 🔹 ARCHIVO DE PEDIDOS CERRADOS
+# ====================================================
+# Mismas columnas (y mismos id) que Pedido y DetallePedido. pedidos.archivo
+# mueve acá los pedidos cerrados viejos para que las tablas vivas no carguen
+# con todo el historial; los listados los leen solo con ?archivados=1.
+
+class PedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pedidos_cliente_archivados')
+    farmacia = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pedidos_farmacia_archivados')
+    repartidor = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='pedidos_asignados_archivados', null=True, blank=True
+    )
+    direccion_entrega = models.CharField(max_length=255)
+    metodo_pago = models.CharField(max_length=50)
+    fecha = models.DateTimeField()
+    fecha_actualizacion = models.DateTimeField()
+    estado = models.CharField(max_length=50, choices=Pedido.ESTADOS)
+    motivo_no_entrega = models.TextField(blank=True, null=True)
+    stock_repuesto = models.BooleanField(default=False)
+    ventas_registradas = models.BooleanField(default=False)
+    fecha_archivado = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cliente', '-fecha', '-id'], name='archivado_cliente_fecha_idx'),
+            models.Index(fields=['farmacia', '-fecha', '-id'], name='archivado_farmacia_fecha_idx'),
+            models.Index(fields=['repartidor', '-fecha', '-id'], name='archivado_repart_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido archivado #{self.id} ({self.estado})"
+
+
+class DetallePedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    pedido = models.ForeignKey(PedidoArchivado, on_delete=models.CASCADE, related_name='detalles')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='detalles_archivados')
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    requiere_receta = models.BooleanField(default=False)
+    estado_receta = models.CharField(max_length=20, choices=DetallePedido.ESTADOS_RECETA)
+    receta_archivo = models.FileField(upload_to='recetas/', blank=True, null=True)
+    observaciones_receta = models.TextField(blank=True)
+    receta_omitida = models.BooleanField(default=False)
+    fecha_actualizacion = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.producto.nombre} x{self.cantidad} (archivado)"
@@ -0,0 +1,61 @@
+import base64
+import json
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class PedidoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para los listados de pedidos.
+    Ordena por (-fecha, -id) para que el orden sea estable aunque dos pedidos
+    compartan fecha, y no ejecuta COUNT(*): cada página cuesta lo mismo
+    sin importar cuántos pedidos tenga la farmacia o el cliente.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-fecha', '-id')
+
+
+class DistanciaCursorPagination(PedidoCursorPagination):
+    """
+    Paginación por cursor para listados ordenados por una distancia que se
+    calcula en Python (no hay columna por la que ordenar en la base).
+
+    paginate_claves recibe las claves (distancia, id) de todos los candidatos
+    y devuelve las de la página pedida. El cursor es la última clave
+    entregada: sin offset, un pedido que se toma entre una página y otra no
+    hace saltear ni repetir los demás. Solo se avanza (previous es None).
+    """
+
+    def paginate_claves(self, claves, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        desde = self._decodificar(request.query_params.get(self.cursor_query_param))
+
+        claves = sorted(claves)
+        if desde is not None:
+            claves = [clave for clave in claves if clave > desde]
+        pagina = claves[:self.page_size]
+        self.ultima = pagina[-1] if len(claves) > self.page_size else None
+        return pagina
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            distancia, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return float(distancia), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.ultima is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(self.ultima).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        return None
@@ -70,31 +70,34 @@ class PedidoSerializer(serializers.ModelSerializer):
         ]
 
     def get_detalles(self, obj):
+        # Se trabaja sobre obj.detalles.all() para aprovechar el prefetch_related
+        # de las vistas de listado y no disparar una consulta por pedido.
+        detalles = obj.detalles.all()
+
         # Si el pedido está aceptado o en un estado avanzado, excluir detalles con receta rechazada omitida
         if obj.estado in ['aceptado', 'en_preparacion', 'en_camino', 'entregado']:
-            detalles_validos = obj.detalles.exclude(
-                requiere_receta=True,
-                estado_receta='rechazada',
-                receta_omitida=True
-            )
+            detalles_validos = [
+                detalle for detalle in detalles
+                if not (
+                    detalle.requiere_receta
+                    and detalle.estado_receta == 'rechazada'
+                    and detalle.receta_omitida
+                )
+            ]
         else:
             # Para pedidos pendientes, mostrar todos los detalles
-            detalles_validos = obj.detalles.all()
-        
+            detalles_validos = detalles
+
         return DetallePedidoSerializer(detalles_validos, many=True, context=self.context).data
 
     def get_puede_aceptar(self, obj):
-        # No se puede aceptar si hay recetas pendientes sin resolver
-        recetas_pendientes = obj.detalles.filter(
-            requiere_receta=True,
-            estado_receta='pendiente'
-        ).exists()
-        
-        # No se puede aceptar si hay recetas rechazadas sin que el cliente haya decidido (reenviar u omitir)
-        recetas_rechazadas_pendientes = obj.detalles.filter(
-            requiere_receta=True,
-            estado_receta='rechazada',
-            receta_omitida=False
-        ).exists()
-        
-        return not recetas_pendientes and not recetas_rechazadas_pendientes
+        for detalle in obj.detalles.all():
+            if not detalle.requiere_receta:
+                continue
+            # No se puede aceptar si hay recetas pendientes sin resolver
+            if detalle.estado_receta == 'pendiente':
+                return False
+            # No se puede aceptar si hay recetas rechazadas sin que el cliente haya decidido (reenviar u omitir)
+            if detalle.estado_receta == 'rechazada' and not detalle.receta_omitida:
+                return False
+        return True
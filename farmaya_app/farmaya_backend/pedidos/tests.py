@@ -1,3 +1,982 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.test import override_settings
+from django.test.client import encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend import replicas
+from productos.models import Producto, ReservaStock
+
+from . import archivo, eventos, exportacion, ventas
+from .models import (
+    DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado, PedidoRechazado, VentaDia, VentaProductoDia,
+)
+
+
+User = get_user_model()
+
+
+class PedidosTestMixin:
+    """Datos base compartidos por los tests de pedidos."""
+
+    def setUp(self):
+        # Sin dirección para que User.save no intente geocodificar y sin
+        # contraseña para no pagar el hash PBKDF2 en cada test
+        self.farmacia = User.objects.create_user(
+            email='farmacia@test.com', tipo_usuario='farmacia', nombre='Farmacia'
+        )
+        self.cliente = User.objects.create_user(
+            email='cliente@test.com', tipo_usuario='cliente', nombre='Cliente'
+        )
+        self.repartidor = User.objects.create_user(
+            email='repartidor@test.com', tipo_usuario='repartidor', nombre='Repartidor'
+        )
+        self.producto = Producto.objects.create(
+            farmacia=self.farmacia, nombre='Ibuprofeno', presentacion='400 mg',
+            precio=Decimal('100.00'), stock=1000,
+        )
+        self.producto_receta = Producto.objects.create(
+            farmacia=self.farmacia, nombre='Amoxicilina', presentacion='500 mg',
+            precio=Decimal('250.00'), stock=1000, requiere_receta=True,
+        )
+
+    def crear_pedidos(self, cantidad, estado='aceptado', repartidor=None):
+        for _ in range(cantidad):
+            pedido = Pedido.objects.create(
+                cliente=self.cliente,
+                farmacia=self.farmacia,
+                repartidor=repartidor,
+                direccion_entrega='Calle 123',
+                metodo_pago='efectivo',
+                estado=estado,
+            )
+            DetallePedido.objects.create(
+                pedido=pedido, producto=self.producto, cantidad=1, precio_unitario=self.producto.precio,
+            )
+            DetallePedido.objects.create(
+                pedido=pedido, producto=self.producto_receta, cantidad=1,
+                precio_unitario=self.producto_receta.precio, requiere_receta=True,
+                estado_receta='rechazada', receta_omitida=True,
+            )
+
+
+class PedidoSerializerQueryCountTests(PedidosTestMixin, APITestCase):
+    """La cantidad de consultas de los listados no debe depender de la cantidad de pedidos."""
+
+    def contar_consultas(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(ctx.captured_queries)
+
+    def assert_consultas_constantes(self, user, url, **kwargs):
+        self.crear_pedidos(2, **kwargs)
+        pocas = self.contar_consultas(user, url)
+        self.crear_pedidos(10, **kwargs)
+        muchas = self.contar_consultas(user, url)
+        self.assertEqual(pocas, muchas)
+
+    def test_lista(self):
+        self.assert_consultas_constantes(self.cliente, reverse('pedidos-lista'), repartidor=self.repartidor)
+
+    def test_mis_pedidos_cliente(self):
+        self.assert_consultas_constantes(self.cliente, reverse('pedidos-mios'), repartidor=self.repartidor)
+
+    def test_mis_pedidos_repartidor(self):
+        self.assert_consultas_constantes(self.repartidor, reverse('pedidos-mios'), repartidor=self.repartidor)
+
+    def test_mis_pedidos_farmacia(self):
+        self.assert_consultas_constantes(self.farmacia, reverse('pedidos-mios'), repartidor=self.repartidor)
+
+    def test_por_farmacia(self):
+        url = reverse('pedidos-por-farmacia', args=[self.farmacia.id])
+        self.assert_consultas_constantes(self.farmacia, url, repartidor=self.repartidor)
+
+    def test_crear_pedido_get(self):
+        self.assert_consultas_constantes(self.farmacia, reverse('pedidos-crear'), repartidor=self.repartidor)
+
+    def test_disponibles(self):
+        self.assert_consultas_constantes(self.repartidor, reverse('pedidos-disponibles'))
+
+    def test_detalles_omitidos_y_puede_aceptar(self):
+        self.crear_pedidos(1)
+        self.client.force_authenticate(self.cliente)
+        pedido = self.client.get(reverse('pedidos-mios')).data['results'][0]
+        self.assertEqual([d['producto_nombre'] for d in pedido['detalles']], ['Ibuprofeno'])
+        self.assertTrue(pedido['puede_aceptar'])
+
+        DetallePedido.objects.filter(requiere_receta=True).update(estado_receta='pendiente')
+        pedido = self.client.get(reverse('pedidos-mios')).data['results'][0]
+        self.assertEqual(len(pedido['detalles']), 2)
+        self.assertFalse(pedido['puede_aceptar'])
+
+
+class PedidoCursorPaginationTests(PedidosTestMixin, APITestCase):
+
+    def recorrer(self, user, url):
+        self.client.force_authenticate(user)
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+            ids.extend(pedido['id'] for pedido in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_recorre_todas_las_paginas_en_orden(self):
+        self.crear_pedidos(12)
+        esperados = list(Pedido.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        vistas = [
+            (self.cliente, reverse('pedidos-mios')),
+            (self.cliente, reverse('pedidos-lista')),
+            (self.farmacia, reverse('pedidos-por-farmacia', args=[self.farmacia.id])),
+            (self.farmacia, reverse('pedidos-crear')),
+            (self.repartidor, reverse('pedidos-disponibles')),
+        ]
+        for user, url in vistas:
+            with self.subTest(url=url):
+                self.assertEqual(self.recorrer(user, f'{url}?page_size=5'), esperados)
+
+
+class MisPedidosDeltaSyncTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_pedidos(3)
+        self.client.force_authenticate(self.cliente)
+        self.url = reverse('pedidos-mios')
+
+    def test_sincronizacion_incremental(self):
+        inicial = self.client.get(self.url, {'since': '0'})
+        self.assertEqual(len(inicial.data['results']), 3)
+        token, etag = inicial.data['token'], inicial['ETag']
+
+        sin_cambios = self.client.get(self.url, {'since': token}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(sin_cambios.status_code, 304)
+
+        pedido = Pedido.objects.order_by('id').first()
+        detalle = pedido.detalles.get(requiere_receta=False)
+        detalle.observaciones_receta = 'x'
+        detalle.save()
+
+        cambios = self.client.get(self.url, {'since': token}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cambios.status_code, 200)
+        self.assertEqual([p['id'] for p in cambios.data['results']], [pedido.id])
+        self.assertNotEqual(cambios['ETag'], etag)
+
+    def test_delta_paginado_con_token_de_continuacion(self):
+        # Misma marca de cambio para los tres: el corte de página no puede saltear ninguno
+        Pedido.objects.update(fecha_actualizacion=timezone.now())
+
+        primera = self.client.get(self.url, {'since': '0', 'page_size': 2})
+        self.assertEqual(len(primera.data['results']), 2)
+        self.assertIsNotNone(primera.data['next'])
+
+        resto = self.client.get(primera.data['next'], HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(resto.status_code, 200)
+        self.assertIsNone(resto.data['next'])
+        vistos = [p['id'] for p in primera.data['results'] + resto.data['results']]
+        self.assertEqual(sorted(vistos), sorted(Pedido.objects.values_list('id', flat=True)))
+
+        al_dia = self.client.get(self.url, {'since': resto.data['token']}, HTTP_IF_NONE_MATCH=resto['ETag'])
+        self.assertEqual(al_dia.status_code, 304)
+
+    def test_token_invalido(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': '1-x'}).status_code, 400)
+
+
+class PedidoEventosTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.otro_repartidor = User.objects.create_user(
+            email='otro@test.com', tipo_usuario='repartidor', nombre='Otro'
+        )
+        self.loop = asyncio.new_event_loop()
+        self.suscripciones = []
+
+    def tearDown(self):
+        for suscripcion in self.suscripciones:
+            eventos.broker.desuscribir(suscripcion)
+        self.loop.close()
+
+    def suscribir(self, user):
+        suscripcion = eventos.broker.suscribir(user, loop=self.loop, maxsize=2)
+        self.suscripciones.append(suscripcion)
+        return suscripcion
+
+    def recibidos(self, suscripcion):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        recibidos = []
+        while not suscripcion.cola.empty():
+            recibidos.append(suscripcion.cola.get_nowait())
+        return recibidos
+
+    def test_cambio_de_estado_llega_a_quienes_ven_el_pedido(self):
+        self.crear_pedidos(1, estado='pendiente')
+        pedido = Pedido.objects.get()
+        cliente = self.suscribir(self.cliente)
+        repartidor = self.suscribir(self.repartidor)
+        ajeno = self.suscribir(User.objects.create_user(email='ajeno@test.com', tipo_usuario='cliente'))
+
+        self.client.force_authenticate(self.farmacia)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('pedidos-estado', args=[pedido.id]), {'estado': 'aceptado'})
+
+        self.assertEqual([e['estado'] for e in self.recibidos(cliente)], ['aceptado'])
+        # Queda disponible para despacho: lo ven todos los repartidores
+        self.assertEqual([e['pedido_id'] for e in self.recibidos(repartidor)], [pedido.id])
+        self.assertEqual(self.recibidos(ajeno), [])
+
+        otro = self.suscribir(self.otro_repartidor)
+        self.client.force_authenticate(self.repartidor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('pedidos-aceptar', args=[pedido.id]))
+        self.assertEqual(
+            [e['tipo'] for e in self.recibidos(repartidor)], ['pedido', 'no_disponible']
+        )
+        # Los demás repartidores solo reciben el aviso para retirar la oferta
+        self.assertEqual(
+            self.recibidos(otro),
+            [{'tipo': 'no_disponible', 'pedido_id': pedido.id, 'destinatarios': [], 'disponible': False}],
+        )
+
+    def test_cancelar_un_pedido_disponible_avisa_a_los_repartidores(self):
+        self.crear_pedidos(1, estado='aceptado')
+        pedido = Pedido.objects.get()
+        repartidor = self.suscribir(self.repartidor)
+
+        self.client.force_authenticate(self.farmacia)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('pedidos-estado', args=[pedido.id]), {'estado': 'cancelado'})
+
+        self.assertEqual([e['tipo'] for e in self.recibidos(repartidor)], ['no_disponible'])
+
+    def test_archivo_se_rota_sin_perder_eventos(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = f'{directorio.name}/eventos.log'
+        broker = mock.Mock()
+        with override_settings(PEDIDOS_EVENTOS_ARCHIVO=ruta, PEDIDOS_EVENTOS_ARCHIVO_MAX=100), \
+                mock.patch.object(eventos.threading.Thread, 'start'):
+            backend = eventos.ArchivoBackend(broker)
+
+        for numero in range(8):
+            backend.publicar({'pedido_id': numero})
+            if numero % 2:
+                backend.leer_nuevos()
+        backend.leer_nuevos()
+        backend.leer_nuevos()
+
+        self.assertEqual(
+            [llamada.args[0]['pedido_id'] for llamada in broker.repartir.call_args_list], list(range(8))
+        )
+        # Nunca queda más de un archivo rotado, y cada uno cerca del máximo
+        self.assertLess(os.path.getsize(ruta), 100)
+        self.assertLess(os.path.getsize(f'{ruta}.1'), 100 + 20)
+
+    def test_cola_llena_pide_resync(self):
+        suscripcion = self.suscribir(self.cliente)
+        evento = {'tipo': 'pedido', 'destinatarios': [self.cliente.id], 'disponible': False}
+        for _ in range(3):
+            eventos.broker.repartir(evento)
+        self.assertEqual(self.recibidos(suscripcion), [{'tipo': 'resync'}])
+
+    def test_stream_requiere_autenticacion(self):
+        response = self.client.get(reverse('pedidos-stream'))
+        self.assertEqual(response.status_code, 401)
+
+
+class PedidoQueryPlanTests(PedidosTestMixin, APITestCase):
+    """Cada listado de pedidos debe resolverse con índice, sin SCAN completo ni sort temporal."""
+
+    def planes(self, user, url, params=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        planes = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'FROM "pedidos_pedido"' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                planes.append((sql, [fila[-1] for fila in cursor.fetchall()]))
+        self.assertTrue(planes)
+        return planes
+
+    def assert_usa_indices(self, user, url, params=None):
+        for sql, plan in self.planes(user, url, params):
+            for paso in plan:
+                self.assertNotIn('USE TEMP B-TREE', paso, f'{sql}\n{plan}')
+                if paso.startswith('SCAN'):
+                    self.assertIn('USING', paso, f'{sql}\n{plan}')
+
+    def test_planes(self):
+        self.crear_pedidos(3, repartidor=self.repartidor)
+        self.crear_pedidos(3)
+        por_farmacia = reverse('pedidos-por-farmacia', args=[self.farmacia.id])
+        casos = [
+            (self.cliente, reverse('pedidos-lista'), None),
+            (self.cliente, reverse('pedidos-mios'), None),
+            (self.repartidor, reverse('pedidos-mios'), None),
+            (self.farmacia, reverse('pedidos-mios'), None),
+            (self.farmacia, por_farmacia, None),
+            (self.farmacia, por_farmacia, {'estado': 'aceptado'}),
+            (self.farmacia, reverse('pedidos-crear'), None),
+            (self.repartidor, reverse('pedidos-disponibles'), None),
+            (self.cliente, reverse('pedidos-mios'), {'since': '0'}),
+        ]
+        for user, url, params in casos:
+            with self.subTest(url=url, params=params, user=user.tipo_usuario):
+                self.assert_usa_indices(user, url, params)
+
+
+class PedidosDisponiblesCercanosTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Obelisco como referencia; la farmacia base queda a ~1 km
+        self.farmacia.latitud, self.farmacia.longitud = -34.6037, -58.3816 + 0.011
+        self.farmacia.save()
+        self.farmacia_lejos = User.objects.create_user(
+            email='lejos@test.com', tipo_usuario='farmacia', nombre='Lejos',
+            latitud=-34.6037 + 0.09, longitud=-58.3816,
+        )
+        self.farmacia_fuera = User.objects.create_user(
+            email='fuera@test.com', tipo_usuario='farmacia', nombre='Fuera',
+            latitud=-34.9214, longitud=-57.9545,
+        )
+        self.crear_pedidos(1)
+        for farmacia in (self.farmacia_lejos, self.farmacia_fuera):
+            Pedido.objects.create(
+                cliente=self.cliente, farmacia=farmacia, direccion_entrega='Calle 1',
+                metodo_pago='efectivo', estado='aceptado',
+            )
+        self.client.force_authenticate(self.repartidor)
+        self.url = reverse('pedidos-disponibles')
+
+    def test_ordena_por_distancia_y_filtra_por_radio(self):
+        response = self.client.get(self.url, {'lat': -34.6037, 'lng': -58.3816, 'radius': 15})
+        self.assertEqual(response.status_code, 200)
+        resultados = response.data['results']
+        self.assertEqual([r['farmacia_nombre'] for r in resultados], ['Farmacia', 'Lejos'])
+        self.assertAlmostEqual(resultados[0]['distancia_km'], 1.0, delta=0.1)
+        self.assertAlmostEqual(resultados[1]['distancia_km'], 10.0, delta=0.1)
+
+    def test_pagina_por_distancia_e_id_con_next(self):
+        self.crear_pedidos(2)
+        esperados = list(
+            Pedido.objects.filter(farmacia=self.farmacia).order_by('id').values_list('id', flat=True)
+        ) + list(Pedido.objects.filter(farmacia=self.farmacia_lejos).values_list('id', flat=True))
+
+        vistos = []
+        response = self.client.get(self.url, {'lat': -34.6037, 'lng': -58.3816, 'radius': 15, 'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            vistos += [r['id'] for r in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(vistos, esperados)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'lat': 'x', 'lng': 0}).status_code, 400)
+        self.assertEqual(
+            self.client.get(self.url, {'lat': 0, 'lng': 0, 'cursor': 'no-es-un-cursor'}).status_code, 404
+        )
+        self.assertEqual(self.client.get(self.url, {'lat': 0, 'lng': 0, 'radius': 500}).status_code, 400)
+
+
+class CrearPedidoTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.cliente)
+        self.url = reverse('pedidos-crear')
+        self.productos = [
+            Producto.objects.create(
+                farmacia=self.farmacia, nombre=f'Producto {i}', presentacion='1 u',
+                precio=Decimal('10.00'), stock=5,
+            )
+            for i in range(5)
+        ]
+
+    def crear(self, detalles):
+        return self.client.post(self.url, {
+            'direccion_entrega': 'Calle 123',
+            'farmacia_id': self.farmacia.id,
+            'detalles': detalles,
+        }, format='json')
+
+    def test_crea_pedido_y_descuenta_stock(self):
+        response = self.crear([
+            {'producto': self.producto.id, 'cantidad': 2},
+            {'producto': self.producto.id, 'cantidad': 3},
+        ])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['detalles']), 2)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 995)
+
+    def test_cantidad_de_consultas_no_depende_de_las_lineas(self):
+        def contar(productos):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.crear([{'producto': p.id, 'cantidad': 1} for p in productos])
+            self.assertEqual(response.status_code, 201, response.data)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(contar(self.productos[:1]), contar(self.productos))
+
+    def test_sin_stock_no_crea_nada(self):
+        response = self.crear([
+            {'producto': self.productos[0].id, 'cantidad': 1},
+            {'producto': self.productos[1].id, 'cantidad': 6},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Producto 1', response.data['detail'])
+        self.assertFalse(Pedido.objects.exists())
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 5)
+
+    def test_update_condicional_rechaza_stock_insuficiente(self):
+        # Simula que otra compra se llevó el stock entre la validación y el UPDATE
+        in_bulk = QuerySet.in_bulk
+
+        def in_bulk_y_otra_compra(queryset, *args, **kwargs):
+            productos = in_bulk(queryset, *args, **kwargs)
+            Producto.objects.filter(pk__in=productos).update(stock=0)
+            return productos
+
+        with mock.patch.object(QuerySet, 'in_bulk', autospec=True, side_effect=in_bulk_y_otra_compra):
+            response = self.crear([{'producto': self.productos[0].id, 'cantidad': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Stock disponible: 0', response.data['detail'])
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_producto_de_otra_farmacia(self):
+        otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia')
+        producto = Producto.objects.create(
+            farmacia=otra, nombre='X', presentacion='1 u', precio=Decimal('1.00'), stock=1,
+        )
+        self.assertEqual(self.crear([{'producto': producto.id}]).status_code, 404)
+
+
+@override_settings(RESERVA_STOCK_MAX_POR_PRODUCTO=5, RESERVA_STOCK_MAX_POR_USUARIO=8)
+class LimitesReservaTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.cliente)
+
+    def reservar(self, *detalles):
+        return self.client.post(reverse('pedidos-reservas'), {
+            'detalles': [{'producto': producto.id, 'cantidad': cantidad} for producto, cantidad in detalles],
+        }, format='json')
+
+    def test_maximo_por_producto(self):
+        response = self.reservar((self.producto, 6))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('5 unidades', response.data['detail'])
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_maximo_total_del_usuario(self):
+        self.assertEqual(self.reservar((self.producto, 5)).status_code, 201)
+        response = self.reservar((self.producto_receta, 4))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('8 unidades', response.data['detail'])
+
+        # Reemplazar una reserva propia no cuenta dos veces sus unidades
+        self.assertEqual(self.reservar((self.producto, 4), (self.producto_receta, 4)).status_code, 201)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_reservado, 4)
+
+        # Las vencidas no cuentan
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.reservar((self.producto, 5)).status_code, 201)
+
+
+class StockDevueltoTests(PedidosTestMixin, APITestCase):
+
+    def test_pedido_cancelado_devuelve_stock_una_sola_vez(self):
+        self.client.force_authenticate(self.cliente)
+        response = self.client.post(reverse('pedidos-reservas'), {
+            'detalles': [{'producto': self.producto.id, 'cantidad': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = self.client.post(reverse('pedidos-crear'), {
+            'direccion_entrega': 'Calle 123',
+            'farmacia_id': self.farmacia.id,
+            'detalles': [{'producto': self.producto.id, 'cantidad': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (997, 0))
+
+        self.client.force_authenticate(self.farmacia)
+        url = reverse('pedidos-estado', args=[response.data['id']])
+        for estado in ('cancelado', 'rechazado'):
+            self.client.patch(url, {'estado': estado})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1000)
+
+    def crear_y_cancelar(self, cantidad):
+        self.client.force_authenticate(self.cliente)
+        response = self.client.post(reverse('pedidos-crear'), {
+            'direccion_entrega': 'Calle 123',
+            'farmacia_id': self.farmacia.id,
+            'detalles': [{'producto': self.producto.id, 'cantidad': cantidad}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.client.force_authenticate(self.farmacia)
+        url = reverse('pedidos-estado', args=[response.data['id']])
+        self.assertEqual(self.client.patch(url, {'estado': 'cancelado'}).status_code, 200)
+        return url
+
+    def test_reabrir_pedido_cancelado_vuelve_a_descontar_stock(self):
+        url = self.crear_y_cancelar(3)
+        response = self.client.patch(url, {'estado': 'aceptado'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 997)
+
+        # Cancelarlo otra vez lo devuelve de nuevo
+        self.client.patch(url, {'estado': 'cancelado'})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1000)
+
+    def test_no_se_reabre_si_el_stock_ya_no_alcanza(self):
+        url = self.crear_y_cancelar(3)
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+
+        response = self.client.patch(url, {'estado': 'aceptado'})
+        self.assertEqual(response.status_code, 400)
+        pedido = Pedido.objects.get()
+        self.assertEqual((pedido.estado, pedido.stock_repuesto), ('cancelado', True))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 2)
+
+
+class IdempotenciaTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        token = AccessToken.for_user(self.cliente)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.payload = {
+            'direccion_entrega': 'Calle 123',
+            'farmacia_id': self.farmacia.id,
+            'detalles': [{'producto': self.producto.id, 'cantidad': 2}],
+        }
+
+    def crear(self, clave, payload=None):
+        return self.client.post(
+            reverse('pedidos-crear'), payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=clave,
+        )
+
+    def test_reintento_devuelve_la_misma_respuesta_sin_tocar_la_base(self):
+        primera = self.crear('abc')
+        self.assertEqual(primera.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            repetida = self.crear('abc')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json()['id'], primera.data['id'])
+
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 998)
+
+    def test_clave_reutilizada_con_otros_datos(self):
+        self.crear('abc')
+        otro = dict(self.payload, direccion_entrega='Otra 456')
+        self.assertEqual(self.crear('abc', otro).status_code, 422)
+
+    def test_claves_distintas_crean_pedidos_distintos(self):
+        self.crear('uno')
+        self.crear('dos')
+        self.assertEqual(Pedido.objects.count(), 2)
+
+    def test_multipart_con_receta_grande(self):
+        # 3 MB: más que DATA_UPLOAD_MAX_MEMORY_SIZE, como una foto de receta
+        contenido = b'x' * (3 * 1024 * 1024)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+
+        def enviar(boundary):
+            payload = {
+                'direccion_entrega': 'Calle 123',
+                'farmacia_id': str(self.farmacia.id),
+                'detalles': json.dumps([{'producto': self.producto_receta.id, 'cantidad': 1}]),
+                'receta_0': SimpleUploadedFile('receta.jpg', contenido, content_type='image/jpeg'),
+            }
+            return self.client.post(
+                reverse('pedidos-crear'),
+                encode_multipart(boundary, payload),
+                content_type=f'multipart/form-data; boundary={boundary}',
+                HTTP_IDEMPOTENCY_KEY='receta',
+            )
+
+        with self.settings(MEDIA_ROOT=directorio.name):
+            primera = enviar('limite-uno')
+            self.assertEqual(primera.status_code, 201)
+            # El reintento de la app trae otro boundary
+            repetida = enviar('limite-dos')
+            self.assertEqual(DetallePedido.objects.get().receta_archivo.size, len(contenido))
+
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(Pedido.objects.count(), 1)
+
+
+class VentasAcumuladasTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.farmacia)
+        # 02/03 01:30 UTC es todavía 01/03 en Buenos Aires (UTC-3)
+        self.crear_pedidos(3, estado='en_camino')
+        self.pedidos = list(Pedido.objects.order_by('id'))
+        Pedido.objects.filter(pk=self.pedidos[0].pk).update(
+            fecha=datetime(2026, 3, 2, 1, 30, tzinfo=dt_timezone.utc)
+        )
+        Pedido.objects.filter(pk__in=[p.pk for p in self.pedidos[1:]]).update(
+            fecha=datetime(2026, 3, 2, 15, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def cambiar_estado(self, pedido, estado):
+        response = self.client.patch(reverse('pedidos-estado', args=[pedido.pk]), {'estado': estado})
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def acumulados(self):
+        return (
+            sorted(VentaDia.objects.values_list('dia', 'ingresos', 'unidades', 'pedidos')),
+            sorted(VentaProductoDia.objects.values_list('dia', 'producto_id', 'ingresos', 'unidades', 'pedidos')),
+        )
+
+    def test_entregado_suma_una_sola_vez_en_el_dia_local(self):
+        self.cambiar_estado(self.pedidos[0], 'entregado')
+        self.cambiar_estado(self.pedidos[0], 'entregado')
+        self.cambiar_estado(self.pedidos[1], 'entregado')
+
+        dias, productos = self.acumulados()
+        self.assertEqual(dias, [
+            (date(2026, 3, 1), Decimal('350.00'), 2, 1),
+            (date(2026, 3, 2), Decimal('350.00'), 2, 1),
+        ])
+        self.assertEqual(productos[0], (date(2026, 3, 1), self.producto.id, Decimal('100.00'), 1, 1))
+        self.assertEqual(len(productos), 4)
+
+    def test_salir_de_entregado_resta(self):
+        self.cambiar_estado(self.pedidos[1], 'entregado')
+        self.cambiar_estado(self.pedidos[2], 'entregado')
+        self.cambiar_estado(self.pedidos[2], 'cancelado')
+
+        self.assertEqual(VentaDia.objects.get().pedidos, 1)
+        self.cambiar_estado(self.pedidos[1], 'no_entregado')
+        self.assertEqual(self.acumulados(), ([], []))
+        self.assertFalse(Pedido.objects.filter(ventas_registradas=True).exists())
+
+    def test_reconstruir_coincide_con_los_incrementales(self):
+        for pedido in self.pedidos:
+            self.cambiar_estado(pedido, 'entregado')
+        esperado = self.acumulados()
+
+        VentaDia.objects.update(ingresos=0)
+        VentaProductoDia.objects.filter(producto=self.producto).delete()
+        Pedido.objects.update(ventas_registradas=False)
+        call_command('reconstruir_ventas', stdout=mock.MagicMock())
+
+        self.assertEqual(self.acumulados(), esperado)
+        self.assertEqual(Pedido.objects.filter(ventas_registradas=True).count(), 3)
+
+        ventas.reconstruir(farmacia_id=self.farmacia.id, desde=date(2026, 3, 2), hasta=date(2026, 3, 2))
+        self.assertEqual(self.acumulados(), esperado)
+
+    def test_reporte_por_rango(self):
+        for pedido in self.pedidos:
+            self.cambiar_estado(pedido, 'entregado')
+        url = reverse('pedidos-ventas')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'desde': '2026-03-01', 'hasta': '2026-03-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], {'ingresos': '1050.00', 'unidades': 6, 'pedidos': 3})
+        self.assertEqual([d['dia'] for d in response.data['dias']], ['2026-03-01', '2026-03-02'])
+        self.assertEqual(
+            [(p['producto_id'], p['ingresos'], p['pedidos']) for p in response.data['productos']],
+            [(self.producto_receta.id, '750.00', 3), (self.producto.id, '300.00', 3)],
+        )
+
+        response = self.client.get(url, {'desde': '2026-03-02', 'hasta': '2026-03-02', 'limit': 1})
+        self.assertEqual(response.data['total']['pedidos'], 2)
+        self.assertEqual(len(response.data['productos']), 1)
+
+    def test_reporte_parametros_y_permisos(self):
+        url = reverse('pedidos-ventas')
+        for params in (
+            {'desde': '01/03/2026'},
+            {'desde': '2026-03-05', 'hasta': '2026-03-01'},
+            {'desde': '2024-01-01', 'hasta': '2026-01-01'},
+            {'hasta': '0001-01-01'},
+            {'limit': 0},
+        ):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_authenticate(self.cliente)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ExportarPedidosTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.farmacia)
+        self.url = reverse('pedidos-exportar')
+        self.crear_pedidos(3, estado='entregado')
+        self.pedidos = list(Pedido.objects.order_by('id'))
+        for pedido, fecha in zip(self.pedidos, (
+            datetime(2026, 3, 1, 12, 0, tzinfo=dt_timezone.utc),
+            datetime(2026, 3, 2, 1, 30, tzinfo=dt_timezone.utc),  # 01/03 en Buenos Aires
+            datetime(2026, 3, 5, 12, 0, tzinfo=dt_timezone.utc),
+        )):
+            Pedido.objects.filter(pk=pedido.pk).update(fecha=fecha)
+        otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia')
+        Pedido.objects.create(cliente=self.cliente, farmacia=otra, direccion_entrega='X', metodo_pago='efectivo')
+
+    def exportar(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_una_fila_por_linea_de_pedido(self):
+        filas = list(csv.DictReader(io.StringIO(self.exportar())))
+
+        self.assertEqual(len(filas), 6)
+        self.assertEqual(
+            [int(f['pedido_id']) for f in filas[::2]], [p.pk for p in reversed(self.pedidos)]
+        )
+        linea = next(f for f in filas if f['producto'] == 'Amoxicilina')
+        self.assertEqual((linea['cantidad'], linea['precio_unitario'], linea['subtotal']), ('1', '250.00', '250.00'))
+        self.assertEqual(linea['cliente_email'], 'cliente@test.com')
+
+    def test_ndjson_filtrado_por_dias_locales(self):
+        contenido = self.exportar(formato='ndjson', desde='2026-03-01', hasta='2026-03-01')
+        registros = [json.loads(linea) for linea in contenido.splitlines()]
+
+        self.assertEqual({r['pedido_id'] for r in registros}, {self.pedidos[0].pk, self.pedidos[1].pk})
+        self.assertTrue(all(r['fecha'].startswith('2026-03-01') for r in registros))
+        self.assertEqual(self.exportar(formato='ndjson', estado='cancelado'), '')
+
+    def test_consulta_unica_sin_ordenar_en_memoria(self):
+        with self.assertNumQueries(1):
+            self.exportar(desde='2026-03-01')
+
+        sql, params = exportacion.consulta(self.farmacia.id).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIn('pedido_farmacia_fecha_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_parametros_y_permisos(self):
+        for params in ({'formato': 'xml'}, {'desde': 'ayer'}, {'estado': 'x'},
+                       {'desde': '2026-03-05', 'hasta': '2026-03-01'}, {'hasta': '9999-12-31'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+        self.client.force_authenticate(self.cliente)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ArchivoPedidosTests(PedidosTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_pedidos(3, estado='entregado')
+        self.crear_pedidos(1, estado='cancelado')
+        self.crear_pedidos(1, estado='en_camino', repartidor=self.repartidor)
+        self.pedidos = list(Pedido.objects.order_by('id'))
+        viejo = timezone.now() - timedelta(days=200)
+        Pedido.objects.update(fecha=viejo, fecha_actualizacion=viejo)
+        # El último entregado cambió hace poco: sigue en las tablas vivas
+        Pedido.objects.filter(pk=self.pedidos[2].pk).update(fecha_actualizacion=timezone.now())
+        for pedido in self.pedidos:
+            PedidoRechazado.objects.create(pedido=pedido, repartidor=self.repartidor)
+
+    def test_archiva_en_lotes_los_cerrados_viejos(self):
+        with CaptureQueriesContext(connection) as ctx:
+            movidos = archivo.archivar(dias=180, lote=2)
+
+        self.assertEqual(movidos, 3)
+        self.assertEqual(
+            set(Pedido.objects.values_list('id', flat=True)), {self.pedidos[2].pk, self.pedidos[4].pk}
+        )
+        archivados = [self.pedidos[0].pk, self.pedidos[1].pk, self.pedidos[3].pk]
+        self.assertEqual(sorted(PedidoArchivado.objects.values_list('id', flat=True)), archivados)
+        self.assertEqual(DetallePedidoArchivado.objects.filter(pedido_id__in=archivados).count(), 6)
+        self.assertFalse(DetallePedido.objects.filter(pedido_id__in=archivados).exists())
+        self.assertFalse(PedidoRechazado.objects.filter(pedido_id__in=archivados).exists())
+        # Un lote por transacción (savepoint dentro del test): dos lotes llenos
+        self.assertEqual(sum(q['sql'].startswith('SAVEPOINT') for q in ctx.captured_queries), 2)
+
+        archivado = PedidoArchivado.objects.get(pk=self.pedidos[0].pk)
+        self.assertEqual((archivado.estado, archivado.cliente_id), ('entregado', self.cliente.id))
+        self.assertIsNotNone(archivado.fecha_archivado)
+
+    def test_no_archiva_si_el_pedido_cambio_despues_de_elegirlo(self):
+        limite = timezone.now() - timedelta(days=180)
+        original = archivo._candidatos
+
+        def candidatos_y_reabrir(*args):
+            ids = original(*args)
+            Pedido.objects.filter(pk=self.pedidos[0].pk).update(
+                estado='en_camino', fecha_actualizacion=timezone.now()
+            )
+            return ids
+
+        with mock.patch.object(archivo, '_candidatos', candidatos_y_reabrir):
+            candidatos, movidos = archivo._archivar_lote(limite, 10)
+
+        self.assertEqual((candidatos, movidos), (3, 2))
+        self.assertTrue(Pedido.objects.filter(pk=self.pedidos[0].pk).exists())
+        self.assertEqual(DetallePedido.objects.filter(pedido=self.pedidos[0]).count(), 2)
+
+    def test_candidatos_por_indice_parcial(self):
+        with CaptureQueriesContext(connection) as ctx:
+            archivo._candidatos(timezone.now(), 10)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIn('pedido_archivable_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_comando_purga_rechazos_de_pedidos_cerrados(self):
+        call_command('archivar_pedidos', solo_rechazos=True, lote=1, stdout=mock.MagicMock())
+
+        self.assertEqual(
+            list(PedidoRechazado.objects.values_list('pedido_id', flat=True)), [self.pedidos[4].pk]
+        )
+        self.assertEqual(PedidoArchivado.objects.count(), 0)
+
+    def test_listados_leen_el_archivo_solo_si_se_pide(self):
+        call_command('archivar_pedidos', stdout=mock.MagicMock())
+        self.client.force_authenticate(self.cliente)
+        url = reverse('pedidos-mios')
+
+        vivos = self.client.get(url).data['results']
+        self.assertEqual({p['id'] for p in vivos}, {self.pedidos[2].pk, self.pedidos[4].pk})
+
+        archivados = self.client.get(url, {'archivados': 1}).data['results']
+        self.assertEqual([p['id'] for p in archivados], [self.pedidos[3].pk, self.pedidos[1].pk, self.pedidos[0].pk])
+        self.assertEqual(len(archivados[0]['detalles']), 2)
+
+        self.client.force_authenticate(self.farmacia)
+        export = self.client.get(reverse('pedidos-exportar'), {'formato': 'ndjson', 'archivados': 1})
+        lineas = b''.join(export.streaming_content).decode().splitlines()
+        self.assertEqual(len({json.loads(linea)['pedido_id'] for linea in lineas}), 5)
+
+    def test_ventas_siguen_contando_los_archivados(self):
+        self.client.force_authenticate(self.farmacia)
+        ventas.reconstruir()
+        esperado = list(VentaDia.objects.values_list('dia', 'ingresos', 'pedidos'))
+
+        archivo.archivar(dias=180)
+        ventas.reconstruir()
+
+        self.assertEqual(list(VentaDia.objects.values_list('dia', 'ingresos', 'pedidos')), esperado)
+        self.assertEqual(sum(p for _, _, p in esperado), 3)
+
+
+@override_settings(DB_REPLICAS=['default'])
+class LecturaEnReplicaTests(PedidosTestMixin, APITestCase):
+    """'default' hace de réplica: se mira qué decide el router, no a qué base va."""
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        self.crear_pedidos(1)
+        self.copia = time.time()
+        patcher = mock.patch.object(replicas, 'copia_de', side_effect=lambda alias: self.copia)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def elegidas(self, metodo, url, **kwargs):
+        elegidas = []
+        original = replicas.replica_para_leer
+
+        def registrar():
+            alias = original()
+            elegidas.append(alias)
+            return alias
+
+        with mock.patch.object(replicas, 'replica_para_leer', registrar):
+            response = getattr(self.client, metodo)(url, **kwargs)
+        self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+        return set(elegidas)
+
+    def test_listados_leen_de_la_replica(self):
+        self.client.force_authenticate(self.cliente)
+        self.assertEqual(self.elegidas('get', reverse('pedidos-mios')), {'default'})
+        self.assertEqual(
+            self.elegidas('get', reverse('pedidos-por-farmacia', args=[self.farmacia.id])), {'default'},
+        )
+
+    def test_escrituras_no_usan_la_replica(self):
+        self.client.force_authenticate(self.cliente)
+        elegidas = self.elegidas('post', reverse('pedidos-reservas'), data={
+            'detalles': [{'producto': self.producto.id, 'cantidad': 1}],
+        }, format='json')
+        self.assertEqual(elegidas, {None})
+
+    def test_despues_de_escribir_lee_de_default_hasta_que_la_copia_lo_incluya(self):
+        self.client.force_authenticate(self.cliente)
+        self.copia = time.time() - 1
+        self.client.post(reverse('pedidos-reservas'), {
+            'detalles': [{'producto': self.producto.id, 'cantidad': 1}],
+        }, format='json')
+
+        self.assertEqual(self.elegidas('get', reverse('pedidos-mios')), {None})
+
+        self.copia = time.time()
+        self.assertEqual(self.elegidas('get', reverse('pedidos-mios')), {'default'})
+
+        # Otro usuario no escribió: sigue leyendo de la réplica
+        self.copia = time.time() - 1
+        self.client.force_authenticate(self.farmacia)
+        self.assertEqual(
+            self.elegidas('get', reverse('pedidos-por-farmacia', args=[self.farmacia.id])), {'default'},
+        )
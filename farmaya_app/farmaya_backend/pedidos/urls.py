@@ -7,6 +7,11 @@ urlpatterns = [
     path('', views.CrearPedidoView.as_view(), name='pedidos-crear'),
     path('lista/', views.PedidoListView.as_view(), name='pedidos-lista'),
     path('mis/', views.MisPedidosView.as_view(), name='pedidos-mios'),
+    path('stream/', views.PedidosStreamView.as_view(), name='pedidos-stream'),
+    path('reservas/', views.ReservasStockView.as_view(), name='pedidos-reservas'),
+    path('reservas/<int:reserva_id>/', views.LiberarReservaView.as_view(), name='pedidos-reserva-liberar'),
+    path('exportar/', views.ExportarPedidosView.as_view(), name='pedidos-exportar'),
+    path('ventas/', views.VentasFarmaciaView.as_view(), name='pedidos-ventas'),
     path('farmacia/<int:farmacia_id>/', views.PedidosPorFarmaciaView.as_view(), name='pedidos-por-farmacia'),
     path('<int:pedido_id>/estado/', views.ActualizarEstadoPedidoView.as_view(), name='pedidos-estado'),
     path('detalles/<int:detalle_id>/receta/', views.ActualizarEstadoRecetaView.as_view(), name='pedido-detalle-receta'),
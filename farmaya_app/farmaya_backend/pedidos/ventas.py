@@ -0,0 +1,275 @@
+"""
+Acumulados de ventas entregadas por farmacia × día y farmacia × día × producto.
+
+Cuando un pedido pasa a entregado, sus detalles se suman a VentaDia y
+VentaProductoDia en la misma transacción que el cambio de estado; si después
+sale de entregado (la farmacia lo corrige) se restan. El UPDATE condicional
+sobre Pedido.ventas_registradas asegura que cada pedido se cuente una sola vez
+aunque lleguen dos cambios simultáneos.
+
+El día es el de la fecha del pedido en hora de Buenos Aires. El reporte de un
+rango lee solo los acumulados (una fila por día y por producto vendido), sin
+recorrer el historial de pedidos. reconstruir() los recalcula desde los
+pedidos vivos y archivados (comando reconstruir_ventas).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado, VentaDia, VentaProductoDia,
+)
+
+
+ZONA = ZoneInfo('America/Argentina/Buenos_Aires')
+CAMPOS_ACUMULADOS = ('ingresos', 'unidades', 'pedidos')
+CENTAVOS = Decimal('0.01')
+
+
+def dia_local(fecha):
+    """Día (date) de un datetime en hora de Buenos Aires."""
+    return timezone.localtime(fecha, ZONA).date()
+
+
+def inicio_del_dia(dia):
+    return datetime.combine(dia, time.min, tzinfo=ZONA)
+
+
+def hoy():
+    return dia_local(timezone.now())
+
+
+def _sql_sumar(modelo, claves):
+    """INSERT ... ON CONFLICT que suma los valores a la fila existente."""
+    q = connection.ops.quote_name
+    tabla = q(modelo._meta.db_table)
+    columnas = [*claves, *CAMPOS_ACUMULADOS]
+    return (
+        f"INSERT INTO {tabla} ({', '.join(q(c) for c in columnas)}) "
+        f"VALUES ({', '.join(['%s'] * len(columnas))}) "
+        f"ON CONFLICT ({', '.join(q(c) for c in claves)}) DO UPDATE SET "
+        + ', '.join(f'{q(c)} = {tabla}.{q(c)} + excluded.{q(c)}' for c in CAMPOS_ACUMULADOS)
+    )
+
+
+def _sql_restar(modelo, claves):
+    """
+    UPDATE que descuenta los valores. No se reusa el upsert con valores
+    negativos porque los CHECK de los campos positivos se evalúan sobre la
+    fila a insertar antes de resolver el conflicto.
+    """
+    q = connection.ops.quote_name
+    return (
+        f"UPDATE {q(modelo._meta.db_table)} SET "
+        + ', '.join(f'{q(c)} = {q(c)} - %s' for c in CAMPOS_ACUMULADOS)
+        + ' WHERE ' + ' AND '.join(f'{q(c)} = %s' for c in claves)
+    )
+
+
+def _acumular(pedido, sumar):
+    """Suma o resta el pedido de los acumulados de su día."""
+    por_producto = {}
+    for detalle in pedido.detalles.all():
+        ingresos, unidades = por_producto.get(detalle.producto_id, (Decimal('0'), 0))
+        por_producto[detalle.producto_id] = (
+            ingresos + detalle.precio_unitario * detalle.cantidad,
+            unidades + detalle.cantidad,
+        )
+
+    dia = dia_local(pedido.fecha)
+    total = (
+        sum((i for i, _ in por_producto.values()), Decimal('0')),
+        sum(u for _, u in por_producto.values()),
+        1,
+    )
+    filas_producto = [
+        (producto_id, (ingresos, unidades, 1))
+        for producto_id, (ingresos, unidades) in por_producto.items()
+    ]
+    claves_dia = ['farmacia_id', 'dia']
+    claves_producto = ['farmacia_id', 'dia', 'producto_id']
+
+    with connection.cursor() as cursor:
+        if sumar:
+            cursor.execute(_sql_sumar(VentaDia, claves_dia), [pedido.farmacia_id, dia, *total])
+            if filas_producto:
+                cursor.executemany(
+                    _sql_sumar(VentaProductoDia, claves_producto),
+                    [[pedido.farmacia_id, dia, producto_id, *valores] for producto_id, valores in filas_producto],
+                )
+            return
+
+        cursor.execute(_sql_restar(VentaDia, claves_dia), [*total, pedido.farmacia_id, dia])
+        if filas_producto:
+            cursor.executemany(
+                _sql_restar(VentaProductoDia, claves_producto),
+                [[*valores, pedido.farmacia_id, dia, producto_id] for producto_id, valores in filas_producto],
+            )
+    # Lo que quedó sin pedidos no es una venta: no se deja la fila en cero
+    VentaDia.objects.filter(farmacia_id=pedido.farmacia_id, dia=dia, pedidos=0).delete()
+    VentaProductoDia.objects.filter(farmacia_id=pedido.farmacia_id, dia=dia, pedidos=0).delete()
+
+
+def registrar_cambio_estado(pedido):
+    """
+    Suma o resta el pedido de los acumulados según su nuevo estado. Se llama
+    dentro de la transacción que guarda el cambio; los detalles conviene
+    traerlos con prefetch_related('detalles').
+    """
+    entregado = pedido.estado == 'entregado'
+    if entregado == pedido.ventas_registradas:
+        return
+    marcado = Pedido.objects.filter(
+        pk=pedido.pk, ventas_registradas=not entregado
+    ).update(ventas_registradas=entregado)
+    if marcado:
+        pedido.ventas_registradas = entregado
+        _acumular(pedido, sumar=entregado)
+
+
+def _filtrar(queryset, farmacia_id, **rango):
+    """Filtra por farmacia y por los límites de rango que no sean None."""
+    if farmacia_id is not None:
+        queryset = queryset.filter(farmacia_id=farmacia_id)
+    return queryset.filter(**{lookup: valor for lookup, valor in rango.items() if valor is not None})
+
+
+def _reconstruir_desde(modelo_detalle, entregados, lote):
+    """Suma a los acumulados los pedidos entregados de una fuente (tablas vivas o de archivo)."""
+    por_producto = (
+        modelo_detalle.objects.filter(pedido__in=entregados)
+        .annotate(dia=TruncDate('pedido__fecha', tzinfo=ZONA))
+        .values('pedido__farmacia_id', 'dia', 'producto_id')
+        .annotate(
+            total_ingresos=Sum(
+                F('precio_unitario') * F('cantidad'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            total_unidades=Sum('cantidad'),
+            total_pedidos=Count('pedido_id', distinct=True),
+        )
+        .order_by()
+    )
+    dias = {
+        (fila['farmacia_id'], fila['dia']): [fila['farmacia_id'], fila['dia'], Decimal('0'), 0, fila['total_pedidos']]
+        for fila in (
+            entregados.annotate(dia=TruncDate('fecha', tzinfo=ZONA))
+            .values('farmacia_id', 'dia')
+            .annotate(total_pedidos=Count('id'))
+            .order_by()
+        )
+    }
+
+    # Con upserts, un día con pedidos en las dos fuentes queda sumado en una sola fila
+    sql_producto = _sql_sumar(VentaProductoDia, ['farmacia_id', 'dia', 'producto_id'])
+    with connection.cursor() as cursor:
+        pendientes = []
+        for fila in por_producto.iterator(chunk_size=lote):
+            dia = dias[(fila['pedido__farmacia_id'], fila['dia'])]
+            dia[2] += fila['total_ingresos']
+            dia[3] += fila['total_unidades']
+            pendientes.append([
+                fila['pedido__farmacia_id'], fila['dia'], fila['producto_id'],
+                fila['total_ingresos'], fila['total_unidades'], fila['total_pedidos'],
+            ])
+            if len(pendientes) >= lote:
+                cursor.executemany(sql_producto, pendientes)
+                pendientes = []
+        if pendientes:
+            cursor.executemany(sql_producto, pendientes)
+        if dias:
+            cursor.executemany(_sql_sumar(VentaDia, ['farmacia_id', 'dia']), list(dias.values()))
+
+
+def reconstruir(farmacia_id=None, desde=None, hasta=None, lote=1000):
+    """
+    Recalcula los acumulados desde los pedidos entregados (vivos y
+    archivados), opcionalmente solo para una farmacia y/o un rango de días.
+    Devuelve (filas por día, filas por producto) del alcance recalculado.
+    """
+    inicio = inicio_del_dia(desde) if desde is not None else None
+    fin = inicio_del_dia(hasta + timedelta(days=1)) if hasta is not None else None
+    acumulados = [
+        _filtrar(modelo.objects.all(), farmacia_id, dia__gte=desde, dia__lte=hasta)
+        for modelo in (VentaDia, VentaProductoDia)
+    ]
+    pedidos = _filtrar(Pedido.objects.all(), farmacia_id, fecha__gte=inicio, fecha__lt=fin)
+
+    with transaction.atomic():
+        # Primero el borrado: toma el bloqueo de escritura antes de leer los pedidos
+        for queryset in acumulados:
+            queryset.delete()
+
+        for modelo_pedido, modelo_detalle in (
+            (Pedido, DetallePedido), (PedidoArchivado, DetallePedidoArchivado),
+        ):
+            entregados = _filtrar(
+                modelo_pedido.objects.filter(estado='entregado'), farmacia_id, fecha__gte=inicio, fecha__lt=fin
+            )
+            _reconstruir_desde(modelo_detalle, entregados, lote)
+
+        pedidos.filter(estado='entregado', ventas_registradas=False).update(ventas_registradas=True)
+        pedidos.exclude(estado='entregado').filter(ventas_registradas=True).update(ventas_registradas=False)
+
+    return tuple(queryset.count() for queryset in acumulados)
+
+
+def _importe(valor):
+    return str(Decimal(valor or 0).quantize(CENTAVOS))
+
+
+def reporte(farmacia_id, desde, hasta, limite_productos=50):
+    """
+    Ventas de la farmacia entre desde y hasta (días inclusive): totales, una
+    entrada por día con ventas y los productos que más facturaron.
+    """
+    dias = list(
+        VentaDia.objects.filter(farmacia_id=farmacia_id, dia__range=(desde, hasta))
+        .order_by('dia')
+        .values('dia', *CAMPOS_ACUMULADOS)
+    )
+    productos = (
+        VentaProductoDia.objects.filter(farmacia_id=farmacia_id, dia__range=(desde, hasta))
+        .values('producto_id', 'producto__nombre', 'producto__presentacion')
+        .annotate(
+            total_ingresos=Sum('ingresos'),
+            total_unidades=Sum('unidades'),
+            total_pedidos=Sum('pedidos'),
+        )
+        .order_by('-total_ingresos', 'producto_id')[:limite_productos]
+    )
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'total': {
+            'ingresos': _importe(sum((Decimal(d['ingresos']) for d in dias), Decimal('0'))),
+            'unidades': sum(d['unidades'] for d in dias),
+            'pedidos': sum(d['pedidos'] for d in dias),
+        },
+        'dias': [
+            {
+                'dia': d['dia'].isoformat(),
+                'ingresos': _importe(d['ingresos']),
+                'unidades': d['unidades'],
+                'pedidos': d['pedidos'],
+            }
+            for d in dias
+        ],
+        'productos': [
+            {
+                'producto_id': p['producto_id'],
+                'nombre': p['producto__nombre'],
+                'presentacion': p['producto__presentacion'],
+                'ingresos': _importe(p['total_ingresos']),
+                'unidades': p['total_unidades'],
+                'pedidos': p['total_pedidos'],
+            }
+            for p in productos
+        ],
+    }
@@ -1,42 +1,100 @@
+import asyncio
 import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Max, Q, prefetch_related_objects
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views import View
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-
-from productos.models import Producto
-
-from .models import DetallePedido, Pedido, PedidoRechazado
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from accounts import geo
+from backend.replicas import LecturaEnReplicaMixin
+from productos import stock
+from productos.models import Producto, ReservaStock
+from productos.serializers import ReservaStockSerializer
+
+from . import eventos, exportacion, ventas
+from .idempotencia import IdempotenciaMixin
+from .models import DetallePedido, Pedido, PedidoArchivado, PedidoRechazado
+from .pagination import DistanciaCursorPagination, PedidoCursorPagination
 from .serializers import DetallePedidoSerializer, PedidoSerializer
 
 
 User = get_user_model()
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _token_desde_fecha(fecha, pk=None):
+    """
+    Convierte una marca de cambio en un token opaco (microsegundos desde epoch).
+    Con pk es un token de continuación: sigue después de ese pedido, aunque
+    otros compartan la misma marca.
+    """
+    if fecha is None:
+        return '0'
+    microsegundos = (fecha - _EPOCH) // timedelta(microseconds=1)
+    return str(microsegundos) if pk is None else f'{microsegundos}-{pk}'
+
+
+def _fecha_desde_token(token):
+    """Inversa de _token_desde_fecha: (fecha, pk o None), o None si el token no es válido."""
+    microsegundos, _, pk = (token or '').partition('-')
+    try:
+        microsegundos = int(microsegundos)
+        pk = int(pk) if pk else None
+    except ValueError:
+        return None
+    if microsegundos < 0:
+        return None
+    return _EPOCH + timedelta(microseconds=microsegundos), pk
+
+
+def _con_archivados(request):
+    """True si el cliente pidió leer también (o solo) el archivo con ?archivados=1."""
+    return request.query_params.get('archivados', '').lower() in ('1', 'true', 'si')
+
+
+def _modelo_pedidos(request):
+    """Los listados leen las tablas vivas; las de archivo solo con ?archivados=1."""
+    return PedidoArchivado if _con_archivados(request) else Pedido
+
 
 class PedidoListView(generics.ListAPIView):
     queryset = (
-        Pedido.objects.select_related('cliente', 'farmacia')
+        Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
         .prefetch_related('detalles__producto')
         .order_by('-fecha')
     )
     serializer_class = PedidoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PedidoCursorPagination
 
 
-class PedidosPorFarmaciaView(generics.ListAPIView):
+class PedidosPorFarmaciaView(LecturaEnReplicaMixin, generics.ListAPIView):
+    """Pedidos de una farmacia. Con ?archivados=1 lista los pedidos archivados."""
     serializer_class = PedidoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PedidoCursorPagination
 
     def get_queryset(self):
         farmacia_id = self.kwargs['farmacia_id']
         estado = self.request.query_params.get('estado')
 
         queryset = (
-            Pedido.objects.select_related('cliente', 'farmacia')
+            _modelo_pedidos(self.request).objects.select_related('cliente', 'farmacia', 'repartidor')
             .prefetch_related('detalles__producto')
             .filter(farmacia_id=farmacia_id)
             .order_by('-fecha')
@@ -48,9 +106,11 @@ class PedidosPorFarmaciaView(generics.ListAPIView):
         return queryset
 
 
-class MisPedidosView(generics.ListAPIView):
+class MisPedidosView(LecturaEnReplicaMixin, generics.ListAPIView):
+    """Pedidos del usuario según su rol. Con ?archivados=1 lista los pedidos archivados."""
     serializer_class = PedidoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PedidoCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -59,7 +119,7 @@ class MisPedidosView(generics.ListAPIView):
         # Si es cliente, devolver sus pedidos
         if tipo_usuario == 'cliente':
             return (
-                Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
+                _modelo_pedidos(self.request).objects.select_related('cliente', 'farmacia', 'repartidor')
                 .prefetch_related('detalles__producto')
                 .filter(cliente=user)
                 .order_by('-fecha')
@@ -67,7 +127,7 @@ class MisPedidosView(generics.ListAPIView):
         # Si es repartidor, devolver pedidos asignados a él
         elif tipo_usuario == 'repartidor':
             return (
-                Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
+                _modelo_pedidos(self.request).objects.select_related('cliente', 'farmacia', 'repartidor')
                 .prefetch_related('detalles__producto')
                 .filter(repartidor=user)
                 .order_by('-fecha')
@@ -75,7 +135,7 @@ class MisPedidosView(generics.ListAPIView):
         # Si es farmacia, devolver pedidos de esa farmacia
         elif tipo_usuario == 'farmacia':
             return (
-                Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
+                _modelo_pedidos(self.request).objects.select_related('cliente', 'farmacia', 'repartidor')
                 .prefetch_related('detalles__producto')
                 .filter(farmacia=user)
                 .order_by('-fecha')
@@ -83,14 +143,64 @@ class MisPedidosView(generics.ListAPIView):
         # Por defecto, devolver pedidos del cliente (comportamiento anterior)
         else:
             return (
-                Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
+                _modelo_pedidos(self.request).objects.select_related('cliente', 'farmacia', 'repartidor')
                 .prefetch_related('detalles__producto')
                 .filter(cliente=user)
                 .order_by('-fecha')
             )
 
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?since=<token> devuelve solo los pedidos que cambiaron desde ese token
+        junto con un token nuevo. Si además el cliente manda If-None-Match con el
+        ETag de la respuesta anterior y nada cambió, responde 304 sin serializar.
+        Sin ?since se comporta como el listado paginado de siempre.
+
+        Los cambios vienen de a una página (page_size, como el listado): si
+        quedan más, token es uno de continuación y next la URL para pedirlos.
+        El cliente repite con ese token hasta que next sea null.
+        """
+        since = request.query_params.get('since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        posicion = _fecha_desde_token(since)
+        if posicion is None:
+            return Response(
+                {'detail': 'El token de sincronización no es válido.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        desde, desde_pk = posicion
+
+        queryset = self.get_queryset()
+        ultima = queryset.order_by().aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+        token = _token_desde_fecha(ultima)
+        etag = f'"{token}"'
+
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        filtro = Q(fecha_actualizacion__gt=desde)
+        if desde_pk is not None:
+            filtro |= Q(fecha_actualizacion=desde, pk__gt=desde_pk)
+        limite = self.paginator.get_page_size(request)
+        # Ordenado por la marca de cambio para recorrer el mismo índice del filtro
+        cambiados = list(queryset.filter(filtro).order_by('fecha_actualizacion', 'id')[:limite + 1])
+
+        siguiente = None
+        if len(cambiados) > limite:
+            cambiados = cambiados[:limite]
+            token = _token_desde_fecha(cambiados[-1].fecha_actualizacion, cambiados[-1].pk)
+            etag = f'"{token}"'
+            siguiente = replace_query_param(request.build_absolute_uri(), 'since', token)
+
+        serializer = self.get_serializer(cambiados, many=True)
+        return Response(
+            {'token': token, 'next': siguiente, 'results': serializer.data}, headers={'ETag': etag}
+        )
+
 
-class CrearPedidoView(APIView):
+class CrearPedidoView(IdempotenciaMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
@@ -102,14 +212,16 @@ class CrearPedidoView(APIView):
             )
 
         pedidos = (
-            Pedido.objects.select_related('cliente', 'farmacia')
+            Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
             .prefetch_related('detalles__producto')
             .filter(farmacia=request.user)
             .order_by('-fecha')
         )
 
-        serializer = PedidoSerializer(pedidos, many=True, context={'request': request})
-        return Response(serializer.data)
+        paginator = PedidoCursorPagination()
+        page = paginator.paginate_queryset(pedidos, request, view=self)
+        serializer = PedidoSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         cliente = request.user
@@ -157,90 +269,162 @@ class CrearPedidoView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        with transaction.atomic():
-            pedido = Pedido.objects.create(
-                cliente=cliente,
-                farmacia=farmacia,
-                direccion_entrega=direccion,
-                metodo_pago=metodo_pago,
-            )
+        # Validar las líneas antes de tocar la base
+        lineas = []
+        for index, detalle in enumerate(detalles_payload):
+            producto_id = detalle.get('producto') or detalle.get('producto_id')
+            try:
+                producto_id = int(producto_id)
+            except (TypeError, ValueError):
+                producto_id = None
+            if not producto_id:
+                return Response(
+                    {'detail': 'Uno de los productos seleccionados es inválido.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            for index, detalle in enumerate(detalles_payload):
-                producto_id = detalle.get('producto') or detalle.get('producto_id')
-                if not producto_id:
-                    transaction.set_rollback(True)
-                    return Response(
-                        {'detail': 'Uno de los productos seleccionados es inválido.'},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+            try:
+                cantidad = int(detalle.get('cantidad', 1))
+            except (TypeError, ValueError):
+                cantidad = 0
 
-                producto = get_object_or_404(Producto, pk=producto_id, farmacia=farmacia)
+            if cantidad <= 0:
+                return Response(
+                    {'detail': 'La cantidad debe ser un número positivo.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-                try:
-                    cantidad = int(detalle.get('cantidad', 1))
-                except (TypeError, ValueError):
-                    cantidad = 0
+            receta_key = detalle.get('receta_key') or detalle.get('recetaCampo')
+            if receta_key:
+                receta_file = request.FILES.get(receta_key)
+            else:
+                receta_file = request.FILES.get(f'receta_{index}')
 
-                if cantidad <= 0:
-                    transaction.set_rollback(True)
-                    return Response(
-                        {'detail': 'La cantidad debe ser un número positivo.'},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+            lineas.append((producto_id, cantidad, receta_file))
 
-                # Validar que haya stock suficiente
-                if producto.stock < cantidad:
-                    transaction.set_rollback(True)
-                    return Response(
-                        {
-                            'detail': (
-                                f'No hay stock suficiente de "{producto.nombre}". '
-                                f'Stock disponible: {producto.stock}, solicitado: {cantidad}.'
-                            )
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+        # Todos los productos del pedido en una sola consulta
+        productos = Producto.objects.filter(farmacia=farmacia).in_bulk({linea[0] for linea in lineas})
 
-                receta_key = detalle.get('receta_key') or detalle.get('recetaCampo')
-                receta_file = None
-                if receta_key:
-                    receta_file = request.FILES.get(receta_key)
-                else:
-                    receta_file = request.FILES.get(f'receta_{index}')
+        cantidades = {}
+        for producto_id, cantidad, receta_file in lineas:
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise Http404
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
 
-                if producto.requiere_receta and not receta_file:
-                    transaction.set_rollback(True)
-                    return Response(
-                        {
-                            'detail': (
-                                f'El producto "{producto.nombre}" requiere que adjuntes una receta.'
-                            )
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
+            if producto.requiere_receta and not receta_file:
+                return Response(
+                    {
+                        'detail': (
+                            f'El producto "{producto.nombre}" requiere que adjuntes una receta.'
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            with transaction.atomic():
+                pedido = Pedido.objects.create(
+                    cliente=cliente,
+                    farmacia=farmacia,
+                    direccion_entrega=direccion,
+                    metodo_pago=metodo_pago,
+                )
+
+                # Un único UPDATE condicional descuenta el stock de todos los productos,
+                # usando primero lo que el cliente tenga reservado
+                stock.descontar(cantidades, usuario=cliente)
+
+                detalles = []
+                for producto_id, cantidad, receta_file in lineas:
+                    producto = productos[producto_id]
+                    detalles.append(
+                        DetallePedido(
+                            pedido=pedido,
+                            producto=producto,
+                            cantidad=cantidad,
+                            precio_unitario=producto.precio,
+                            requiere_receta=producto.requiere_receta,
+                            # bulk_create no pasa por DetallePedido.save
+                            estado_receta='pendiente' if producto.requiere_receta else 'no_requerida',
+                            receta_archivo=receta_file if producto.requiere_receta else None,
+                        )
                     )
+                DetallePedido.objects.bulk_create(detalles)
+        except stock.StockInsuficiente as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        prefetch_related_objects([pedido], 'detalles__producto')
+        serializer = PedidoSerializer(pedido, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReservasStockView(APIView):
+    """
+    Endpoint: /api/pedidos/reservas/
+    GET lista las reservas vigentes del usuario.
+    POST retiene stock mientras el cliente arma el pedido y sube las recetas:
+    {"detalles": [{"producto": id, "cantidad": n}, ...]}. Reemplaza reservas
+    previas sobre los mismos productos; vencen solas a los
+    RESERVA_STOCK_MINUTOS y se consumen al crear el pedido. Cada producto y
+    el total reservado por el usuario tienen un máximo (ver stock.reservar).
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-                detalle_obj = DetallePedido(
-                    pedido=pedido,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=producto.precio,
-                    requiere_receta=producto.requiere_receta,
+    def get(self, request):
+        reservas = (
+            ReservaStock.objects.select_related('producto')
+            .filter(usuario=request.user, vence__gt=timezone.now())
+        )
+        return Response(ReservaStockSerializer(reservas, many=True).data)
+
+    def post(self, request):
+        detalles_payload = request.data.get('detalles')
+        if not isinstance(detalles_payload, (list, tuple)) or not detalles_payload:
+            return Response(
+                {'detail': 'Debés seleccionar al menos un producto.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cantidades = {}
+        for detalle in detalles_payload:
+            try:
+                producto_id = int(detalle.get('producto') or detalle.get('producto_id'))
+                cantidad = int(detalle.get('cantidad', 1))
+            except (AttributeError, TypeError, ValueError):
+                return Response(
+                    {'detail': 'Uno de los productos seleccionados es inválido.'},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
+            if cantidad <= 0:
+                return Response(
+                    {'detail': 'La cantidad debe ser un número positivo.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
 
-                if producto.requiere_receta and receta_file:
-                    detalle_obj.receta_archivo = receta_file
+        if Producto.objects.filter(pk__in=cantidades).count() != len(cantidades):
+            raise Http404
 
-                detalle_obj.save()
+        try:
+            reservas = stock.reservar(request.user, cantidades)
+        except (stock.ReservaExcedida, stock.StockInsuficiente) as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Actualizar el stock del producto (restar la cantidad pedida)
-                producto.stock -= cantidad
-                producto.save(update_fields=['stock'])
+        return Response(ReservaStockSerializer(reservas, many=True).data, status=status.HTTP_201_CREATED)
 
-        serializer = PedidoSerializer(pedido, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+class LiberarReservaView(APIView):
+    """Endpoint: /api/pedidos/reservas/<id>/ — el cliente suelta una reserva antes de que venza."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request, reserva_id):
+        reserva = get_object_or_404(ReservaStock, pk=reserva_id, usuario=request.user)
+        stock.liberar(reserva)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class ActualizarEstadoPedidoView(APIView):
+
+class ActualizarEstadoPedidoView(IdempotenciaMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def patch(self, request, pedido_id):
@@ -318,22 +502,163 @@ class ActualizarEstadoPedidoView(APIView):
 
         # Actualizar estado
         pedido.estado = nuevo_estado
-        
+        update_fields = ['estado', 'fecha_actualizacion']
+
         # Si el estado es 'no_entregado', guardar el motivo
         if nuevo_estado == 'no_entregado':
             motivo_no_entrega = request.data.get('motivo_no_entrega', '')
             if motivo_no_entrega:
                 pedido.motivo_no_entrega = motivo_no_entrega
-                pedido.save(update_fields=['estado', 'motivo_no_entrega'])
-            else:
-                pedido.save(update_fields=['estado'])
-        else:
-            pedido.save(update_fields=['estado'])
+                update_fields.append('motivo_no_entrega')
+
+        cantidades = {}
+        for detalle in pedido.detalles.all():
+            cantidades[detalle.producto_id] = cantidades.get(detalle.producto_id, 0) + detalle.cantidad
+
+        try:
+            with transaction.atomic():
+                # Si el pedido no se concreta, el stock vuelve a la farmacia una sola vez.
+                # El UPDATE condicional sobre stock_repuesto evita devolverlo dos veces
+                # si llegan dos actualizaciones simultáneas.
+                if nuevo_estado in Pedido.ESTADOS_FALLIDOS and not pedido.stock_repuesto:
+                    marcado = Pedido.objects.filter(pk=pedido.pk, stock_repuesto=False).update(stock_repuesto=True)
+                    if marcado:
+                        pedido.stock_repuesto = True
+                        stock.reponer(cantidades)
+                # Si la farmacia reabre un pedido fallido, vuelve a descontar su stock
+                # (o no se reabre si ya no alcanza)
+                elif nuevo_estado not in Pedido.ESTADOS_FALLIDOS and pedido.stock_repuesto:
+                    marcado = Pedido.objects.filter(pk=pedido.pk, stock_repuesto=True).update(stock_repuesto=False)
+                    if marcado:
+                        pedido.stock_repuesto = False
+                        stock.descontar(cantidades)
+
+                # Entrar a (o salir de) entregado suma o resta el pedido de los acumulados de ventas
+                ventas.registrar_cambio_estado(pedido)
+                pedido.save(update_fields=update_fields)
+        except stock.StockInsuficiente as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        eventos.notificar_cambio_pedido(pedido)
 
         serializer = PedidoSerializer(pedido, context={'request': request})
         return Response(serializer.data)
 
 
+class VentasFarmaciaView(APIView):
+    """
+    Reporte de ventas entregadas de la farmacia autenticada.
+
+    GET ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&limit= (días en hora de Buenos
+    Aires, por defecto los últimos 30). Se arma con los acumulados de
+    pedidos.ventas: el costo depende de los días del rango y de los productos
+    vendidos, no de la cantidad de pedidos.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    DIAS_POR_DEFECTO = 30
+    MAX_DIAS = 366
+    LIMITE_PRODUCTOS = 50
+    MAX_LIMITE_PRODUCTOS = 200
+
+    def get(self, request):
+        if getattr(request.user, 'tipo_usuario', None) != 'farmacia':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        try:
+            hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else ventas.hoy()
+            desde = (
+                date.fromisoformat(params['desde']) if params.get('desde')
+                else hasta - timedelta(days=self.DIAS_POR_DEFECTO - 1)
+            )
+            limite = int(params.get('limit', self.LIMITE_PRODUCTOS))
+        except (ValueError, OverflowError):
+            return Response(
+                {'detail': 'Las fechas deben tener formato AAAA-MM-DD y limit debe ser un entero.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if desde > hasta or (hasta - desde).days >= self.MAX_DIAS:
+            return Response(
+                {'detail': f'El rango debe ir de desde a hasta y abarcar como máximo {self.MAX_DIAS} días.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 1 <= limite <= self.MAX_LIMITE_PRODUCTOS:
+            return Response(
+                {'detail': f'limit debe estar entre 1 y {self.MAX_LIMITE_PRODUCTOS}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(ventas.reporte(request.user.id, desde, hasta, limite))
+
+
+class ExportarPedidosView(APIView):
+    """
+    Exporta los pedidos de la farmacia autenticada con sus detalles, una fila
+    por línea de pedido, para contabilidad.
+
+    GET ?formato=csv|ndjson&desde=AAAA-MM-DD&hasta=AAAA-MM-DD&estado= (días en
+    hora de Buenos Aires, ambos inclusive). Con ?archivados=1 sigue con los
+    pedidos archivados después de los vivos. La respuesta se genera mientras
+    se lee la base (StreamingHttpResponse), sin armar la lista en memoria.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    TIPOS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+
+    def get(self, request):
+        if getattr(request.user, 'tipo_usuario', None) != 'farmacia':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        formato = params.get('formato', 'csv')
+        if formato not in exportacion.FORMATOS:
+            return Response(
+                {'detail': 'Formato no soportado. Usá csv o ndjson.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        estado = params.get('estado')
+        if estado and estado not in dict(Pedido.ESTADOS):
+            return Response(
+                {'detail': 'El estado solicitado no es válido.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            desde = date.fromisoformat(params['desde']) if params.get('desde') else None
+            hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else None
+            # El fin del rango es el inicio del día siguiente a hasta (9999-12-31 no lo tiene)
+            fin = ventas.inicio_del_dia(hasta + timedelta(days=1)) if hasta else None
+        except (ValueError, OverflowError):
+            return Response(
+                {'detail': 'Las fechas deben tener formato AAAA-MM-DD y estar entre 0001-01-01 y 9999-12-30.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if desde and hasta and desde > hasta:
+            return Response(
+                {'detail': 'desde no puede ser posterior a hasta.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        modelos = [Pedido, PedidoArchivado] if _con_archivados(request) else [Pedido]
+        querysets = [
+            exportacion.consulta(
+                request.user.id,
+                desde=ventas.inicio_del_dia(desde) if desde else None,
+                hasta=fin,
+                estado=estado,
+                modelo=modelo,
+            )
+            for modelo in modelos
+        ]
+        response = StreamingHttpResponse(
+            exportacion.generar(querysets, formato), content_type=self.TIPOS[formato]
+        )
+        nombre = '-'.join(['pedidos', *(d.isoformat() for d in (desde, hasta) if d)])
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+        response['Cache-Control'] = 'no-store'
+        # Que un proxy (nginx) no acumule la respuesta antes de reenviarla
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class ActualizarEstadoRecetaView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -368,6 +693,7 @@ class ActualizarEstadoRecetaView(APIView):
         if nuevo_estado == 'rechazada':
             detalle.receta_omitida = False
         detalle.save()
+        eventos.notificar_cambio_pedido(detalle.pedido)
 
         serializer = DetallePedidoSerializer(detalle, context={'request': request})
         return Response(serializer.data)
@@ -417,6 +743,7 @@ class ReenviarRecetaView(APIView):
         detalle.receta_omitida = False
         detalle.observaciones_receta = ''
         detalle.save()
+        eventos.notificar_cambio_pedido(detalle.pedido)
 
         serializer = DetallePedidoSerializer(detalle, context={'request': request})
         return Response(serializer.data)
@@ -450,6 +777,7 @@ class OmitirRecetaView(APIView):
         # Marcar la receta como omitida
         detalle.receta_omitida = True
         detalle.save()
+        eventos.notificar_cambio_pedido(detalle.pedido)
 
         serializer = DetallePedidoSerializer(detalle, context={'request': request})
         return Response(serializer.data)
@@ -461,8 +789,15 @@ class PedidosDisponiblesView(APIView):
     Excluye los pedidos que el repartidor ya ha rechazado.
     Solo muestra pedidos que están en estado 'aceptado' o 'en_preparacion'
     y que no tienen un repartidor asignado.
+
+    Si se envían ?lat=&lng= (ubicación actual del repartidor) y opcionalmente
+    ?radius= en km, devuelve solo los pedidos de farmacias dentro del radio,
+    ordenados por distancia real (haversine) e incluyendo 'distancia_km',
+    paginados con un cursor por (distancia, id).
     """
     permission_classes = [permissions.IsAuthenticated]
+    radio_default_km = 10
+    radio_max_km = 50
 
     def get(self, request):
         if getattr(request.user, 'tipo_usuario', None) != 'repartidor':
@@ -481,21 +816,87 @@ class PedidosDisponiblesView(APIView):
         # 2. No tienen repartidor asignado (repartidor es None)
         # 3. No están en la lista de pedidos rechazados por este repartidor
         pedidos_disponibles = (
-            Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
-            .prefetch_related('detalles__producto')
-            .filter(
+            Pedido.objects.filter(
                 estado__in=['aceptado', 'en_preparacion'],
                 repartidor__isnull=True
             )
             .exclude(id__in=pedidos_rechazados_ids)
+        )
+
+        if 'lat' in request.query_params or 'lng' in request.query_params:
+            return self._cercanos(request, pedidos_disponibles)
+
+        pedidos_disponibles = (
+            pedidos_disponibles.select_related('cliente', 'farmacia', 'repartidor')
+            .prefetch_related('detalles__producto')
             .order_by('-fecha')
         )
+        paginator = PedidoCursorPagination()
+        page = paginator.paginate_queryset(pedidos_disponibles, request, view=self)
+        serializer = PedidoSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    def _cercanos(self, request, pedidos_disponibles):
+        coordenadas = geo.parse_coordenadas(
+            request.query_params.get('lat'), request.query_params.get('lng')
+        )
+        if coordenadas is None:
+            return Response(
+                {'detail': 'La ubicación enviada no es válida.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        lat, lng = coordenadas
+
+        try:
+            radio = float(request.query_params.get('radius', self.radio_default_km))
+        except (TypeError, ValueError):
+            radio = -1
+        if not 0 < radio <= self.radio_max_km:
+            return Response(
+                {'detail': f'El radio debe estar entre 0 y {self.radio_max_km} km.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Poda con el rectángulo (índice sobre tipo_usuario, latitud, longitud)
+        # y distancia exacta una sola vez por farmacia
+        lat_min, lat_max, lng_min, lng_max = geo.bounding_box(lat, lng, radio)
+        farmacias = User.objects.filter(
+            tipo_usuario='farmacia',
+            latitud__range=(lat_min, lat_max),
+            longitud__range=(lng_min, lng_max),
+        ).values_list('id', 'latitud', 'longitud')
+
+        distancias = {}
+        for farmacia_id, farmacia_lat, farmacia_lng in farmacias:
+            distancia = geo.haversine_km(lat, lng, farmacia_lat, farmacia_lng)
+            if distancia <= radio:
+                distancias[farmacia_id] = distancia
+
+        # Solo (distancia, id) de todos los candidatos; los pedidos completos,
+        # con sus detalles, se leen únicamente para la página
+        claves = [
+            (distancias[farmacia_id], pedido_id)
+            for pedido_id, farmacia_id in pedidos_disponibles.filter(
+                farmacia_id__in=list(distancias)
+            ).values_list('id', 'farmacia_id')
+        ]
+        paginator = DistanciaCursorPagination()
+        pagina = paginator.paginate_claves(claves, request)
+
+        encontrados = (
+            Pedido.objects.select_related('cliente', 'farmacia', 'repartidor')
+            .prefetch_related('detalles__producto')
+            .in_bulk([pedido_id for _, pedido_id in pagina])
+        )
+        pedidos = [encontrados[pedido_id] for _, pedido_id in pagina if pedido_id in encontrados]
 
-        serializer = PedidoSerializer(pedidos_disponibles, many=True, context={'request': request})
-        return Response(serializer.data)
+        data = PedidoSerializer(pedidos, many=True, context={'request': request}).data
+        for item, pedido in zip(data, pedidos):
+            item['distancia_km'] = round(distancias[pedido.farmacia_id], 2)
+        return paginator.get_paginated_response(data)
 
 
-class AceptarPedidoView(APIView):
+class AceptarPedidoView(IdempotenciaMixin, APIView):
     """
     Vista para que un repartidor acepte un pedido.
     Cuando se acepta, se asigna el repartidor al pedido y se cambia el estado a 'en_camino'
@@ -540,7 +941,8 @@ class AceptarPedidoView(APIView):
         # Asignar el repartidor al pedido y cambiar estado a 'en_camino'
         pedido.repartidor = request.user
         pedido.estado = 'en_camino'
-        pedido.save(update_fields=['repartidor', 'estado'])
+        pedido.save(update_fields=['repartidor', 'estado', 'fecha_actualizacion'])
+        eventos.notificar_cambio_pedido(pedido)
 
         # Eliminar cualquier registro de rechazo si existe (por si acaso)
         PedidoRechazado.objects.filter(pedido=pedido, repartidor=request.user).delete()
@@ -600,3 +1002,67 @@ class RechazarPedidoView(APIView):
             {'detail': 'Pedido rechazado. Ya no aparecerá en tu lista de pedidos disponibles.'},
             status=status.HTTP_200_OK
         )
+
+
+def _autenticar_stream(request):
+    """
+    Autentica la conexión SSE con el mismo JWT que el resto de la API.
+    EventSource no permite mandar headers en todos los clientes, así que
+    además del header Authorization se acepta ?token=<access>.
+    """
+    auth = JWTAuthentication()
+    try:
+        resultado = auth.authenticate(request)
+        if resultado is None:
+            raw_token = request.GET.get('token')
+            if not raw_token:
+                return None
+            validated = auth.get_validated_token(raw_token)
+            return auth.get_user(validated)
+        return resultado[0]
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+class PedidosStreamView(View):
+    """
+    Endpoint: /api/pedidos/stream/
+    Server-sent events con los cambios de los pedidos que el usuario puede ver.
+    Cada conexión es una corrutina esperando en su cola, por lo que hay que
+    servirlo con backend.asgi para que las conexiones ociosas no ocupen hilos.
+    """
+    heartbeat = 15
+
+    async def get(self, request):
+        user = await sync_to_async(_autenticar_stream)(request)
+        if user is None or not user.is_active:
+            return JsonResponse(
+                {'detail': 'Las credenciales de autenticación no se proveyeron o no son válidas.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        # Inicializa el backend configurado (ArchivoBackend arranca su lector)
+        await sync_to_async(eventos.get_backend)()
+        suscripcion = eventos.broker.suscribir(user)
+
+        response = StreamingHttpResponse(
+            self._eventos(suscripcion),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _eventos(self, suscripcion):
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                datos = {k: v for k, v in evento.items() if k not in ('tipo', 'destinatarios')}
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(datos)}\n\n"
+        finally:
+            eventos.broker.desuscribir(suscripcion)
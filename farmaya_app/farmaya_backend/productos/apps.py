@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate
+
+
+def _asegurar_indice_busqueda(using, **kwargs):
+    from django.db import connections
+
+    from .indice_fts import asegurar_indice
+    asegurar_indice(connections[using])
+
+
+def _producto_borrado(instance, **kwargs):
+    # Por señal para cubrir también los borrados en cascada y por queryset
+    from .autocompletado import autocompletado
+    if instance._sugerencia_original is not None:
+        autocompletado.registrar_cambio(instance._sugerencia_original, None)
 
 
 class ProductosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productos'
+
+    def ready(self):
+        # Los triggers del índice FTS se pierden si una migración recrea la tabla
+        post_migrate.connect(_asegurar_indice_busqueda, sender=self)
+        post_delete.connect(_producto_borrado, sender=self.get_model('Producto'))
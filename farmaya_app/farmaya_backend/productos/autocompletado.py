@@ -0,0 +1,187 @@
+"""
+Autocompletado de productos servido desde memoria.
+
+Cada proceso guarda las sugerencias ("Ibuprofeno 400 mg") en un arreglo
+ordenado de claves normalizadas y las busca por prefijo con bisect, sin
+consultar la base. La cantidad de productos que comparten una sugerencia (en
+general, cuántas farmacias la ofrecen) decide cuáles se muestran primero.
+
+Actualización:
+- Producto.save/delete aplican el cambio en el índice del proceso cuando
+  confirma la transacción y suben una versión compartida en el cache
+  settings.AUTOCOMPLETADO_CACHE.
+- Si otro proceso subió la versión, el índice se reconstruye en un hilo
+  aparte mientras se sigue respondiendo con el anterior.
+- Las escrituras masivas que no pasan por save (bulk_create, update) deben
+  llamar a invalidar().
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+CLAVE_VERSION = 'productos:autocompletado:version'
+MAX_COINCIDENCIAS = 2000
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def sugerencia(nombre, presentacion):
+    return ' '.join(f'{nombre or ""} {presentacion or ""}'.split())
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTOCOMPLETADO_CACHE', 'default')]
+
+
+def _version_compartida():
+    cache = _cache()
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+class IndicePrefijos:
+    """Arreglo ordenado de claves con el texto a mostrar y su cantidad de productos."""
+
+    def __init__(self, textos=()):
+        self._entradas = {}
+        for texto in textos:
+            self._sumar(texto, 1)
+        self._claves = sorted(self._entradas)
+        self._lock = threading.Lock()
+
+    def _sumar(self, texto, delta):
+        """Devuelve True si la clave apareció o desapareció del índice."""
+        clave = normalizar(texto)
+        if not clave:
+            return False
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            if delta <= 0:
+                return False
+            self._entradas[clave] = [texto, delta]
+            return True
+        entrada[1] += delta
+        if entrada[1] <= 0:
+            del self._entradas[clave]
+            return True
+        return False
+
+    def agregar(self, texto):
+        with self._lock:
+            if self._sumar(texto, 1):
+                insort(self._claves, normalizar(texto))
+
+    def quitar(self, texto):
+        with self._lock:
+            if self._sumar(texto, -1):
+                clave = normalizar(texto)
+                posicion = bisect_left(self._claves, clave)
+                if posicion < len(self._claves) and self._claves[posicion] == clave:
+                    del self._claves[posicion]
+
+    def sugerir(self, prefijo, limite=10):
+        prefijo = normalizar(prefijo)
+        if not prefijo:
+            return []
+        with self._lock:
+            posicion = bisect_left(self._claves, prefijo)
+            coincidencias = []
+            for clave in self._claves[posicion:posicion + MAX_COINCIDENCIAS]:
+                if not clave.startswith(prefijo):
+                    break
+                texto, cantidad = self._entradas[clave]
+                coincidencias.append((cantidad, clave, texto))
+        mejores = heapq.nsmallest(limite, coincidencias, key=lambda c: (-c[0], c[1]))
+        return [{'texto': texto, 'productos': cantidad} for cantidad, _, texto in mejores]
+
+    def __len__(self):
+        return len(self._claves)
+
+
+class Autocompletado:
+    """Índice del proceso con su versión y la reconstrucción en segundo plano."""
+
+    def __init__(self):
+        self._indice = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._reconstruyendo = False
+
+    def _construir(self):
+        from .models import Producto
+
+        version = _version_compartida()
+        filas = Producto.objects.values_list('nombre', 'presentacion').iterator(chunk_size=5000)
+        return IndicePrefijos(sugerencia(nombre, presentacion) for nombre, presentacion in filas), version
+
+    def _reconstruir(self):
+        try:
+            indice, version = self._construir()
+            with self._lock:
+                self._indice, self._version = indice, version
+        finally:
+            from django.db import close_old_connections
+            close_old_connections()
+            self._reconstruyendo = False
+
+    def indice(self):
+        """Índice vigente. Solo la primera llamada del proceso lee la base."""
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    self._indice, self._version = self._construir()
+        elif _version_compartida() != self._version and not self._reconstruyendo:
+            self._reconstruyendo = True
+            threading.Thread(target=self._reconstruir, name='autocompletado', daemon=True).start()
+        return self._indice
+
+    def sugerir(self, prefijo, limite=10):
+        return self.indice().sugerir(prefijo, limite)
+
+    def _aplicar(self, anterior, nueva):
+        """Aplica el cambio de un producto en este proceso y avisa a los demás."""
+        if self._indice is not None:
+            if anterior:
+                self._indice.quitar(anterior)
+            if nueva:
+                self._indice.agregar(nueva)
+        nueva_version = self._subir_version()
+        with self._lock:
+            # Si otro proceso también cambió algo, hay que reconstruir para verlo
+            if self._version is not None and nueva_version == self._version + 1:
+                self._version = nueva_version
+
+    def _subir_version(self):
+        cache = _cache()
+        try:
+            return cache.incr(CLAVE_VERSION)
+        except ValueError:
+            version = time.time_ns()
+            cache.set(CLAVE_VERSION, version, timeout=None)
+            return version
+
+    def registrar_cambio(self, anterior, nueva):
+        """Programa el cambio de sugerencia (anterior -> nueva) para cuando confirme la transacción."""
+        if anterior != nueva:
+            transaction.on_commit(lambda: self._aplicar(anterior, nueva))
+
+    def invalidar(self):
+        """Fuerza la reconstrucción en todos los procesos (tras escrituras masivas)."""
+        transaction.on_commit(self._subir_version)
+
+
+autocompletado = Autocompletado()
@@ -0,0 +1,94 @@
+"""
+Búsqueda de productos por texto sobre un índice FTS5 de SQLite.
+
+La tabla virtual productos_producto_fts indexa nombre, presentacion y
+descripcion de productos_producto (tabla de contenido externo: no duplica los
+textos). Tres triggers la mantienen sincronizada con cualquier escritura,
+incluidos bulk_create y .update(). El tokenizer unicode61 con
+remove_diacritics ignora acentos y mayúsculas ("ibuprofeno" encuentra
+"IBUPROFÉNO").
+
+La tabla y los triggers los crea la migración 0005 y los repone
+productos.indice_fts después de cada migrate. En motores que no son SQLite la
+búsqueda cae a un filtro icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import Producto
+
+
+TABLA = 'productos_producto'
+TABLA_FTS = 'productos_producto_fts'
+
+# Peso de cada columna en el ranking BM25: nombre, presentacion, descripcion
+PESOS = (10.0, 4.0, 1.0)
+
+
+def consulta_fts(texto):
+    """
+    Arma la expresión MATCH a partir del texto del usuario: cada palabra va
+    entre comillas (sin operadores FTS5) y busca por prefijo, así "ibupro 400"
+    encuentra "Ibuprofeno 400 mg". Devuelve None si no queda ninguna palabra.
+    """
+    palabras = re.findall(r'\w+', texto or '')
+    if not palabras:
+        return None
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar(texto, farmacia_id=None, con_stock=True, limite=20):
+    """
+    Productos que coinciden con el texto, ordenados por relevancia (BM25).
+    con_stock deja solo los que tienen stock disponible (sin contar reservas).
+    """
+    if connection.vendor != 'sqlite':
+        return _buscar_sin_fts(texto, farmacia_id, con_stock, limite)
+
+    consulta = consulta_fts(texto)
+    if consulta is None:
+        return []
+
+    filtros = [f'{TABLA_FTS} MATCH %s']
+    params = [consulta]
+    if con_stock:
+        filtros.append('p.stock > p.stock_reservado')
+    if farmacia_id is not None:
+        filtros.append('p.farmacia_id = %s')
+        params.append(farmacia_id)
+    params.append(limite)
+
+    pesos = ', '.join(str(peso) for peso in PESOS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT p.id FROM {TABLA_FTS}
+            JOIN {TABLA} p ON p.id = {TABLA_FTS}.rowid
+            WHERE {' AND '.join(filtros)}
+            ORDER BY bm25({TABLA_FTS}, {pesos})
+            LIMIT %s
+            """,
+            params,
+        )
+        ids = [fila[0] for fila in cursor.fetchall()]
+
+    productos = Producto.objects.select_related('farmacia').in_bulk(ids)
+    return [productos[pk] for pk in ids if pk in productos]
+
+
+def _buscar_sin_fts(texto, farmacia_id, con_stock, limite):
+    palabras = re.findall(r'\w+', texto or '')
+    if not palabras:
+        return []
+    productos = Producto.objects.select_related('farmacia')
+    for palabra in palabras:
+        productos = productos.filter(
+            Q(nombre__icontains=palabra) | Q(presentacion__icontains=palabra)
+        )
+    if con_stock:
+        productos = productos.filter(stock__gt=F('stock_reservado'))
+    if farmacia_id is not None:
+        productos = productos.filter(farmacia_id=farmacia_id)
+    return list(productos.order_by('nombre', 'id')[:limite])
@@ -0,0 +1,288 @@
+"""
+Importación masiva del catálogo de una farmacia desde CSV o NDJSON.
+
+Las filas se leen de a una desde el stream (cuerpo del request o archivo) y
+se procesan en lotes: por lote hay una consulta para encontrar los productos
+existentes y dos executemany (UPDATE e INSERT parametrizados) dentro de una
+transacción, así la memoria no crece con el tamaño del archivo y no se arma un
+modelo por fila. La clave natural es
+farmacia + nombre + presentacion: si ya existe se actualiza, si no se crea.
+La base la garantiza con una restricción única y el INSERT es un upsert
+(ON CONFLICT ... DO UPDATE): si otra importación o un alta manual crea el
+producto entre la consulta y la escritura, la fila lo actualiza en vez de
+duplicarlo (y se cuenta como creada).
+
+Columnas: nombre, presentacion, precio, stock (opcional), descripcion
+(opcional), requiere_receta (opcional: 1/0, true/false, si/no). Las columnas
+opcionales que no vienen en la fila (o que vienen vacías, salvo descripcion)
+no se tocan en los productos existentes; los valores por defecto solo se usan
+para los productos nuevos.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from .autocompletado import autocompletado
+from .models import Producto
+
+
+FORMATOS = ('csv', 'ndjson')
+CAMPOS_ACTUALIZABLES = ['descripcion', 'precio', 'stock', 'requiere_receta']
+# Valores de las columnas opcionales para los productos nuevos que no las traen
+POR_DEFECTO = {'descripcion': '', 'stock': 0, 'requiere_receta': False}
+MAX_ERRORES = 1000
+VERDADEROS = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+FALSOS = {'0', 'false', 'no'}
+
+
+class FormatoInvalido(Exception):
+    pass
+
+
+def _lineas(stream):
+    """Líneas de texto de un stream binario, leídas de a una."""
+    for linea in iter(stream.readline, b''):
+        yield linea.decode('utf-8-sig' if linea.startswith(b'\xef\xbb\xbf') else 'utf-8')
+
+
+def leer_filas(stream, formato):
+    """Genera (número de fila, dict) desde un stream binario en CSV o NDJSON."""
+    if formato not in FORMATOS:
+        raise FormatoInvalido(f'Formato no soportado: {formato}. Usá csv o ndjson.')
+
+    if formato == 'csv':
+        for numero, fila in enumerate(csv.DictReader(_lineas(stream)), start=1):
+            yield numero, fila
+        return
+
+    for numero, linea in enumerate(_lineas(stream), start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            yield numero, None
+            continue
+        yield numero, fila if isinstance(fila, dict) else None
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def validar_fila(fila):
+    """
+    Devuelve (datos limpios, None) o (None, errores por campo). Las columnas
+    opcionales ausentes no aparecen en los datos.
+    """
+    if fila is None:
+        return None, {'fila': 'No es un objeto JSON válido.'}
+
+    errores = {}
+    datos = {
+        'nombre': _texto(fila, 'nombre'),
+        'presentacion': _texto(fila, 'presentacion'),
+    }
+    if fila.get('descripcion') is not None:
+        datos['descripcion'] = _texto(fila, 'descripcion')
+    if not datos['nombre']:
+        errores['nombre'] = 'Es obligatorio.'
+    elif len(datos['nombre']) > Producto._meta.get_field('nombre').max_length:
+        errores['nombre'] = 'Es demasiado largo.'
+    if not datos['presentacion']:
+        errores['presentacion'] = 'Es obligatoria.'
+    elif len(datos['presentacion']) > Producto._meta.get_field('presentacion').max_length:
+        errores['presentacion'] = 'Es demasiado larga.'
+
+    try:
+        datos['precio'] = Decimal(_texto(fila, 'precio'))
+        if not datos['precio'].is_finite() or datos['precio'] < 0 or datos['precio'] >= Decimal('1000000'):
+            raise InvalidOperation
+        datos['precio'] = datos['precio'].quantize(Decimal('0.01'))
+    except InvalidOperation:
+        errores['precio'] = 'Debe ser un número entre 0 y 999999.99.'
+
+    if _texto(fila, 'stock'):
+        try:
+            datos['stock'] = int(_texto(fila, 'stock'))
+            if datos['stock'] < 0:
+                raise ValueError
+        except ValueError:
+            errores['stock'] = 'Debe ser un entero mayor o igual a 0.'
+
+    receta = _texto(fila, 'requiere_receta').lower()
+    if receta in VERDADEROS:
+        datos['requiere_receta'] = True
+    elif receta in FALSOS:
+        datos['requiere_receta'] = False
+    elif receta:
+        errores['requiere_receta'] = 'Debe ser si/no, true/false o 1/0.'
+
+    return (None, errores) if errores else (datos, None)
+
+
+class Resumen:
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        self.con_error = 0
+        self.errores = []
+
+    def error(self, numero, errores):
+        self.con_error += 1
+        # Se informan las primeras MAX_ERRORES filas con error; el resto solo se cuenta
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'fila': numero, 'errores': errores})
+
+    def como_dict(self):
+        return {
+            'creados': self.creados,
+            'actualizados': self.actualizados,
+            'con_error': self.con_error,
+            'errores': self.errores,
+        }
+
+
+def _sql_escritura(campos):
+    """
+    Upsert y UPDATE parametrizados para executemany (sin armar un modelo por
+    fila), que escriben solo los campos que traen las filas. El INSERT lleva
+    todas las columnas; el DO UPDATE y el UPDATE, solo esos campos.
+    bulk_create(update_conflicts=True) no admite la condición sobre
+    stock_reservado del DO UPDATE, por eso se arma a mano como el UPDATE.
+    """
+    q = connection.ops.quote_name
+    tabla = q(Producto._meta.db_table)
+    clave = ['farmacia_id', 'nombre', 'presentacion']
+    columnas = [*clave, *CAMPOS_ACTUALIZABLES, 'stock_reservado']
+    insert = (
+        f"INSERT INTO {tabla} ({', '.join(q(c) for c in columnas)}) "
+        f"VALUES ({', '.join(['%s'] * len(columnas))}) "
+        f"ON CONFLICT ({', '.join(q(c) for c in clave)}) DO UPDATE SET "
+        f"{', '.join(f'{q(c)} = excluded.{q(c)}' for c in campos)}"
+    )
+    update = (
+        f"UPDATE {tabla} SET {', '.join(f'{q(c)} = %s' for c in campos)} "
+        f"WHERE {q('id')} = %s"
+    )
+    if 'stock' in campos:
+        # La condición sobre stock_reservado evita romper el CHECK si entró una reserva mientras tanto
+        insert += f" WHERE excluded.{q('stock')} >= {tabla}.{q('stock_reservado')}"
+        update += f" AND {q('stock_reservado')} <= %s"
+    return insert, update
+
+
+def _procesar_lote(farmacia, lote, resumen):
+    # Si una clave se repite en el lote, gana la última fila
+    por_clave = {}
+    for numero, datos in lote:
+        por_clave[(datos['nombre'], datos['presentacion'])] = (numero, datos)
+
+    existentes = {}
+    candidatos = (
+        Producto.objects.filter(farmacia=farmacia, nombre__in={nombre for nombre, _ in por_clave})
+        .order_by('id')
+        .values_list('nombre', 'presentacion', 'id', 'stock_reservado')
+    )
+    for nombre, presentacion, pk, reservado in candidatos:
+        existentes.setdefault((nombre, presentacion), (pk, reservado))
+
+    # Las filas se agrupan por los campos que traen: cada grupo tiene su UPDATE y su upsert
+    grupos = {}
+    for clave, (numero, datos) in por_clave.items():
+        campos = tuple(campo for campo in CAMPOS_ACTUALIZABLES if campo in datos)
+        nuevos, actualizados = grupos.setdefault(campos, ([], []))
+        existente = existentes.get(clave)
+        if existente is None:
+            valores = [datos.get(campo, POR_DEFECTO.get(campo)) for campo in CAMPOS_ACTUALIZABLES]
+            nuevos.append((numero, datos, [farmacia.pk, datos['nombre'], datos['presentacion'], *valores, 0]))
+            continue
+        pk, reservado = existente
+        if 'stock' in datos and datos['stock'] < reservado:
+            resumen.error(numero, {
+                'stock': f'Hay {reservado} unidades reservadas; el stock no puede ser menor.'
+            })
+            continue
+        parametros = [*(datos[campo] for campo in campos), pk]
+        if 'stock' in datos:
+            parametros.append(datos['stock'])
+        actualizados.append((numero, pk, datos, parametros))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for campos, (nuevos, actualizados) in grupos.items():
+            insert, update = _sql_escritura(campos)
+            if actualizados:
+                cursor.executemany(update, [parametros for *_, parametros in actualizados])
+                if 'stock' in campos and cursor.rowcount < len(actualizados):
+                    actualizados = _descartar_reservados(actualizados, resumen)
+            if nuevos:
+                cursor.executemany(insert, [parametros for *_, parametros in nuevos])
+                if 'stock' in campos and cursor.rowcount < len(nuevos):
+                    # Chocaron con un producto creado mientras tanto que ya tiene reservas
+                    nuevos = _descartar_reservados_nuevos(farmacia, nuevos, resumen)
+            resumen.creados += len(nuevos)
+            resumen.actualizados += len(actualizados)
+
+
+def _descartar_reservados(actualizados, resumen):
+    """Marca con error las filas que no se aplicaron porque su stock quedó debajo de lo reservado."""
+    reservados = dict(
+        Producto.objects.filter(pk__in=[pk for _, pk, _, _ in actualizados]).values_list('id', 'stock_reservado')
+    )
+    aplicados = []
+    for numero, pk, datos, parametros in actualizados:
+        if datos['stock'] < reservados.get(pk, 0):
+            resumen.error(numero, {
+                'stock': f'Hay {reservados[pk]} unidades reservadas; el stock no puede ser menor.'
+            })
+        else:
+            aplicados.append((numero, pk, datos, parametros))
+    return aplicados
+
+
+def _descartar_reservados_nuevos(farmacia, nuevos, resumen):
+    """Como _descartar_reservados, para los upserts que terminaron en un UPDATE que no se aplicó."""
+    reservados = {
+        (nombre, presentacion): reservado
+        for nombre, presentacion, reservado in Producto.objects.filter(
+            farmacia=farmacia, nombre__in={datos['nombre'] for _, datos, _ in nuevos}
+        ).values_list('nombre', 'presentacion', 'stock_reservado')
+    }
+    aplicados = []
+    for numero, datos, parametros in nuevos:
+        reservado = reservados.get((datos['nombre'], datos['presentacion']), 0)
+        if datos['stock'] < reservado:
+            resumen.error(numero, {
+                'stock': f'Hay {reservado} unidades reservadas; el stock no puede ser menor.'
+            })
+        else:
+            aplicados.append((numero, datos, parametros))
+    return aplicados
+
+
+def importar(farmacia, filas, lote=1000):
+    """
+    Carga las filas ((número, dict) de leer_filas) en el catálogo de la
+    farmacia. Las filas inválidas se saltean y quedan en el resumen.
+    """
+    resumen = Resumen()
+    pendientes = []
+    for numero, fila in filas:
+        datos, errores = validar_fila(fila)
+        if errores:
+            resumen.error(numero, errores)
+            continue
+        pendientes.append((numero, datos))
+        if len(pendientes) >= lote:
+            _procesar_lote(farmacia, pendientes, resumen)
+            pendientes = []
+    if pendientes:
+        _procesar_lote(farmacia, pendientes, resumen)
+
+    if resumen.creados:
+        # Las filas nuevas no pasan por Producto.save: el autocompletado se reconstruye
+        autocompletado.invalidar()
+    return resumen
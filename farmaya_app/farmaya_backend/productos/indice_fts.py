@@ -0,0 +1,62 @@
+"""
+Mantenimiento del índice FTS5 de la búsqueda (ver productos.busqueda).
+
+La migración 0005 crea la tabla virtual y sus triggers. Si la tabla de
+productos se recrea (SQLite lo hace en algunos ALTER de las migraciones) los
+triggers se pierden con ella; por eso asegurar_indice() se ejecuta después de
+cada migrate y reconstruye el índice si faltaba algo.
+"""
+from django.db import connection
+
+from .busqueda import TABLA, TABLA_FTS
+
+
+_SQL_INDICE = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        nombre, presentacion, descripcion,
+        content='{TABLA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, nombre, presentacion, descripcion)
+        VALUES (new.id, new.nombre, new.presentacion, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, presentacion, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.presentacion, old.descripcion);
+    END
+    """,
+    # Solo cuando cambian los textos: los movimientos de stock no tocan el índice
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au
+    AFTER UPDATE OF nombre, presentacion, descripcion ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, presentacion, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.presentacion, old.descripcion);
+        INSERT INTO {TABLA_FTS}(rowid, nombre, presentacion, descripcion)
+        VALUES (new.id, new.nombre, new.presentacion, new.descripcion);
+    END
+    """,
+]
+
+
+def asegurar_indice(using_connection=None):
+    """Crea la tabla FTS y sus triggers si faltan; si faltaba algo, reconstruye el índice."""
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [TABLA_FTS, f'{TABLA_FTS}_ai', f'{TABLA_FTS}_ad', f'{TABLA_FTS}_au'],
+        )
+        if cursor.fetchone()[0] == 4:
+            return
+        for sql in _SQL_INDICE:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
@@ -0,0 +1,43 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.importacion import FORMATOS, FormatoInvalido, importar, leer_filas
+
+
+class Command(BaseCommand):
+    help = 'Importa (crea o actualiza) el catálogo de una farmacia desde un archivo CSV o NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('farmacia', help='ID o email de la farmacia.')
+        parser.add_argument('archivo', help='Ruta del archivo, o - para leer de la entrada estándar.')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas escritas por transacción.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        farmacia_param = options['farmacia']
+        filtro = {'pk': farmacia_param} if farmacia_param.isdigit() else {'email': farmacia_param}
+        try:
+            farmacia = User.objects.get(tipo_usuario='farmacia', **filtro)
+        except User.DoesNotExist:
+            raise CommandError(f'No existe la farmacia {farmacia_param}.')
+
+        archivo = options['archivo']
+        formato = options['formato'] or ('ndjson' if archivo.endswith(('.ndjson', '.jsonl')) else 'csv')
+        stream = sys.stdin.buffer if archivo == '-' else open(archivo, 'rb')
+        try:
+            resumen = importar(farmacia, leer_filas(stream, formato), lote=options['lote'])
+        except FormatoInvalido as error:
+            raise CommandError(str(error))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in resumen.errores:
+            self.stderr.write(f"Fila {error['fila']}: {error['errores']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Creados: {resumen.creados}, actualizados: {resumen.actualizados}, '
+            f'con error: {resumen.con_error}'
+        ))
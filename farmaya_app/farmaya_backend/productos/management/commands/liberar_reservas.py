@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from productos.stock import liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock vencidas (pensado para correr periódicamente, p. ej. desde cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Reservas procesadas por transacción.')
+
+    def handle(self, *args, **options):
+        liberadas = liberar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Reservas liberadas: {liberadas}'))
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+# SQL fijo de esta migración: no depende de productos.indice_fts, que puede cambiar
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS productos_producto_fts USING fts5(
+                    nombre, presentacion, descripcion,
+                    content='productos_producto', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS productos_producto_fts_ai AFTER INSERT ON productos_producto BEGIN
+                    INSERT INTO productos_producto_fts(rowid, nombre, presentacion, descripcion)
+                    VALUES (new.id, new.nombre, new.presentacion, new.descripcion);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS productos_producto_fts_ad AFTER DELETE ON productos_producto BEGIN
+                    INSERT INTO productos_producto_fts(productos_producto_fts, rowid, nombre, presentacion, descripcion)
+                    VALUES ('delete', old.id, old.nombre, old.presentacion, old.descripcion);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS productos_producto_fts_au
+                AFTER UPDATE OF nombre, presentacion, descripcion ON productos_producto BEGIN
+                    INSERT INTO productos_producto_fts(productos_producto_fts, rowid, nombre, presentacion, descripcion)
+                    VALUES ('delete', old.id, old.nombre, old.presentacion, old.descripcion);
+                    INSERT INTO productos_producto_fts(rowid, nombre, presentacion, descripcion)
+                    VALUES (new.id, new.nombre, new.presentacion, new.descripcion);
+                END
+                """,
+                "INSERT INTO productos_producto_fts(productos_producto_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS productos_producto_fts_ai',
+                'DROP TRIGGER IF EXISTS productos_producto_fts_ad',
+                'DROP TRIGGER IF EXISTS productos_producto_fts_au',
+                'DROP TABLE IF EXISTS productos_producto_fts',
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def renombrar_duplicados(apps, schema_editor):
+    """
+    Antes de la restricción puede haber productos repetidos (importaciones
+    concurrentes). El de menor id conserva la clave, que es el que ya
+    actualizaba la importación; a los demás se les agrega #id a la
+    presentación para que la farmacia los revise.
+    """
+    Producto = apps.get_model('productos', 'Producto')
+    largo = Producto._meta.get_field('presentacion').max_length
+    claves = (
+        Producto.objects.values('farmacia_id', 'nombre', 'presentacion')
+        .annotate(cantidad=models.Count('id'))
+        .filter(cantidad__gt=1)
+    )
+    for clave in claves:
+        repetidos = Producto.objects.filter(
+            farmacia_id=clave['farmacia_id'], nombre=clave['nombre'], presentacion=clave['presentacion'],
+        ).order_by('id')[1:]
+        for producto in repetidos:
+            sufijo = f' #{producto.id}'
+            producto.presentacion = producto.presentacion[:largo - len(sufijo)] + sufijo
+            producto.save(update_fields=['presentacion'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_producto_indices_catalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(renombrar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(
+                fields=('farmacia', 'nombre', 'presentacion'),
+                name='producto_farmacia_nombre_presentacion_uniq',
+            ),
+        ),
+    ]
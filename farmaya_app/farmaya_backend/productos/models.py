@@ -1,6 +1,8 @@
 from django.db import models
 from accounts.models import User
 
+from . import autocompletado
+
 
 class Producto(models.Model):
     farmacia = models.ForeignKey(
@@ -13,7 +15,75 @@ class Producto(models.Model):
     descripcion = models.TextField(blank=True)
     precio = models.DecimalField(max_digits=8, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Unidades de stock retenidas por reservas vigentes (ver ReservaStock)
+    stock_reservado = models.PositiveIntegerField(default=0)
     requiere_receta = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            # Red de seguridad a nivel base para los descuentos de stock concurrentes
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='producto_stock_no_negativo'),
+            models.CheckConstraint(
+                condition=models.Q(stock_reservado__lte=models.F('stock')),
+                name='producto_reservado_lte_stock',
+            ),
+            # Clave natural del catálogo: la importación masiva hace upsert sobre ella
+            models.UniqueConstraint(
+                fields=['farmacia', 'nombre', 'presentacion'],
+                name='producto_farmacia_nombre_presentacion_uniq',
+            ),
+        ]
+        indexes = [
+            # Orden de la paginación por cursor (ver productos.pagination)
+            models.Index(fields=['farmacia', 'nombre', 'id'], name='producto_farmacia_nombre_idx'),
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sugerencia de autocompletado tal como se leyó de la base
+        self._sugerencia_original = self._sugerencia()
+
+    def _sugerencia(self):
+        # Desde __dict__ para no consultar la base si los campos están diferidos
+        if 'nombre' not in self.__dict__ or 'presentacion' not in self.__dict__:
+            return None
+        return autocompletado.sugerencia(self.nombre, self.presentacion)
+
+    def save(self, *args, **kwargs):
+        anterior = None if self._state.adding else self._sugerencia_original
+        super().save(*args, **kwargs)
+        nueva = self._sugerencia()
+        if nueva is not None:
+            autocompletado.autocompletado.registrar_cambio(anterior, nueva)
+            self._sugerencia_original = nueva
+
+    @property
+    def stock_disponible(self):
+        return self.stock - self.stock_reservado
+
     def __str__(self):
         return f"{self.nombre} ({self.presentacion}) - {self.farmacia.nombre}"
+
+
+class ReservaStock(models.Model):
+    """
+    Unidades retenidas para un cliente mientras arma el pedido.
+    Mientras está vigente, la cantidad se descuenta del stock disponible
+    de otros clientes; al vencer vuelve sola (ver productos.stock).
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_stock')
+    cantidad = models.PositiveIntegerField()
+    vence = models.DateTimeField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vence'], name='reserva_vence_idx'),
+            models.Index(fields=['producto', 'vence'], name='reserva_producto_vence_idx'),
+            models.Index(fields=['usuario', 'producto'], name='reserva_usuario_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} x{self.cantidad} para {self.usuario.email}"
@@ -0,0 +1,64 @@
+import base64
+import json
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProductoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para los catálogos de productos, en orden
+    alfabético. El cursor es el (nombre, id) del último producto entregado y
+    la página siguiente es nombre > n OR (nombre = n AND id > i), que se
+    resuelve con los índices (farmacia, nombre, id) y (nombre, id): cada
+    página cuesta lo mismo en un catálogo de 20 o de 20.000 productos, y
+    renombrar un producto entre dos páginas no hace saltear ni repetir otros.
+
+    El CursorPagination de DRF ubica la posición solo por el primer campo del
+    orden y desempata los nombres repetidos con un offset, por eso se
+    reemplaza paginate_queryset. Solo se avanza: previous es siempre None.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('nombre', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        posicion = self._decodificar(request.query_params.get(self.cursor_query_param))
+
+        # Con ?fields= el nombre puede venir diferido; la anotación lo trae siempre
+        queryset = queryset.annotate(_cursor_nombre=F('nombre')).order_by(*self.ordering)
+        if posicion is not None:
+            nombre, pk = posicion
+            queryset = queryset.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, pk__gt=pk))
+
+        resultados = list(queryset[:self.page_size + 1])
+        self.ultimo = None
+        if len(resultados) > self.page_size:
+            resultados = resultados[:self.page_size]
+            self.ultimo = (resultados[-1]._cursor_nombre, resultados[-1].pk)
+        return resultados
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            nombre, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return str(nombre), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.ultimo is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(self.ultimo).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        return None
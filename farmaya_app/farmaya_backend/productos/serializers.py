@@ -1,7 +1,109 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Producto
+from . import stock
+from .models import Producto, ReservaStock
+
+
+def campos_pedidos(request):
+    """Conjunto de campos de ?fields=a,b,c en una lectura, o None si no se pidió."""
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {campo.strip() for campo in fields.split(',') if campo.strip()}
+
+
+def diferir_no_pedidos(queryset, request, campos=('descripcion',)):
+    """No carga de la base los campos pesados que el cliente no pidió."""
+    pedidos = campos_pedidos(request)
+    if pedidos is None:
+        return queryset
+    omitidos = [campo for campo in campos if campo not in pedidos]
+    return queryset.defer(*omitidos) if omitidos else queryset
+
+
+class CamposParcialesMixin:
+    """
+    Permite pedir un subconjunto de campos con ?fields=id,nombre,precio en
+    las lecturas. Los nombres desconocidos se ignoran.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pedidos = campos_pedidos(self.context.get('request'))
+        if pedidos is not None:
+            for campo in set(self.fields) - pedidos:
+                self.fields.pop(campo)
+
+
+class ClaveNaturalMixin:
+    """
+    Para los serializers de Producto: farmacia + nombre + presentacion es
+    única en la base. La farmacia la pone la vista en save(), así que el
+    choque se detecta al guardar y se informa como error de validación.
+    """
+
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            if not self._clave_repetida(kwargs):
+                raise
+            raise serializers.ValidationError(
+                {'presentacion': ['La farmacia ya tiene un producto con ese nombre y presentación.']}
+            )
+
+    def _clave_repetida(self, kwargs):
+        actual = self.instance
+        farmacia = kwargs.get('farmacia')
+        farmacia_id = kwargs.get('farmacia_id') or getattr(farmacia, 'pk', farmacia)
+        clave = {
+            'farmacia_id': farmacia_id or getattr(actual, 'farmacia_id', None),
+            'nombre': self.validated_data.get('nombre', getattr(actual, 'nombre', None)),
+            'presentacion': self.validated_data.get('presentacion', getattr(actual, 'presentacion', None)),
+        }
+        repetidos = Producto.objects.filter(**clave)
+        if actual is not None:
+            repetidos = repetidos.exclude(pk=actual.pk)
+        return repetidos.exists()
+
+
+class EdicionProductoMixin:
+    """
+    Para los serializers de Producto: la edición escribe solo los campos
+    enviados. Un save() de la fila entera pisaría stock y stock_reservado con
+    los valores leídos, pero las reservas y los pedidos los cambian mientras
+    tanto. El stock se valida contra lo reservado al leer, se fija con un
+    UPDATE que lo vuelve a exigir y stock_reservado no se escribe nunca desde
+    acá.
+    """
+
+    def validate_stock(self, value):
+        if self.instance is not None and value < self.instance.stock_reservado:
+            raise serializers.ValidationError(
+                f'Hay {self.instance.stock_reservado} unidades reservadas por clientes; el stock no puede ser menor.'
+            )
+        return value
+
+    def update(self, instance, validated_data):
+        nuevo_stock = validated_data.pop('stock', None)
+        if nuevo_stock is not None:
+            try:
+                stock.fijar(instance, nuevo_stock)
+            except stock.AjusteInvalido as exc:
+                raise serializers.ValidationError({'stock': [exc.errores[0]['detalle']]}) from exc
+        for campo, valor in validated_data.items():
+            setattr(instance, campo, valor)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class ProductoSerializer(EdicionProductoMixin, ClaveNaturalMixin, CamposParcialesMixin, serializers.ModelSerializer):
+    stock_disponible = serializers.IntegerField(read_only=True)
 
-class ProductoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Producto
         fields = [
@@ -12,6 +114,29 @@ class ProductoSerializer(serializers.ModelSerializer):
             'descripcion',
             'precio',
             'stock',
+            'stock_disponible',
             'requiere_receta',
         ]
         read_only_fields = ['id', 'farmacia']
+
+
+class ReservaStockSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+
+    class Meta:
+        model = ReservaStock
+        fields = ['id', 'producto', 'producto_nombre', 'cantidad', 'vence']
+        read_only_fields = fields
+
+
+class AjusteStockSerializer(serializers.Serializer):
+    # Límites para que ningún valor (ni la suma de un lote) desborde los enteros de la base
+    MAX_DELTA = 1_000_000
+
+    producto_id = serializers.IntegerField(min_value=1, max_value=2**63 - 1)
+    delta = serializers.IntegerField(min_value=-MAX_DELTA, max_value=MAX_DELTA)
+
+    def validate_delta(self, value):
+        if value == 0:
+            raise serializers.ValidationError('El ajuste no puede ser 0.')
+        return value
@@ -0,0 +1,300 @@
+"""
+Operaciones de stock sobre Producto.
+
+El stock se divide en reservado (unidades retenidas por ReservaStock vigentes)
+y disponible (stock - stock_reservado). Las operaciones de pedidos y
+reservas actualizan varios productos con un único UPDATE ... CASE y
+condicionan la fila a que alcance el disponible, así dos operaciones
+concurrentes no pueden vender ni reservar la misma unidad. El ajuste masivo
+del POS (ajustar, un UPDATE ... CASE por lote) y la edición del stock desde el
+catálogo (fijar) usan la misma condición.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto, solicitado, disponible):
+        self.producto = producto
+        self.solicitado = solicitado
+        self.disponible = disponible
+        super().__init__(
+            f'No hay stock suficiente de "{producto.nombre}". '
+            f'Stock disponible: {disponible}, solicitado: {solicitado}.'
+        )
+
+
+class ReservaExcedida(Exception):
+    """La reserva supera el máximo por producto o el total vigente por usuario."""
+
+
+class AjusteInvalido(Exception):
+    """Ajuste de stock que no se puede aplicar; errores es una lista por producto."""
+
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__('No se pudo aplicar el ajuste de stock.')
+
+
+def _case(campo, deltas):
+    """CASE que suma deltas[pk] al campo de cada producto."""
+    return Case(
+        *[When(pk=pk, then=F(campo) + delta) for pk, delta in deltas.items()],
+        default=F(campo),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _reservado_por(usuario, productos_ids):
+    """
+    Reservas vigentes del usuario sobre esos productos: ({producto_id:
+    unidades}, ids de las reservas). Solo esas filas se pueden borrar al
+    consumirlas; las vencidas las libera liberar_vencidas, que además
+    descuenta sus unidades de stock_reservado.
+    """
+    if usuario is None:
+        return {}, []
+    filas = (
+        ReservaStock.objects.select_for_update()
+        .filter(usuario=usuario, producto_id__in=productos_ids, vence__gt=timezone.now())
+        .values_list('id', 'producto_id', 'cantidad')
+    )
+    totales, ids = {}, []
+    for reserva_id, producto_id, cantidad in filas:
+        totales[producto_id] = totales.get(producto_id, 0) + cantidad
+        ids.append(reserva_id)
+    return totales, ids
+
+
+def _condicion_disponible(cantidades, propias):
+    """Q que exige, por producto, disponible + lo reservado por el usuario >= cantidad."""
+    condicion = Q()
+    for pk, cantidad in cantidades.items():
+        condicion |= Q(pk=pk, stock__gte=F('stock_reservado') + cantidad - propias.get(pk, 0))
+    return condicion
+
+
+def _faltante(cantidades, propias):
+    """Error para el primer producto que no alcanza (o el primero, si el stock se movió entre consultas)."""
+    disponibles = Producto.objects.filter(pk__in=cantidades).annotate(
+        disponible=F('stock') - F('stock_reservado')
+    ).in_bulk()
+    errores = []
+    for pk, cantidad in cantidades.items():
+        producto = disponibles.get(pk)
+        if producto is None:
+            continue
+        disponible = producto.disponible + propias.get(pk, 0)
+        errores.append((disponible >= cantidad, StockInsuficiente(producto, cantidad, disponible)))
+    errores.sort(key=lambda error: error[0])
+    return errores[0][1]
+
+
+def liberar_vencidas(productos_ids=None, lote=500):
+    """
+    Borra las reservas vencidas y devuelve sus unidades al disponible.
+    Trabaja en lotes chicos, cada uno en su propia transacción, para no
+    retener el lock de escritura. Devuelve la cantidad de reservas liberadas.
+    """
+    liberadas = 0
+    ahora = timezone.now()
+    while True:
+        vencidas = ReservaStock.objects.filter(vence__lte=ahora)
+        if productos_ids is not None:
+            vencidas = vencidas.filter(producto_id__in=productos_ids)
+        ids = list(vencidas.order_by('vence').values_list('id', flat=True)[:lote])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            filas = list(
+                ReservaStock.objects.select_for_update()
+                .filter(id__in=ids)
+                .values_list('id', 'producto_id', 'cantidad')
+            )
+            deltas = {}
+            for _, producto_id, cantidad in filas:
+                deltas[producto_id] = deltas.get(producto_id, 0) - cantidad
+            if filas:
+                Producto.objects.filter(pk__in=deltas).update(
+                    stock_reservado=_case('stock_reservado', deltas)
+                )
+                ReservaStock.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+        liberadas += len(filas)
+
+        if len(ids) < lote:
+            break
+    return liberadas
+
+
+def _controlar_limites(usuario, cantidades, propias):
+    """
+    Una reserva retiene stock para todos los demás clientes: se limita por
+    producto (RESERVA_STOCK_MAX_POR_PRODUCTO) y por la suma de las reservas
+    vigentes del usuario (RESERVA_STOCK_MAX_POR_USUARIO).
+    """
+    por_producto = getattr(settings, 'RESERVA_STOCK_MAX_POR_PRODUCTO', 50)
+    por_usuario = getattr(settings, 'RESERVA_STOCK_MAX_POR_USUARIO', 200)
+    if any(cantidad > por_producto for cantidad in cantidades.values()):
+        raise ReservaExcedida(f'No se pueden reservar más de {por_producto} unidades de un producto.')
+    vigentes = (
+        ReservaStock.objects.filter(usuario=usuario, vence__gt=timezone.now())
+        .aggregate(total=Sum('cantidad'))['total'] or 0
+    )
+    # Las reservas propias sobre estos productos se reemplazan
+    if vigentes - sum(propias.values()) + sum(cantidades.values()) > por_usuario:
+        raise ReservaExcedida(f'No se pueden tener más de {por_usuario} unidades reservadas en total.')
+
+
+def reservar(usuario, cantidades, minutos=None):
+    """
+    Reserva cantidades ({producto_id: unidades}) para el usuario.
+    Reemplaza las reservas previas del usuario sobre esos productos.
+    Lanza ReservaExcedida si supera los límites y StockInsuficiente si algún
+    producto no alcanza.
+    """
+    minutos = minutos or getattr(settings, 'RESERVA_STOCK_MINUTOS', 15)
+    liberar_vencidas(productos_ids=list(cantidades))
+
+    with transaction.atomic():
+        propias, reservas_ids = _reservado_por(usuario, list(cantidades))
+        _controlar_limites(usuario, cantidades, propias)
+        deltas = {pk: cantidad - propias.get(pk, 0) for pk, cantidad in cantidades.items()}
+
+        actualizados = (
+            Producto.objects.filter(_condicion_disponible(cantidades, propias))
+            .update(stock_reservado=_case('stock_reservado', deltas))
+        )
+        if actualizados != len(cantidades):
+            raise _faltante(cantidades, propias)
+
+        ReservaStock.objects.filter(id__in=reservas_ids).delete()
+        vence = timezone.now() + timedelta(minutes=minutos)
+        return ReservaStock.objects.bulk_create([
+            ReservaStock(producto_id=pk, usuario=usuario, cantidad=cantidad, vence=vence)
+            for pk, cantidad in cantidades.items()
+        ])
+
+
+def liberar(reserva):
+    """Cancela una reserva vigente y devuelve sus unidades al disponible."""
+    with transaction.atomic():
+        borradas, _ = ReservaStock.objects.filter(pk=reserva.pk).delete()
+        if borradas:
+            Producto.objects.filter(pk=reserva.producto_id).update(
+                stock_reservado=F('stock_reservado') - reserva.cantidad
+            )
+
+
+def descontar(cantidades, usuario=None):
+    """
+    Descuenta del stock las cantidades vendidas ({producto_id: unidades}),
+    consumiendo primero las reservas vigentes del usuario sobre esos productos.
+    Debe llamarse dentro de la transacción del pedido: si algún producto no
+    alcanza lanza StockInsuficiente y la transacción tiene que revertirse.
+    """
+    liberar_vencidas(productos_ids=list(cantidades))
+    propias, reservas_ids = _reservado_por(usuario, list(cantidades))
+    actualizados = (
+        Producto.objects.filter(_condicion_disponible(cantidades, propias))
+        .update(
+            stock=_case('stock', {pk: -cantidad for pk, cantidad in cantidades.items()}),
+            stock_reservado=_case('stock_reservado', {pk: -total for pk, total in propias.items()}),
+        )
+    )
+    if actualizados != len(cantidades):
+        raise _faltante(cantidades, propias)
+
+    if reservas_ids:
+        ReservaStock.objects.filter(id__in=reservas_ids).delete()
+
+
+def reponer(cantidades):
+    """Devuelve al stock unidades de un pedido que no se concretó."""
+    if cantidades:
+        Producto.objects.filter(pk__in=cantidades).update(stock=_case('stock', cantidades))
+
+
+def fijar(producto, stock):
+    """
+    Deja el stock del producto en un valor absoluto (edición desde el
+    catálogo). El UPDATE exige que no quede debajo de lo reservado: si entró
+    una reserva desde que se leyó la fila lanza AjusteInvalido. Actualiza
+    stock y stock_reservado en la instancia.
+    """
+    actualizados = Producto.objects.filter(pk=producto.pk, stock_reservado__lte=stock).update(stock=stock)
+    reservado = Producto.objects.filter(pk=producto.pk).values_list('stock_reservado', flat=True).first()
+    if not actualizados:
+        detalle = (
+            'El producto no existe.' if reservado is None
+            else f'El stock quedaría en {stock} y hay {reservado} unidades reservadas.'
+        )
+        raise AjusteInvalido([{'producto_id': producto.pk, 'detalle': detalle}])
+    producto.stock, producto.stock_reservado = stock, reservado
+
+
+def _errores_ajuste(productos, deltas):
+    """Qué productos no existen (o no son de la farmacia) o quedarían debajo de lo reservado."""
+    ids = list(deltas)
+    actuales = {}
+    for inicio in range(0, len(ids), 500):
+        actuales.update(
+            (pk, (stock, reservado))
+            for pk, stock, reservado in productos.filter(pk__in=ids[inicio:inicio + 500])
+            .values_list('id', 'stock', 'stock_reservado')
+        )
+    errores = []
+    for pk, delta in deltas.items():
+        if pk not in actuales:
+            errores.append({'producto_id': pk, 'detalle': 'El producto no existe o no es de esta farmacia.'})
+            continue
+        stock, reservado = actuales[pk]
+        if stock + delta < reservado:
+            errores.append({
+                'producto_id': pk,
+                'detalle': f'El stock quedaría en {stock + delta} y hay {reservado} unidades reservadas.',
+            })
+    return errores
+
+
+def ajustar(deltas, farmacia_id=None, lote=1000):
+    """
+    Suma a cada producto su delta ({producto_id: delta}, positivo o negativo)
+    en una sola transacción, con un UPDATE ... CASE por cada lote de productos
+    condicionado a que stock + delta no quede debajo de stock_reservado.
+    Si farmacia_id se indica, solo se tocan productos de esa farmacia.
+    Si algún producto no existe o quedaría por debajo de su stock reservado no
+    se aplica nada y se lanza AjusteInvalido. Devuelve {producto_id: (stock, stock_reservado)}.
+    """
+    productos = Producto.objects.all()
+    if farmacia_id is not None:
+        productos = productos.filter(farmacia_id=farmacia_id)
+
+    ids = list(deltas)
+    with transaction.atomic():
+        actualizados = 0
+        for inicio in range(0, len(ids), lote):
+            parte = {pk: deltas[pk] for pk in ids[inicio:inicio + lote]}
+            actualizados += (
+                productos.filter(pk__in=parte)
+                .alias(nuevo_stock=_case('stock', parte))
+                .filter(nuevo_stock__gte=F('stock_reservado'))
+                .update(stock=_case('stock', parte))
+            )
+        if actualizados != len(deltas):
+            raise AjusteInvalido(_errores_ajuste(productos, deltas))
+
+        resultado = {}
+        for inicio in range(0, len(ids), 500):
+            resultado.update(
+                (pk, (stock, reservado))
+                for pk, stock, reservado in Producto.objects.filter(pk__in=ids[inicio:inicio + 500])
+                .values_list('id', 'stock', 'stock_reservado')
+            )
+    return resultado
@@ -1,3 +1,614 @@
+from datetime import timedelta
+import json
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import busqueda, importacion, indice_fts, stock
+from .autocompletado import IndicePrefijos, autocompletado
+from .models import Producto, ReservaStock
+from .serializers import ProductoSerializer
+from .views import ProductosPorFarmaciaView
+
+
+User = get_user_model()
+
+
+class StockReservasTests(TestCase):
+
+    def setUp(self):
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia')
+        self.cliente = User.objects.create_user(email='cliente@test.com', tipo_usuario='cliente')
+        self.otro = User.objects.create_user(email='otro@test.com', tipo_usuario='cliente')
+        self.producto = Producto.objects.create(
+            farmacia=self.farmacia, nombre='Ibuprofeno', presentacion='400 mg',
+            precio=Decimal('100.00'), stock=5,
+        )
+
+    def test_reserva_descuenta_disponible_para_otros(self):
+        stock.reservar(self.cliente, {self.producto.id: 4})
+        with self.assertRaises(stock.StockInsuficiente) as ctx:
+            stock.reservar(self.otro, {self.producto.id: 2})
+        self.assertEqual(ctx.exception.disponible, 1)
+
+        # El dueño de la reserva puede comprar lo reservado
+        stock.descontar({self.producto.id: 4}, usuario=self.cliente)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (1, 0))
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_nueva_reserva_reemplaza_la_anterior(self):
+        stock.reservar(self.cliente, {self.producto.id: 2})
+        stock.reservar(self.cliente, {self.producto.id: 5})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_reservado, 5)
+        self.assertEqual(ReservaStock.objects.count(), 1)
+
+    def test_reserva_vencida_sin_liberar_no_queda_retenida(self):
+        stock.reservar(self.cliente, {self.producto.id: 2})
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(minutes=1))
+
+        # La reserva vence entre liberar_vencidas y la transacción de reservar
+        with mock.patch.object(stock, 'liberar_vencidas'):
+            stock.reservar(self.cliente, {self.producto.id: 1})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_reservado, 3)
+
+        stock.liberar_vencidas()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_reservado, 1)
+        self.assertEqual(ReservaStock.objects.get().cantidad, 1)
+
+    def test_reservas_vencidas_se_liberan_por_lotes(self):
+        for usuario in (self.cliente, self.otro):
+            stock.reservar(usuario, {self.producto.id: 2})
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(minutes=1))
+
+        call_command('liberar_reservas', lote=1, stdout=StringIO())
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_reservado, 0)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_reservas_vencidas_no_bloquean_la_compra(self):
+        stock.reservar(self.otro, {self.producto.id: 5})
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(minutes=1))
+        stock.descontar({self.producto.id: 5}, usuario=self.cliente)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (0, 0))
+
+    def test_editar_no_pisa_las_reservas_que_entraron_despues_de_leer(self):
+        leido = Producto.objects.get(pk=self.producto.pk)
+        stock.reservar(self.cliente, {self.producto.id: 3})
+
+        serializer = ProductoSerializer(leido, data={'precio': '120.00'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.precio, Decimal('120.00'))
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (5, 3))
+
+    def test_editar_stock_usa_el_update_condicionado(self):
+        leido = Producto.objects.get(pk=self.producto.pk)
+        stock.reservar(self.cliente, {self.producto.id: 4})
+
+        # El stock nuevo pasa la validación contra la fila leída, pero ya no alcanza
+        serializer = ProductoSerializer(leido, data={'stock': 2, 'precio': '1.00'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (5, 4))
+        self.assertEqual(self.producto.precio, Decimal('100.00'))
+
+        serializer = ProductoSerializer(self.producto, data={'stock': 8}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.save().stock_disponible, 4)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.stock_reservado), (8, 4))
+
+
+class BusquedaProductosTests(APITestCase):
+
+    def setUp(self):
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia', nombre='Centro')
+        self.otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia', nombre='Norte')
+        self.cliente = User.objects.create_user(email='cliente@test.com', tipo_usuario='cliente')
+        self.ibuprofeno = self.crear(self.farmacia, 'Ibuprofeno', '400 mg', stock=10)
+        self.ibuprofeno_otra = self.crear(self.otra, 'IBUPROFÉNO Forte', '600 mg', stock=3)
+        self.sin_stock = self.crear(self.otra, 'Ibuprofeno', '400 mg', stock=0)
+        self.analgesico = self.crear(
+            self.farmacia, 'Analgésico', '500 mg', descripcion='Alternativa al ibuprofeno', stock=5
+        )
+
+    def crear(self, farmacia, nombre, presentacion, stock, descripcion=''):
+        return Producto.objects.create(
+            farmacia=farmacia, nombre=nombre, presentacion=presentacion,
+            descripcion=descripcion, precio=Decimal('100.00'), stock=stock,
+        )
+
+    def ids(self, productos):
+        return [producto.id for producto in productos]
+
+    def test_sin_distinguir_acentos_y_ordenado_por_relevancia(self):
+        resultado = busqueda.buscar('ibuprofeno')
+
+        self.assertEqual(
+            set(self.ids(resultado[:2])), {self.ibuprofeno.id, self.ibuprofeno_otra.id}
+        )
+        # Coincidir solo en la descripción pesa menos que en el nombre
+        self.assertEqual(resultado[-1].id, self.analgesico.id)
+        self.assertEqual(self.ids(busqueda.buscar('analgesico')), [self.analgesico.id])
+
+    def test_varias_palabras_y_prefijo(self):
+        self.assertEqual(self.ids(busqueda.buscar('ibupro 400')), [self.ibuprofeno.id])
+        self.assertEqual(busqueda.buscar('" OR *'), [])
+
+    def test_filtros_de_stock_y_farmacia(self):
+        self.assertNotIn(self.sin_stock.id, self.ids(busqueda.buscar('ibuprofeno')))
+        self.assertIn(self.sin_stock.id, self.ids(busqueda.buscar('ibuprofeno', con_stock=False)))
+        self.assertEqual(
+            self.ids(busqueda.buscar('ibuprofeno', farmacia_id=self.otra.id)), [self.ibuprofeno_otra.id]
+        )
+
+        # Las unidades reservadas no cuentan como disponibles
+        Producto.objects.filter(pk=self.ibuprofeno_otra.pk).update(stock_reservado=3)
+        self.assertEqual(busqueda.buscar('ibuprofeno', farmacia_id=self.otra.id), [])
+
+    def test_indice_sincronizado_en_escrituras(self):
+        self.ibuprofeno.nombre = 'Paracetamol'
+        self.ibuprofeno.save()
+        self.assertEqual(self.ids(busqueda.buscar('paracetamol')), [self.ibuprofeno.id])
+        self.assertNotIn(self.ibuprofeno.id, self.ids(busqueda.buscar('ibuprofeno')))
+
+        Producto.objects.filter(pk=self.analgesico.pk).update(descripcion='')
+        self.assertNotIn(self.analgesico.id, self.ids(busqueda.buscar('ibuprofeno')))
+
+        self.ibuprofeno_otra.delete()
+        self.assertEqual(busqueda.buscar('forte'), [])
+
+    def test_asegurar_indice_recrea_triggers_perdidos(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER productos_producto_fts_ai')
+        indice_fts.asegurar_indice()
+
+        nuevo = self.crear(self.farmacia, 'Loratadina', '10 mg', stock=1)
+        self.assertEqual(self.ids(busqueda.buscar('loratadina')), [nuevo.id])
+
+    def test_endpoint(self):
+        self.client.force_authenticate(self.cliente)
+        url = reverse('producto-buscar')
+
+        response = self.client.get(url, {'q': 'ibuprofeno 600'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data], [self.ibuprofeno_otra.id])
+        self.assertEqual(response.data[0]['farmacia_nombre'], 'Norte')
+
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'x', 'limit': 'a'}).status_code, 400)
+
+
+class AutocompletadoTests(APITestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        autocompletado.__init__()
+        self.url = reverse('producto-autocompletar')
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia')
+        self.otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia')
+        for farmacia in (self.farmacia, self.otra):
+            self.crear(farmacia, 'Ibuprofeno', '400 mg')
+        self.crear(self.farmacia, 'Ibuprofeno', '600 mg')
+        self.crear(self.farmacia, 'Ibupirac', '400 mg')
+        self.client.force_authenticate(self.farmacia)
+
+    def crear(self, farmacia, nombre, presentacion):
+        return Producto.objects.create(
+            farmacia=farmacia, nombre=nombre, presentacion=presentacion,
+            precio=Decimal('100.00'), stock=1,
+        )
+
+    def textos(self, response):
+        return [sugerencia['texto'] for sugerencia in response.json()]
+
+    def test_indice_ordena_por_cantidad_e_ignora_acentos(self):
+        indice = IndicePrefijos(['Analgésico 500 mg', 'Aspirina 100 mg', 'Aspirina 100 mg'])
+
+        self.assertEqual(
+            [s['texto'] for s in indice.sugerir('a')], ['Aspirina 100 mg', 'Analgésico 500 mg']
+        )
+        self.assertEqual(indice.sugerir('ANALGES')[0]['texto'], 'Analgésico 500 mg')
+
+        indice.quitar('Analgésico 500 mg')
+        self.assertEqual(indice.sugerir('anal'), [])
+        self.assertEqual(len(indice), 1)
+
+    def test_requiere_autenticacion(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url, {'q': 'ibu'}).status_code, 401)
+
+    def test_responde_desde_memoria_sin_consultar_la_base(self):
+        self.client.get(self.url, {'q': 'ibu'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'ibu', 'limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0], {'texto': 'Ibuprofeno 400 mg', 'productos': 2})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_cambios_se_aplican_al_confirmar(self):
+        self.client.get(self.url, {'q': 'ibu'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = self.crear(self.farmacia, 'Loratadina', '10 mg')
+        self.assertEqual(self.textos(self.client.get(self.url, {'q': 'lora'})), ['Loratadina 10 mg'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.presentacion = '20 mg'
+            producto.save()
+        self.assertEqual(self.textos(self.client.get(self.url, {'q': 'lora'})), ['Loratadina 20 mg'])
+
+        # Borrado en cascada al eliminar la farmacia
+        with self.captureOnCommitCallbacks(execute=True):
+            self.otra.delete()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'ibuprofeno 4'})
+        self.assertEqual(response.json(), [{'texto': 'Ibuprofeno 400 mg', 'productos': 1}])
+
+    def test_cambio_de_otro_proceso_reconstruye_en_segundo_plano(self):
+        self.client.get(self.url, {'q': 'ibu'})
+        Producto.objects.filter(nombre='Ibupirac').update(nombre='Ibupirac Flex')
+        with self.captureOnCommitCallbacks(execute=True):
+            autocompletado.invalidar()
+
+        with mock.patch('productos.autocompletado.threading.Thread') as thread:
+            self.assertIn('Ibupirac 400 mg', self.textos(self.client.get(self.url, {'q': 'ibupi'})))
+        thread.assert_called_once()
+
+        autocompletado._reconstruir()
+        self.assertEqual(
+            self.textos(self.client.get(self.url, {'q': 'ibupi'})), ['Ibupirac Flex 400 mg']
+        )
+
+
+class CatalogoPaginadoTests(APITestCase):
+
+    def setUp(self):
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia')
+        self.otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia')
+        self.cliente = User.objects.create_user(email='cliente@test.com', tipo_usuario='cliente')
+        Producto.objects.bulk_create([
+            Producto(
+                farmacia=self.farmacia, nombre=f'Producto {i % 7}', presentacion=f'{i} mg',
+                descripcion='Texto largo ' * 20, precio=Decimal('10.00'), stock=i,
+            )
+            for i in range(25)
+        ] + [Producto(farmacia=self.otra, nombre='Ajeno', presentacion='1 mg', precio=Decimal('1.00'))])
+        self.url = reverse('producto-listar-por-farmacia', args=[self.farmacia.id])
+        self.client.force_authenticate(self.cliente)
+
+    def test_recorre_el_catalogo_por_cursor_sin_repetir(self):
+        ids = []
+        response = self.client.get(self.url, {'page_size': 10})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 10)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            # El cursor ya trae page_size en la URL
+            response = self.client.get(response.data['next'])
+
+        esperados = list(
+            Producto.objects.filter(farmacia=self.farmacia).order_by('nombre', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, esperados)
+
+    def test_renombrar_entre_paginas_no_saltea_ni_repite_otros(self):
+        primera = self.client.get(self.url, {'page_size': 10, 'fields': 'id,nombre'})
+        vistos = [item['id'] for item in primera.data['results']]
+        # La página corta en medio de un nombre repetido; el último visto de ese
+        # nombre pasa al final (el CursorPagination de DRF salteaba uno por el offset)
+        movidos = {vistos[-1]}
+        Producto.objects.filter(pk=vistos[-1]).update(nombre='Zzz')
+
+        response = self.client.get(primera.data['next'])
+        while True:
+            vistos.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        # Solo los productos renombrados pueden faltar o repetirse
+        otros = [pk for pk in vistos if pk not in movidos]
+        esperados = set(Producto.objects.filter(farmacia=self.farmacia).values_list('id', flat=True)) - movidos
+        self.assertEqual(sorted(otros), sorted(esperados))
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'no-es-un-cursor'}).status_code, 404)
+
+    def test_fields_devuelve_y_lee_solo_lo_pedido(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'fields': 'id,nombre,precio'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'nombre', 'precio'})
+        sql = next(q['sql'] for q in ctx.captured_queries if 'FROM "productos_producto"' in q['sql'])
+        self.assertNotIn('"descripcion"', sql)
+
+        completo = self.client.get(self.url).data['results'][0]
+        self.assertIn('descripcion', completo)
+
+    def test_listado_general_paginado(self):
+        self.client.force_authenticate(self.farmacia)
+        response = self.client.get(reverse('producto-list'), {'page_size': 5, 'fields': 'id'})
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_productos_por_farmacia_view(self):
+        request = APIRequestFactory().get('/', {'page_size': 10, 'fields': 'id,stock_disponible'})
+        force_authenticate(request, user=self.cliente)
+
+        response = ProductosPorFarmaciaView.as_view()(request, farmacia_id=self.farmacia.id)
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'stock_disponible'})
+
+    def test_pagina_se_resuelve_con_indice(self):
+        primera = self.client.get(self.url, {'page_size': 10})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(primera.data['next'])
+
+        sql = next(q['sql'] for q in ctx.captured_queries if 'FROM "productos_producto"' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [fila[-1] for fila in cursor.fetchall()]
+        self.assertTrue(any('producto_farmacia_nombre_idx' in paso for paso in plan), plan)
+        self.assertFalse(any('USE TEMP B-TREE' in paso for paso in plan), plan)
+
+
+class ImportacionCatalogoTests(APITestCase):
+
+    def setUp(self):
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia')
+        self.cliente = User.objects.create_user(email='cliente@test.com', tipo_usuario='cliente')
+        self.existente = Producto.objects.create(
+            farmacia=self.farmacia, nombre='Ibuprofeno', presentacion='400 mg',
+            precio=Decimal('100.00'), stock=5, stock_reservado=2,
+        )
+        self.url = reverse('producto-importar')
+
+    def test_csv_crea_y_actualiza_por_clave_natural(self):
+        csv = (
+            '\ufeffnombre,presentacion,precio,stock,requiere_receta,descripcion\n'
+            'Ibuprofeno,400 mg,120.5,8,no,Actualizado\n'
+            'Amoxicilina,500 mg,300,10,si,\n'
+            'Amoxicilina,500 mg,310,12,si,Repetida en otro lote: se actualiza\n'
+        ).encode('utf-8')
+
+        resumen = importacion.importar(self.farmacia, importacion.leer_filas(BytesIO(csv), 'csv'), lote=2)
+
+        self.assertEqual((resumen.creados, resumen.actualizados, resumen.con_error), (1, 2, 0))
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.precio, self.existente.stock), (Decimal('120.50'), 8))
+        self.assertEqual(self.existente.descripcion, 'Actualizado')
+        nuevo = Producto.objects.get(nombre='Amoxicilina')
+        self.assertEqual((nuevo.precio, nuevo.stock, nuevo.requiere_receta), (Decimal('310.00'), 12, True))
+        # Los productos importados quedan en el índice de búsqueda
+        self.assertEqual([p.id for p in busqueda.buscar('amoxi')], [nuevo.id])
+
+    def test_ndjson_informa_errores_por_fila(self):
+        lineas = [
+            json.dumps({'nombre': 'Loratadina', 'presentacion': '10 mg', 'precio': '50'}),
+            '{no es json',
+            json.dumps({'nombre': '', 'presentacion': '1 mg', 'precio': 'abc', 'stock': -1}),
+            '',
+            json.dumps({'nombre': 'Ibuprofeno', 'presentacion': '400 mg', 'precio': '1', 'stock': 1}),
+        ]
+        cuerpo = BytesIO('\n'.join(lineas).encode('utf-8'))
+
+        resumen = importacion.importar(self.farmacia, importacion.leer_filas(cuerpo, 'ndjson'))
+
+        self.assertEqual((resumen.creados, resumen.actualizados, resumen.con_error), (1, 0, 3))
+        self.assertEqual([error['fila'] for error in resumen.errores], [2, 3, 5])
+        self.assertEqual(set(resumen.errores[1]['errores']), {'nombre', 'precio', 'stock'})
+        self.assertIn('reservadas', resumen.errores[2]['errores']['stock'])
+
+    def test_alta_concurrente_no_duplica(self):
+        sql_escritura = importacion._sql_escritura
+
+        def con_alta_concurrente(campos):
+            # Otro proceso crea los productos después de la consulta de existentes
+            Producto.objects.create(
+                farmacia=self.farmacia, nombre='Loratadina', presentacion='10 mg', precio=Decimal('1.00'),
+            )
+            Producto.objects.create(
+                farmacia=self.farmacia, nombre='Cetirizina', presentacion='10 mg',
+                precio=Decimal('1.00'), stock=5, stock_reservado=4,
+            )
+            return sql_escritura(campos)
+
+        csv = b'nombre,presentacion,precio,stock\nLoratadina,10 mg,50,7\nCetirizina,10 mg,60,1\n'
+        with mock.patch.object(importacion, '_sql_escritura', con_alta_concurrente):
+            resumen = importacion.importar(self.farmacia, importacion.leer_filas(BytesIO(csv), 'csv'))
+
+        self.assertEqual((resumen.creados, resumen.con_error), (1, 1))
+        self.assertIn('reservadas', resumen.errores[0]['errores']['stock'])
+        loratadina = Producto.objects.get(nombre='Loratadina')
+        self.assertEqual((loratadina.precio, loratadina.stock), (Decimal('50.00'), 7))
+        self.assertEqual(Producto.objects.get(nombre='Cetirizina').stock, 5)
+
+    def test_fila_parcial_no_pisa_las_columnas_que_no_trae(self):
+        Producto.objects.filter(pk=self.existente.pk).update(descripcion='Antiinflamatorio', requiere_receta=True)
+        csv = 'nombre,presentacion,precio\nIbuprofeno,400 mg,130\nNaproxeno,500 mg,90\n'.encode('utf-8')
+
+        resumen = importacion.importar(self.farmacia, importacion.leer_filas(BytesIO(csv), 'csv'))
+
+        self.assertEqual((resumen.creados, resumen.actualizados, resumen.con_error), (1, 1, 0))
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.precio, Decimal('130.00'))
+        self.assertEqual((self.existente.stock, self.existente.stock_reservado), (5, 2))
+        self.assertEqual((self.existente.descripcion, self.existente.requiere_receta), ('Antiinflamatorio', True))
+        # Los productos nuevos toman los valores por defecto
+        nuevo = Producto.objects.get(nombre='Naproxeno')
+        self.assertEqual((nuevo.stock, nuevo.descripcion, nuevo.requiere_receta), (0, '', False))
+
+    def test_upsert_parcial_no_pisa_las_columnas_que_no_trae(self):
+        sql_escritura = importacion._sql_escritura
+
+        def con_alta_concurrente(campos):
+            Producto.objects.create(
+                farmacia=self.farmacia, nombre='Loratadina', presentacion='10 mg', precio=Decimal('1.00'),
+                stock=9, stock_reservado=3, descripcion='Antialérgico',
+            )
+            return sql_escritura(campos)
+
+        cuerpo = BytesIO(json.dumps({'nombre': 'Loratadina', 'presentacion': '10 mg', 'precio': 40}).encode('utf-8'))
+        with mock.patch.object(importacion, '_sql_escritura', con_alta_concurrente):
+            resumen = importacion.importar(self.farmacia, importacion.leer_filas(cuerpo, 'ndjson'))
+
+        self.assertEqual((resumen.creados, resumen.con_error), (1, 0))
+        loratadina = Producto.objects.get(nombre='Loratadina')
+        self.assertEqual(
+            (loratadina.precio, loratadina.stock, loratadina.descripcion), (Decimal('40.00'), 9, 'Antialérgico')
+        )
+
+    def test_alta_manual_repetida_es_error_de_validacion(self):
+        self.client.force_authenticate(self.farmacia)
+        response = self.client.post(reverse('producto-list'), {
+            'nombre': 'Ibuprofeno', 'presentacion': '400 mg', 'precio': '10.00',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('presentacion', response.data)
+        self.assertEqual(Producto.objects.filter(nombre='Ibuprofeno').count(), 1)
+
+    def test_endpoint(self):
+        cuerpo = 'nombre,presentacion,precio\nParacetamol,1 g,80\n'
+
+        self.client.force_authenticate(self.cliente)
+        response = self.client.post(self.url, cuerpo, content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(self.farmacia)
+        response = self.client.post(self.url, cuerpo, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 1)
+
+        ndjson = json.dumps({'nombre': 'Paracetamol', 'presentacion': '1 g', 'precio': 90})
+        response = self.client.post(self.url, ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.data['actualizados'], 1)
+
+        response = self.client.post(f'{self.url}?formato=xml', cuerpo, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as archivo:
+            archivo.write('nombre,presentacion,precio,stock\nAspirina,100 mg,30,4\nMal,,x,1\n')
+            archivo.flush()
+            salida, errores = StringIO(), StringIO()
+            call_command(
+                'importar_productos', self.farmacia.email, archivo.name, stdout=salida, stderr=errores
+            )
+
+        self.assertIn('Creados: 1', salida.getvalue())
+        self.assertIn('Fila 2', errores.getvalue())
+        self.assertTrue(Producto.objects.filter(nombre='Aspirina', stock=4).exists())
+
+
+class AjusteStockTests(APITestCase):
+
+    def setUp(self):
+        self.farmacia = User.objects.create_user(email='farmacia@test.com', tipo_usuario='farmacia')
+        self.otra = User.objects.create_user(email='otra@test.com', tipo_usuario='farmacia')
+        self.productos = Producto.objects.bulk_create([
+            Producto(farmacia=self.farmacia, nombre=f'P{i}', presentacion='1 u', precio=Decimal('1.00'), stock=10)
+            for i in range(1200)
+        ])
+        self.ajeno = Producto.objects.create(
+            farmacia=self.otra, nombre='Ajeno', presentacion='1 u', precio=Decimal('1.00'), stock=10
+        )
+        self.url = reverse('productos_stock')
+        self.client.force_authenticate(self.farmacia)
+
+    def test_aplica_todos_los_deltas_en_pocas_sentencias(self):
+        cuerpo = [{'producto_id': p.id, 'delta': 5} for p in self.productos]
+        cuerpo.append({'producto_id': self.productos[0].id, 'delta': -12})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, cuerpo, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        # Un UPDATE ... CASE por cada lote de 1000 productos
+        updates = [q for q in ctx.captured_queries if 'UPDATE' in q['sql']]
+        self.assertEqual(len(updates), 2, [q['sql'][:80] for q in ctx.captured_queries])
+        niveles = {item['producto_id']: item['stock'] for item in response.data}
+        self.assertEqual(niveles[self.productos[0].id], 3)
+        self.assertEqual(niveles[self.productos[1].id], 15)
+        self.assertEqual(Producto.objects.filter(farmacia=self.farmacia, stock=15).count(), 1199)
+
+    def test_error_no_aplica_nada(self):
+        Producto.objects.filter(pk=self.productos[1].pk).update(stock_reservado=8)
+        cuerpo = [
+            {'producto_id': self.productos[0].id, 'delta': 1},
+            {'producto_id': self.productos[1].id, 'delta': -5},
+            {'producto_id': self.ajeno.id, 'delta': 1},
+        ]
+
+        response = self.client.post(self.url, cuerpo, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [error['producto_id'] for error in response.data['errores']],
+            [self.productos[1].id, self.ajeno.id],
+        )
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 10)
+        self.assertEqual(Producto.objects.get(pk=self.ajeno.pk).stock, 10)
+
+    def test_validaciones(self):
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 400)
+        response = self.client.post(self.url, [{'producto_id': 'x', 'delta': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+        for item in (
+            {'producto_id': self.productos[0].id, 'delta': 0},
+            {'producto_id': self.productos[0].id, 'delta': 10**30},
+            {'producto_id': self.productos[0].id, 'delta': -10**30},
+            {'producto_id': 10**30, 'delta': 1},
+        ):
+            response = self.client.post(self.url, [item], format='json')
+            self.assertEqual(response.status_code, 400, item)
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 10)
+
+        self.client.force_authenticate(User.objects.create_user(email='c@test.com'))
+        response = self.client.post(self.url, [{'producto_id': self.ajeno.id, 'delta': 1}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_reintento_con_idempotency_key_no_duplica(self):
+        self.client.force_authenticate(user=None)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.farmacia)}',
+            HTTP_IDEMPOTENCY_KEY='pos-sync-1',
+        )
+        caches['default'].clear()
+        cuerpo = [{'producto_id': self.productos[0].id, 'delta': 2}]
+
+        self.client.post(self.url, cuerpo, format='json')
+        response = self.client.post(self.url, cuerpo, format='json')
 
-# Create your tests here.
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 12)
@@ -1,6 +1,7 @@
 from rest_framework import generics, permissions
 from .models import Producto
-from .serializers import ProductoSerializer
+from .pagination import ProductoCursorPagination
+from .serializers import ProductoSerializer, diferir_no_pedidos
 
 # 🔹 Listar y crear productos globalmente
 class ProductoListCreateView(generics.ListCreateAPIView):
@@ -23,10 +24,11 @@ class ProductoDetailView(generics.RetrieveUpdateDestroyAPIView):
 class ProductosPorFarmaciaView(generics.ListCreateAPIView):
     serializer_class = ProductoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ProductoCursorPagination
 
     def get_queryset(self):
         farmacia_id = self.kwargs['farmacia_id']
-        return Producto.objects.filter(farmacia_id=farmacia_id)
+        return diferir_no_pedidos(Producto.objects.filter(farmacia_id=farmacia_id), self.request)
 
     def perform_create(self, serializer):
         farmacia_id = self.kwargs['farmacia_id']
@@ -20,6 +20,12 @@ API.interceptors.request.use(
     if (accessToken) {
       config.headers.Authorization = `Bearer ${accessToken}`;
     }
+    // Los reintentos de la misma request reutilizan la clave y el backend
+    // devuelve la respuesta original en vez de procesar el pedido otra vez
+    const method = (config.method || "").toLowerCase();
+    if ((method === "post" || method === "patch") && !config.headers["Idempotency-Key"]) {
+      config.headers["Idempotency-Key"] = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
     return config;
   },
   (error) => Promise.reject(error)
@@ -87,5 +93,12 @@ export const getFarmacias = async () => {
   return await API.get("usuarios/farmacias/");
 };
 
+// 📄 Resultados de un listado paginado por cursor ({ next, previous, results })
+//    Acepta también la respuesta vieja (array plano) por compatibilidad
+export const getResults = (data) => {
+  if (Array.isArray(data)) return data;
+  return Array.isArray(data?.results) ? data.results : [];
+};
+
 // Exporta la instancia principal
 export default API;
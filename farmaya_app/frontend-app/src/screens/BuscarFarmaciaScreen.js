@@ -15,6 +15,9 @@ import * as Linking from "expo-linking";
 import AsyncStorage from "@react-native-async-storage/async-storage";
 import API from "../api/api";
 
+const RADIO_BUSQUEDA_KM = 20;
+const MAX_FARMACIAS = 50;
+
 export default function BuscarFarmaciaScreen({ navigation }) {
   const [region, setRegion] = useState(null);
   const [farmacias, setFarmacias] = useState([]);
@@ -33,6 +36,7 @@ export default function BuscarFarmaciaScreen({ navigation }) {
         }
 
         const location = await Location.getCurrentPositionAsync({});
+        fetchFarmacias(location.coords);
         setRegion({
           latitude: location.coords.latitude,
           longitude: location.coords.longitude,
@@ -48,20 +52,26 @@ export default function BuscarFarmaciaScreen({ navigation }) {
     })();
   }, []);
 
-  // 🔹 Cargar farmacias desde el backend
-  const fetchFarmacias = async () => {
+  // 🔹 Cargar desde el backend solo las farmacias cercanas a la ubicación
+  const fetchFarmacias = async (coords) => {
     try {
       setLoading(true);
       const token = await AsyncStorage.getItem("accessToken");
       const headers = token ? { Authorization: `Bearer ${token}` } : {};
+      const params = {
+        lat: coords.latitude,
+        lng: coords.longitude,
+        radius: RADIO_BUSQUEDA_KM,
+        limit: MAX_FARMACIAS,
+      };
 
-      const response = await API.get("usuarios/farmacias/", { headers });
+      const response = await API.get("usuarios/farmacias/", { headers, params });
       const farmaciasData = response.data;
 
       console.log("🔹 Farmacias desde backend:", farmaciasData);
 
       if (!farmaciasData || farmaciasData.length === 0) {
-        Alert.alert("Aviso", "No hay farmacias registradas con ubicación.");
+        Alert.alert("Aviso", "No hay farmacias cercanas a tu ubicación.");
       }
 
       // 🔹 Normalizar datos
@@ -75,6 +85,7 @@ export default function BuscarFarmaciaScreen({ navigation }) {
           direccion: f.direccion || "Dirección no disponible",
           telefono: f.telefono || "Sin teléfono",
           horarios: f.horarios || "8:00 a 20:00 hs",
+          distanciaKm: f.distancia_km,
         }));
 
       setFarmacias(farmaciasConUbicacion);
@@ -89,11 +100,6 @@ export default function BuscarFarmaciaScreen({ navigation }) {
     }
   };
 
-  // 🔹 Llamar al cargar la pantalla
-  useEffect(() => {
-    fetchFarmacias();
-  }, []);
-
   // 🔹 Abrir en Google Maps
   const abrirEnMaps = (lat, lng) => {
     const url =
@@ -172,6 +178,9 @@ export default function BuscarFarmaciaScreen({ navigation }) {
             <Text>📍 {selectedFarmacia?.direccion}</Text>
             <Text>📞 {selectedFarmacia?.telefono}</Text>
             <Text>🕓 {selectedFarmacia?.horarios}</Text>
+            {selectedFarmacia?.distanciaKm != null && (
+              <Text>🚶 A {selectedFarmacia.distanciaKm} km</Text>
+            )}
 
             <TouchableOpacity
               style={styles.btnPedido}
@@ -14,7 +14,7 @@ import {
   Linking,
 } from "react-native";
 import AsyncStorage from "@react-native-async-storage/async-storage";
-import API from "../api/api";
+import API, { getResults } from "../api/api";
 import { useTheme } from "../theme/ThemeProvider";
 import { SafeAreaView, useSafeAreaInsets } from "react-native-safe-area-context";
 import getClienteOrdersStorageKey from "../utils/storageKeys";
@@ -37,6 +37,7 @@ export default function HomeFarmaciaScreen({ navigation }) {
   const styles = useMemo(() => createStyles(theme, insets), [theme, insets]);
   const [farmacia, setFarmacia] = useState(null);
   const [productos, setProductos] = useState([]);
+  const [siguientePagina, setSiguientePagina] = useState(null);
   const [pedidos, setPedidos] = useState([]);
   const [loading, setLoading] = useState(true);
   const [pedidoProcesando, setPedidoProcesando] = useState(null);
@@ -66,13 +67,29 @@ export default function HomeFarmaciaScreen({ navigation }) {
   const cargarProductos = useCallback(async () => {
     try {
       const response = await API.get("productos/");
-      setProductos(response.data);
+      setProductos(getResults(response.data));
+      setSiguientePagina(response.data?.next || null);
     } catch (error) {
       console.error("❌ Error al cargar productos:", error.response?.data || error);
       Alert.alert("Error", "No se pudieron cargar los productos.");
     }
   }, []);
 
+  // 🔹 Siguiente página de productos al llegar al final de la lista
+  const cargarMasProductos = async () => {
+    if (!siguientePagina) return;
+    const pagina = siguientePagina;
+    setSiguientePagina(null);
+    try {
+      const response = await API.get(pagina);
+      setProductos((prev) => [...prev, ...getResults(response.data)]);
+      setSiguientePagina(response.data?.next || null);
+    } catch (error) {
+      console.error("❌ Error al cargar más productos:", error.response?.data || error);
+      setSiguientePagina(pagina);
+    }
+  };
+
   const normalizarPedido = (pedido) => {
     if (!pedido) return null;
 
@@ -108,11 +125,9 @@ export default function HomeFarmaciaScreen({ navigation }) {
   const cargarPedidos = async () => {
     try {
       const response = await API.get("pedidos/");
-      const pedidosNormalizados = Array.isArray(response.data)
-        ? response.data
-          .map(normalizarPedido)
-          .filter((pedido) => pedido !== null)
-        : [];
+      const pedidosNormalizados = getResults(response.data)
+        .map(normalizarPedido)
+        .filter((pedido) => pedido !== null);
 
       await Promise.all(
         pedidosNormalizados.map((pedido) => sincronizarAlmacenamientos(pedido))
@@ -769,6 +784,8 @@ export default function HomeFarmaciaScreen({ navigation }) {
         renderItem={renderProductItem}
         ListHeaderComponent={renderHeader}
         ListEmptyComponent={renderEmptyProducts}
+        onEndReached={cargarMasProductos}
+        onEndReachedThreshold={0.5}
         contentContainerStyle={styles.listContent}
         showsVerticalScrollIndicator={false}
       />
@@ -3,8 +3,9 @@ import { useCallback, useEffect, useMemo, useState } from "react";
 import { ActivityIndicator, Alert, FlatList, StyleSheet, Text, TouchableOpacity, View } from "react-native";
 import { SafeAreaView, useSafeAreaInsets } from "react-native-safe-area-context";
 import AsyncStorage from "@react-native-async-storage/async-storage";
+import * as Location from "expo-location";
 import { useTheme } from '../theme/ThemeProvider';
-import API from "../api/api";
+import API, { getResults } from "../api/api";
 
 export default function HomeRepartidorScreen({ navigation }) {
   const [pedidos, setPedidos] = useState([]);
@@ -28,7 +29,7 @@ export default function HomeRepartidorScreen({ navigation }) {
       farmacia: pedido.farmacia_nombre || "Farmacia",
       direccionFarmacia: pedido.farmacia_direccion || "Dirección de farmacia",
       direccionCliente: pedido.direccion_entrega || "Dirección del cliente",
-      distancia: 2.5, // Por defecto, se puede calcular con geolocalización
+      distancia: pedido.distancia_km ?? null, // Calculada por el backend desde la ubicación actual
       productos: productos,
       estado: pedido.estado || "aceptado",
       repartidor_id: pedido.repartidor_id,
@@ -42,8 +43,20 @@ export default function HomeRepartidorScreen({ navigation }) {
   const loadPedidosDisponibles = useCallback(async () => {
     try {
       setLoading(true);
-      const response = await API.get("pedidos/disponibles/");
-      const pedidosBackend = response.data || [];
+      // Con la ubicación actual el backend filtra por radio y ordena por distancia
+      let params = {};
+      try {
+        const { status } = await Location.requestForegroundPermissionsAsync();
+        if (status === "granted") {
+          const location = await Location.getCurrentPositionAsync({});
+          params = { lat: location.coords.latitude, lng: location.coords.longitude };
+        }
+      } catch (locationError) {
+        console.error("Error obteniendo ubicación del repartidor:", locationError);
+      }
+
+      const response = await API.get("pedidos/disponibles/", { params });
+      const pedidosBackend = getResults(response.data);
       
       // Formatear pedidos
       const pedidosFormateados = pedidosBackend.map(formatearPedido);
@@ -66,7 +79,7 @@ export default function HomeRepartidorScreen({ navigation }) {
     try {
       // Obtener pedidos del repartidor que están en_camino
       const response = await API.get("pedidos/mis/");
-      const misPedidos = response.data || [];
+      const misPedidos = getResults(response.data);
       
       // Buscar pedidos en_camino asignados al repartidor actual
       const activo = misPedidos.find(
@@ -209,7 +222,9 @@ export default function HomeRepartidorScreen({ navigation }) {
       <Text style={styles.title}>{item.farmacia}</Text>
       <Text style={{color: theme.colors.textSecondary}}>📍 {getDireccionFarmacia(item)}</Text>
       <Text style={{color: theme.colors.textSecondary}}>🏠 {getDireccionCliente(item)}</Text>
-      <Text style={{color: theme.colors.textSecondary}}>🛵 Distancia: {item.distancia} km</Text>
+      {item.distancia != null && (
+        <Text style={{color: theme.colors.textSecondary}}>🛵 Distancia: {item.distancia} km</Text>
+      )}
       <Text style={{color: theme.colors.textSecondary}}>💊 Pedido: {item.productos}</Text>
 
       <View style={styles.buttons}>
@@ -242,7 +257,7 @@ export default function HomeRepartidorScreen({ navigation }) {
           </View>
         ) : (
           <FlatList
-            data={pedidos.sort((a, b) => (a.distancia || 0) - (b.distancia || 0))}
+            data={pedidos}
             keyExtractor={item => item.id?.toString()}
             renderItem={renderItem}
             refreshing={loading}
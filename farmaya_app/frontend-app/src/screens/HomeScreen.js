@@ -18,7 +18,7 @@ import * as DocumentPicker from 'expo-document-picker';
 import * as ImagePicker from 'expo-image-picker';
 
 import { useTheme } from '../theme/ThemeProvider';
-import API from '../api/api';
+import API, { getResults } from '../api/api';
 import getClienteOrdersStorageKey from '../utils/storageKeys';
 
 const ORDER_STEPS = [
@@ -213,6 +213,8 @@ export default function HomeScreen({ navigation }) {
   const [recetaReenviando, setRecetaReenviando] = useState(false);
   const [noEntregadoOrder, setNoEntregadoOrder] = useState(null);
   const [noEntregadoModalVisible, setNoEntregadoModalVisible] = useState(false);
+  // Token y ETag de la última sincronización incremental de pedidos/mis/
+  const syncStateRef = useRef({ storageKey: null, token: '0', etag: null });
 
   const loadOrders = useCallback(async () => {
     try {
@@ -233,15 +235,55 @@ export default function HomeScreen({ navigation }) {
       }
 
       try {
-        const response = await API.get('pedidos/mis/');
-        const data = Array.isArray(response.data) ? response.data : [];
-        const normalized = data
-          .map(normalizeOrderFromApi)
-          .filter((order) => order && order.id != null)
-          .map((order) => mergeOrderStatus(order, storedBeforeFetch));
-
-        await AsyncStorage.setItem(storageKey, JSON.stringify(normalized));
-        orders = normalized;
+        if (syncStateRef.current.storageKey !== storageKey) {
+          syncStateRef.current = { storageKey, token: '0', etag: null };
+        }
+        const { token, etag } = syncStateRef.current;
+
+        // Solo se piden los pedidos que cambiaron desde el último token;
+        // si nada cambió el backend responde 304 sin cuerpo
+        let response = await API.get('pedidos/mis/', {
+          params: { since: token },
+          headers: etag ? { 'If-None-Match': etag } : {},
+          validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+        });
+
+        if (response.status === 304) {
+          orders = storedBeforeFetch;
+        } else {
+          // Los cambios llegan de a una página: se siguen los tokens de
+          // continuación hasta que next venga vacío
+          const pages = [getResults(response.data)];
+          while (response.data?.next) {
+            response = await API.get('pedidos/mis/', { params: { since: response.data.token } });
+            pages.push(getResults(response.data));
+          }
+
+          const fetched = pages
+            .flat()
+            .map(normalizeOrderFromApi)
+            .filter((order) => order && order.id != null);
+          // Un pedido que cambió mientras se paginaba aparece dos veces: queda su última versión
+          const lastIndex = new Map(fetched.map((order, index) => [order.id.toString(), index]));
+          const changed = fetched
+            .filter((order, index) => lastIndex.get(order.id.toString()) === index)
+            .map((order) => mergeOrderStatus(order, storedBeforeFetch));
+
+          const base = token === '0' ? [] : storedBeforeFetch;
+          const changedIds = new Set(changed.map((order) => order.id?.toString()));
+          const normalized = [
+            ...changed,
+            ...base.filter((order) => !changedIds.has(order?.id?.toString())),
+          ];
+
+          await AsyncStorage.setItem(storageKey, JSON.stringify(normalized));
+          syncStateRef.current = {
+            storageKey,
+            token: response.data?.token ?? token,
+            etag: response.headers?.etag ?? null,
+          };
+          orders = normalized;
+        }
       } catch (apiError) {
         console.error(
           'Error sincronizando pedidos desde la API:',
@@ -9,7 +9,7 @@ import {
   Text,
   View,
 } from "react-native";
-import API from "../api/api";
+import API, { getResults } from "../api/api";
 import { useTheme } from '../theme/ThemeProvider';
 
 const ESTADO_LABEL = {
@@ -95,7 +95,7 @@ export default function MisPedidosScreen({ navigation }) {
 
     try {
       const response = await API.get("pedidos/mis/");
-      const data = Array.isArray(response.data) ? response.data : [];
+      const data = getResults(response.data);
 
       const normalizedEmail = userEmail?.toString().toLowerCase();
       const filtered = normalizedEmail
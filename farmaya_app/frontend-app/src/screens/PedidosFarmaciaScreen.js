@@ -11,7 +11,7 @@ import {
 } from "react-native";
 import AsyncStorage from "@react-native-async-storage/async-storage";
 
-import API from "../api/api";
+import API, { getResults } from "../api/api";
 import getClienteOrdersStorageKey from "../utils/storageKeys";
 
 const ESTADO_RECETA_LABEL = {
@@ -330,7 +330,7 @@ export default function PedidosFarmaciaScreen() {
         const response = await API.get(`pedidos/farmacia/${farmaciaData.id}/`, {
           params: { estado: "pendiente" },
         });
-        setOrders(Array.isArray(response.data) ? response.data : []);
+        setOrders(getResults(response.data));
       } catch (error) {
         console.error("Error al cargar pedidos:", error.response?.data || error);
         Alert.alert("Error", "No se pudieron cargar los pedidos.");
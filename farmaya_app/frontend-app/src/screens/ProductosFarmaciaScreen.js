@@ -19,7 +19,7 @@ import {
   View,
 } from "react-native";
 import { useSafeAreaInsets } from "react-native-safe-area-context";
-import API from "../api/api";
+import API, { getResults } from "../api/api";
 import { useTheme } from '../theme/ThemeProvider';
 import getClienteOrdersStorageKey from "../utils/storageKeys";
 
@@ -35,10 +35,22 @@ const formatRecetaNombre = (receta) => {
   return "Receta adjunta";
 };
 
+// El stock que puede comprar el cliente es el que no está reservado por otros
+// Campos que muestra la grilla: el catálogo no descarga las descripciones
+const CAMPOS_CATALOGO = "id,nombre,presentacion,precio,stock,stock_disponible,requiere_receta";
+
+const conStockDisponible = (productos) =>
+  (Array.isArray(productos) ? productos : []).map((producto) => ({
+    ...producto,
+    stock: producto.stock_disponible ?? producto.stock,
+  }));
+
 export default function ProductosFarmaciaScreen({ route }) {
   const { farmacia } = route.params;
   const insets = useSafeAreaInsets();
   const [productos, setProductos] = useState([]);
+  const [siguientePagina, setSiguientePagina] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [procesandoPedido, setProcesandoPedido] = useState(false);
   const [carrito, setCarrito] = useState([]);
@@ -56,11 +68,47 @@ export default function ProductosFarmaciaScreen({ route }) {
   const { theme } = useTheme();
   const styles = createStyles(theme);
 
+  // Retener en el backend el stock de lo que hay en el carrito mientras se
+  // completan la dirección y las recetas; las reservas vencen solas
+  useEffect(() => {
+    if (carrito.length === 0) return;
+    API.post("pedidos/reservas/", {
+      detalles: carrito.map((item) => ({ producto: item.producto.id, cantidad: item.cantidad })),
+    }).catch((error) => {
+      const detail = error.response?.data?.detail;
+      if (detail) {
+        Alert.alert("Sin stock", detail);
+      }
+    });
+  }, [carrito]);
+
+  // Primera página del catálogo (paginado por cursor)
+  const cargarPrimeraPagina = async () => {
+    const response = await API.get(`productos/farmacia/${farmacia.id}/`, {
+      params: { fields: CAMPOS_CATALOGO },
+    });
+    setProductos(conStockDisponible(getResults(response.data)));
+    setSiguientePagina(response.data?.next || null);
+  };
+
+  const cargarMas = async () => {
+    if (!siguientePagina || cargandoMas) return;
+    try {
+      setCargandoMas(true);
+      const response = await API.get(siguientePagina);
+      setProductos((prev) => [...prev, ...conStockDisponible(getResults(response.data))]);
+      setSiguientePagina(response.data?.next || null);
+    } catch (error) {
+      console.error("❌ Error al cargar más productos:", error.response?.data || error);
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   useEffect(() => {
     const fetchProductos = async () => {
       try {
-        const response = await API.get(`productos/farmacia/${farmacia.id}/`);
-        setProductos(response.data);
+        await cargarPrimeraPagina();
       } catch (error) {
         console.error("❌ Error al obtener productos:", error.response?.data || error);
         Alert.alert("Error", "No se pudieron cargar los productos de esta farmacia.");
@@ -444,8 +492,7 @@ export default function ProductosFarmaciaScreen({ route }) {
 
       // Recargar productos para actualizar el stock
       try {
-        const responseProductos = await API.get(`productos/farmacia/${farmacia.id}/`);
-        setProductos(responseProductos.data);
+        await cargarPrimeraPagina();
       } catch (error) {
         console.error("Error al recargar productos:", error);
       }
@@ -483,6 +530,11 @@ export default function ProductosFarmaciaScreen({ route }) {
         ListEmptyComponent={
           <Text style={styles.emptyText}>Esta farmacia no tiene productos cargados.</Text>
         }
+        onEndReached={cargarMas}
+        onEndReachedThreshold={0.5}
+        ListFooterComponent={
+          cargandoMas ? <ActivityIndicator style={{ marginVertical: 12 }} color="#1E88E5" /> : null
+        }
         renderItem={({ item }) => (
           <View style={styles.card}>
             <View style={{ flex: 1 }}>
@@ -490,9 +542,6 @@ export default function ProductosFarmaciaScreen({ route }) {
               {item.presentacion ? (
                 <Text style={styles.presentacion}>💊 {item.presentacion}</Text>
               ) : null}
-              {item.descripcion ? (
-                <Text style={styles.descripcion}>{item.descripcion}</Text>
-              ) : null}
               <Text style={styles.precio}>💰 ${item.precio}</Text>
               <Text style={[styles.stock, item.stock <= 0 && styles.stockAgotado]}>
                 📦 Stock disponible: {item.stock}
@@ -734,7 +783,6 @@ const createStyles = (theme) =>
   },
   nombre: { fontSize: 16, fontWeight: "bold", color: "#333" },
   presentacion: { fontSize: 13, color: "#555", marginTop: 2 },
-  descripcion: { fontSize: 13, color: "#555", marginVertical: 4 },
   precio: { fontSize: 14, fontWeight: "600", color: "#2E7D32" },
   stock: { fontSize: 12, color: "#333", marginTop: 4 },
   stockAgotado: { color: "#D32F2F", fontWeight: "600" },
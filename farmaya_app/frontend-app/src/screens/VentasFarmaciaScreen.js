@@ -11,6 +11,7 @@ import AsyncStorage from "@react-native-async-storage/async-storage";
 import { useFocusEffect } from "@react-navigation/native";
 import { SafeAreaView, useSafeAreaInsets } from "react-native-safe-area-context";
 
+import API from "../api/api";
 import { useTheme } from "../theme/ThemeProvider";
 
 const ESTADO_LABEL = {
@@ -72,6 +73,7 @@ export default function VentasFarmaciaScreen({ navigation }) {
   const styles = useMemo(() => createStyles(theme, insets), [theme, insets]);
   const [acceptedSales, setAcceptedSales] = useState([]);
   const [rejectedSales, setRejectedSales] = useState([]);
+  const [resumen, setResumen] = useState(null);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
 
@@ -85,6 +87,14 @@ export default function VentasFarmaciaScreen({ navigation }) {
         setLoading(true);
       }
 
+      // Totales de los últimos 30 días calculados por el backend desde los acumulados
+      API.get("pedidos/ventas/")
+        .then((response) => setResumen(response.data))
+        .catch((error) => {
+          console.error("Error cargando resumen de ventas:", error);
+          setResumen(null);
+        });
+
       try {
         const stored = await AsyncStorage.getItem("farmaciaOrders");
         const parsed = stored ? JSON.parse(stored) : [];
@@ -171,6 +181,26 @@ export default function VentasFarmaciaScreen({ navigation }) {
     </View>
   );
 
+  const renderResumen = () => {
+    if (!resumen) return null;
+    const masVendidos = (resumen.productos || []).slice(0, 5);
+    return (
+      <View style={styles.section}>
+        <Text style={styles.sectionTitle}>Últimos 30 días</Text>
+        <View style={styles.card}>
+          <Text style={styles.cardTitle}>Facturado: ${resumen.total.ingresos}</Text>
+          <Text style={styles.cardInfo}>Pedidos entregados: {resumen.total.pedidos}</Text>
+          <Text style={styles.cardInfo}>Unidades vendidas: {resumen.total.unidades}</Text>
+          {masVendidos.map((producto) => (
+            <Text key={producto.producto_id} style={styles.cardInfo}>
+              {producto.nombre} {producto.presentacion}: {producto.unidades} u. · ${producto.ingresos}
+            </Text>
+          ))}
+        </View>
+      </View>
+    );
+  };
+
   if (loading) {
     return (
       <SafeAreaView edges={["top"]} style={styles.safeArea}>
@@ -194,6 +224,7 @@ export default function VentasFarmaciaScreen({ navigation }) {
         }
         showsVerticalScrollIndicator={false}
       >
+        {renderResumen()}
         {renderSection(
           "Pedidos aceptados",
           acceptedSales,